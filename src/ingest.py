@@ -1,56 +1,311 @@
 import os
+import time
+import random
 import warnings
+import contextvars
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-import chromadb
-from chromadb.config import Settings
 
 import sys
 sys.path.append(os.path.abspath("."))
 
-from src.utils.file_loader import load_pdf_from_folder
-from src.utils.text_helpers import split_documents
+from src.utils.file_loader import list_pdfs, iter_pdf_pages
+from src.utils.text_helpers import iter_split_documents, chunk_id
+from src.utils.resources import get_embedding_model, get_collection, get_bm25_index, get_facts_index
+from src.utils.query_cache import bump_collection_version
+from src.utils.tracing import tracer
+from src.utils.manifest import load_manifest, save_manifest, diff_reports, record_report
+from src.utils.report_metadata import METADATA_VERSION, extract_report_metadata
+from src.utils.facts import extract_facts
+from src.utils.dedup import Deduplicator
 
 load_dotenv()
 
 VECTOR_DB_DIR = os.getenv("VECTOR_DB_DIR")
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "512"))
+INGEST_MAX_RETRIES = int(os.getenv("INGEST_MAX_RETRIES", "3"))
 
-def load_and_chunk_reports(folder_path):
-    docs = load_pdf_from_folder(folder_path)
-    return split_documents(docs)
-
-def embed_and_store(docs, use_persistent=True):
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+def stream_and_chunk_reports(folder_path, filenames=None, facts_by_file=None, dedup=None, unparsed=None):
+    """Chunks of the PDFs in folder_path, with page furniture and duplicate chunks removed.
 
-    if use_persistent:
-        client = chromadb.PersistentClient(path=VECTOR_DB_DIR)
+    facts_by_file, if given, collects each report's numeric facts; dedup (a
+    Deduplicator) accumulates what was stripped; unparsed (a set) receives
+    the file names of reports whose pages could not all be parsed.
+    """
+    if filenames is None:
+        pdf_paths = list_pdfs(folder_path)
     else:
-        client = chromadb.Client()
+        pdf_paths = [os.path.join(folder_path, filename) for filename in filenames]
+    dedup = dedup or Deduplicator()
+    pages = _with_report_metadata(iter_pdf_pages(pdf_paths, failed=unparsed), pdf_paths)
+    if facts_by_file is not None:
+        # Facts are read before boilerplate stripping, which may drop repeated period headers.
+        pages = _with_facts(pages, facts_by_file)
+    return dedup.unique_chunks(iter_split_documents(dedup.strip_boilerplate(pages)))
+
+def _with_report_metadata(pages, pdf_paths):
+    # company / fiscal_year are attached per page, so every chunk can be filtered on them.
+    report_metadata = {os.path.basename(path): extract_report_metadata(path) for path in pdf_paths}
+    for page in pages:
+        page.metadata.update(report_metadata.get(page.metadata["source"], {}))
+        yield page
+
+def _with_facts(pages, facts_by_file):
+    for page in pages:
+        with tracer.span("ingest.facts"):
+            facts_by_file[page.metadata["source"]].extend(extract_facts(page.page_content, page.metadata))
+        yield page
 
-    collection = client.get_or_create_collection(name="financials")
+def load_and_chunk_reports(folder_path):
+    with tracer.trace("load_and_chunk"):
+        chunks = list(tracer.timed_iter("ingest.load_and_chunk", stream_and_chunk_reports(folder_path)))
+        tracer.annotate(chunks=len(chunks))
+    return chunks
 
-    for i, doc in enumerate(docs):
-        text = doc.page_content
-        metadata = doc.metadata
-        id_ = f"doc_{i}"
+def _batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
+def _retry(fn, *args, retries=INGEST_MAX_RETRIES):
+    for attempt in range(retries + 1):
         try:
-            vector = embedding_model.embed_documents([text])
-            collection.add(
-                documents=[text],
-                embeddings=vector,
-                metadatas=[metadata],
-                ids=[id_]
-            )
-        except Exception as e:
-            print(f"Error embedding or storing document {i}: {e}")
-            break
+            return fn(*args)
+        except Exception:
+            if attempt == retries:
+                raise
+            # jittered exponential backoff: ~0.5s, 1s, 2s, ...
+            time.sleep((2 ** attempt) * 0.5 * (0.5 + random.random()))
+
+def _isolate(fn, items, label, retries=INGEST_MAX_RETRIES):
+    """Run fn over items with retries; on persistent failure bisect the batch so
+    only the offending items are dropped. Returns (results, failed_items).
+
+    Only the whole batch is retried with backoff: a failure that outlasts the
+    retries is taken to be in the data, so the halves are tried once each."""
+    try:
+        return _retry(fn, items, retries=retries), []
+    except Exception as e:
+        if len(items) == 1:
+            print(f"Error {label} chunk {items[0][0]}: {e}")
+            return [], items
+        mid = len(items) // 2
+        left, left_failed = _isolate(fn, items[:mid], label, retries=0)
+        right, right_failed = _isolate(fn, items[mid:], label, retries=0)
+        return (left or []) + (right or []), left_failed + right_failed
+
+def _embed_batch(embedding_model, batch, embed_batch_size):
+    def embed(items):
+        vectors = embedding_model.embed_documents([doc.page_content for _, doc in items])
+        return [(id_, doc, vector) for (id_, doc), vector in zip(items, vectors)]
+
+    embedded, failed = [], []
+    for sub_batch in _batched(batch, embed_batch_size):
+        results, sub_failed = _isolate(embed, sub_batch, "embedding")
+        embedded.extend(results)
+        failed.extend(sub_failed)
+    return embedded, failed
+
+def _upsert_batch(collection, embedded):
+    def upsert(items):
+        collection.upsert(
+            ids=[id_ for id_, _, _ in items],
+            documents=[doc.page_content for _, doc, _ in items],
+            embeddings=[vector for _, _, vector in items],
+            metadatas=[doc.metadata for _, doc, _ in items],
+        )
+        return items
+
+    if not embedded:
+        return [], []
+    return _isolate(upsert, embedded, "storing")
+
+def _unique_chunks(docs):
+    seen = set()
+    for doc in docs:
+        id_ = chunk_id(doc)
+        if id_ not in seen:
+            seen.add(id_)
+            yield id_, doc
+
+def _delete_ids(collection, ids, lexical_index=None, batch_size=UPSERT_BATCH_SIZE):
+    for batch in _batched(sorted(ids), batch_size):
+        collection.delete(ids=batch)
+        if lexical_index is not None:
+            lexical_index.delete(batch)
+
+def embed_and_store(docs, use_persistent=True, embed_batch_size=EMBED_BATCH_SIZE, upsert_batch_size=UPSERT_BATCH_SIZE, collection=None, progress=None):
+    """Embed and upsert docs in pipelined batches.
+
+    progress, if given, has its on_stored(docs) called after each batch is
+    written (see src.utils.jobs.IngestJob).
+    """
+    with tracer.trace("embed_and_store"):
+        stats = _embed_and_store(docs, use_persistent, embed_batch_size, upsert_batch_size, collection, progress)
+        tracer.annotate(chunks=stats["stored"], failed=len(stats["failed"]), chunks_per_sec=round(stats["chunks_per_sec"], 1))
+    return stats
+
+def _traced_upsert(collection, embedded):
+    with tracer.span("ingest.upsert"):
+        return _upsert_batch(collection, embedded)
+
+def _embed_and_store(docs, use_persistent, embed_batch_size, upsert_batch_size, collection, progress):
+    embedding_model = get_embedding_model()
+
+    if collection is None:
+        collection = get_collection(use_persistent=use_persistent)
+    lexical_index = get_bm25_index(use_persistent)
+
+    start = time.perf_counter()
+    stored, failed = 0, []
+    pending = None
+
+    def collect(pending):
+        written, write_failed = pending.result()
+        lexical_index.add([id_ for id_, _, _ in written], [doc.page_content for _, doc, _ in written])
+        failed.extend(id_ for id_, _, _ in write_failed)
+        if progress is not None:
+            progress.on_stored([doc for _, doc, _ in written])
+        return len(written)
+
+    # The writer thread upserts batch N while the main thread embeds batch N+1.
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        chunks = tracer.timed_iter("ingest.load_and_chunk", _unique_chunks(docs))
+        for batch in _batched(chunks, upsert_batch_size):
+            with tracer.span("ingest.embed"):
+                embedded, embed_failed = _embed_batch(embedding_model, batch, embed_batch_size)
+            failed.extend(id_ for id_, _ in embed_failed)
+
+            if pending is not None:
+                stored += collect(pending)
+            # The writer runs in a copy of this context so its spans land on this trace.
+            pending = writer.submit(contextvars.copy_context().run, _traced_upsert, collection, embedded)
+
+        if pending is not None:
+            stored += collect(pending)
+
+    if stored:
+        collection.persist()
+        with tracer.span("ingest.lexical_index"):
+            lexical_index.save()
+        bump_collection_version()
+
+    elapsed = time.perf_counter() - start
+    rate = stored / elapsed if elapsed > 0 else 0.0
+    print(f"Stored {stored} chunks in {elapsed:.1f}s ({rate:.1f} chunks/sec).")
+    if hasattr(embedding_model, "cache"):
+        embedding_model.cache.flush()
+        cache_stats = embedding_model.cache.stats()
+        print(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%}).")
+    if failed:
+        print(f"⚠️ {len(failed)} chunks failed after retries: {', '.join(failed[:10])}{' ...' if len(failed) > 10 else ''}")
+
+    return {"stored": stored, "failed": failed, "seconds": elapsed, "chunks_per_sec": rate}
+
+def ingest_reports(folder_path, use_persistent=True, filenames=None, progress=None):
+    """Incrementally sync the PDFs in folder_path into the financials collection.
+
+    Only new or changed reports are parsed and embedded; chunks belonging to
+    deleted reports, or left over from a previous version of a changed report,
+    are removed. The manifest is only kept for the persistent store. progress,
+    if given, receives on_start(changed), on_chunk(doc) and on_stored(docs).
+    """
+    with tracer.trace("ingest", folder=folder_path):
+        stats = _ingest_reports(folder_path, use_persistent, filenames, progress)
+        tracer.annotate(changed=len(stats["changed"]), removed=len(stats["removed"]), chunks=stats["stored"])
+    return stats
+
+def _ingest_reports(folder_path, use_persistent, filenames, progress):
+    collection = get_collection(use_persistent=use_persistent)
+    lexical_index = get_bm25_index(use_persistent)
+    facts_index = get_facts_index(use_persistent)
+    manifest = load_manifest(VECTOR_DB_DIR) if use_persistent else {"files": {}}
+    if manifest.get("metadata_version") != METADATA_VERSION:
+        # Chunk metadata changed shape: re-embed every report once so all chunks carry it.
+        for entry in manifest.get("files", {}).values():
+            entry["sha256"] = None
+        manifest["metadata_version"] = METADATA_VERSION
+    for filename, entry in manifest.get("files", {}).items():
+        # Reports ingested before the facts index existed are parsed again to fill it.
+        if not facts_index.has_report(filename):
+            entry["sha256"] = None
+    changed, removed, hashes = diff_reports(folder_path, manifest, filenames)
+    print(f"{len(changed)} new or changed report(s), {len(hashes) - len(changed)} unchanged, {len(removed)} removed.")
+
+    for filename in removed:
+        _delete_ids(collection, manifest["files"][filename]["chunk_ids"], lexical_index)
+        facts_index.remove_report(filename)
+        del manifest["files"][filename]
+        print(f"🗑️ Removed chunks of deleted report: {filename}")
+    if removed:
+        collection.persist()
+        lexical_index.save()
+        facts_index.save()
+        bump_collection_version()
+        if use_persistent:
+            save_manifest(manifest, VECTOR_DB_DIR)
+
+    if not changed:
+        return {"changed": changed, "removed": removed, "stored": 0, "failed": [], "unparsed": []}
+
+    # All changed reports are parsed in parallel and streamed straight into
+    # embedding; chunk ids are collected per report on the way through.
+    ids_by_file, facts_by_file, unparsed = defaultdict(set), defaultdict(list), set()
+    dedup = Deduplicator()
+    if progress is not None:
+        progress.on_start(changed)
+
+    def track(chunks):
+        for doc in chunks:
+            ids_by_file[doc.metadata["source"]].add(chunk_id(doc))
+            if progress is not None:
+                progress.on_chunk(doc)
+            yield doc
+
+    stats = embed_and_store(track(stream_and_chunk_reports(folder_path, changed, facts_by_file, dedup, unparsed)), use_persistent=use_persistent,
+                            collection=collection, progress=progress)
+    failed = set(stats["failed"])
+    dedup_stats = dedup.summary()
+    tracer.annotate(boilerplate_lines=dedup_stats["boilerplate_lines"], chunks_deduplicated=dedup_stats["chunks_saved"])
+    if dedup.enabled:
+        print(f"Stripped {dedup_stats['boilerplate_lines']} repeated lines ({dedup_stats['boilerplate_chars']} chars) from "
+              f"{dedup_stats['pages']} pages; dropped {dedup_stats['exact_duplicates']} exact and "
+              f"{dedup_stats['near_duplicates']} near-duplicate chunks ({dedup_stats['chunks_saved']} vectors saved).")
+
+    for filename in changed:
+        ids = ids_by_file.get(filename, set())
+        previous = manifest.get("files", {}).get(filename, {}).get("chunk_ids", [])
+        if filename in unparsed:
+            # Pages that failed to parse are not stale: the previous version's chunks
+            # and facts stay until a later run parses the whole report.
+            record_report(manifest, filename, None, ids | set(previous))
+            continue
+        _delete_ids(collection, set(previous) - ids, lexical_index)
+
+        # A report with failed chunks keeps no hash so the next run retries it.
+        record_report(manifest, filename, None if ids & failed else hashes[filename], ids)
+        facts_index.replace_report(filename, facts_by_file.get(filename, []))
+    collection.persist()
+    lexical_index.save()
+    facts_index.save()
+    if use_persistent:
+        save_manifest(manifest, VECTOR_DB_DIR)
+
+    if unparsed:
+        print(f"⚠️ {len(unparsed)} report(s) could not be fully parsed and will be retried: {', '.join(sorted(unparsed))}")
+    return {"changed": changed, "removed": removed, "stored": stats["stored"], "failed": stats["failed"],
+            "unparsed": sorted(unparsed), "dedup": dedup_stats}
 
 if __name__ == "__main__":
     print("Starting ingestion...")
-    docs = load_and_chunk_reports("data/reports")
-    print(f"Loaded and chunked {len(docs)} pieces.")
-    embed_and_store(docs, use_persistent=True)
+    ingest_reports("data/reports", use_persistent=True)
     print("Ingestion complete.")
@@ -0,0 +1,185 @@
+"""Inspect and maintain the financials index under VECTOR_DB_DIR.
+
+    python src/maintain.py stats [--json]               per-report chunks, vector bytes, duplicate rates, orphans
+    python src/maintain.py compact [--dry-run]          delete orphaned and duplicate entries, reclaim space
+    python src/maintain.py export PATH [--half]         write a compressed columnar snapshot
+    python src/maintain.py restore PATH [--replace]     bulk-load a snapshot instead of re-ingesting
+
+Orphans are entries no report in the ingest manifest claims: leftovers of
+runs that died before recording their report, and doc_{i} ids from before
+chunk ids were content hashes. Duplicates are entries of one report with the
+same normalized text.
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import warnings
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.abspath("."))
+
+from src.utils.context import normalize_text
+from src.utils.manifest import load_manifest, save_manifest
+from src.utils.query_cache import bump_collection_version
+from src.utils.resources import get_collection, get_bm25_index
+from src.utils.snapshot import SNAPSHOT_BATCH_SIZE, SNAPSHOT_PATH, export_snapshot, restore_snapshot
+
+load_dotenv()
+
+VECTOR_DB_DIR = os.getenv("VECTOR_DB_DIR")
+LEGACY_ID_RE = re.compile(r"^doc_\d+$")
+
+def _manifest_ids(manifest):
+    return {id_ for entry in manifest.get("files", {}).values() for id_ in entry.get("chunk_ids", [])}
+
+def _scan(collection, batch_size=SNAPSHOT_BATCH_SIZE):
+    """(id, document, metadata) of every entry in the collection."""
+    ids = collection.get(include=[])["ids"]
+    for start in range(0, len(ids), batch_size):
+        part = collection.get(ids=ids[start:start + batch_size], include=["documents", "metadatas"])
+        yield from zip(part["ids"], part["documents"], part["metadatas"])
+
+def _text_key(source, document):
+    return source, hashlib.sha1(normalize_text(document or "").encode("utf-8")).digest()
+
+def _bytes_per_vector(collection, some_id):
+    from src.utils.vector_store import VECTOR_STORE, VECTOR_STORE_DTYPE
+    import numpy as np
+
+    embeddings = collection.get(ids=[some_id], include=["embeddings"])["embeddings"]
+    dim = len(embeddings[0]) if len(embeddings) else 0
+    return dim, dim * (np.dtype(VECTOR_STORE_DTYPE).itemsize if VECTOR_STORE == "numpy" else 4)
+
+def index_stats(collection=None, manifest=None):
+    """Chunk counts, vector bytes, duplicate rates and orphans, per report and in total."""
+    collection = get_collection() if collection is None else collection
+    manifest = load_manifest(VECTOR_DB_DIR) if manifest is None else manifest
+    known = _manifest_ids(manifest)
+    sources, seen, stored = {}, set(), set()
+    for id_, document, metadata in _scan(collection):
+        stored.add(id_)
+        source = (metadata or {}).get("source") or "<no source>"
+        row = sources.setdefault(source, {"chunks": 0, "chars": 0, "duplicates": 0, "orphans": 0, "legacy_ids": 0})
+        row["chunks"] += 1
+        row["chars"] += len(document or "")
+        key = _text_key(source, document)
+        if key in seen:
+            row["duplicates"] += 1
+        seen.add(key)
+        row["legacy_ids"] += bool(LEGACY_ID_RE.match(id_))
+        # Without a manifest there is nothing to tell orphans apart by.
+        row["orphans"] += bool(known) and id_ not in known
+
+    dim, vector_bytes = _bytes_per_vector(collection, next(iter(stored))) if stored else (0, 0)
+    for row in sources.values():
+        row["vector_bytes"] = row["chunks"] * vector_bytes
+        row["duplicate_rate"] = row["duplicates"] / row["chunks"]
+    chunks = sum(row["chunks"] for row in sources.values())
+    duplicates = sum(row["duplicates"] for row in sources.values())
+    return {
+        "chunks": chunks,
+        "dim": dim,
+        "vector_bytes": chunks * vector_bytes,
+        "duplicates": duplicates,
+        "duplicate_rate": duplicates / chunks if chunks else 0.0,
+        "orphans": sum(row["orphans"] for row in sources.values()),
+        "legacy_ids": sum(row["legacy_ids"] for row in sources.values()),
+        "missing": len(known - stored),
+        "reports": len(manifest.get("files", {})),
+        "sources": dict(sorted(sources.items())),
+    }
+
+def compact_index(collection=None, lexical_index=None, dry_run=False, batch_size=SNAPSHOT_BATCH_SIZE):
+    """Delete orphaned and duplicate entries from the store, BM25 index and manifest, then reclaim their space."""
+    collection = get_collection() if collection is None else collection
+    lexical_index = get_bm25_index() if lexical_index is None else lexical_index
+    manifest = load_manifest(VECTOR_DB_DIR)
+    known = _manifest_ids(manifest)
+    entries = sorted(_scan(collection), key=lambda e: (str((e[2] or {}).get("source")), (e[2] or {}).get("page") or 0, e[0]))
+    orphans, duplicates, kept = [], [], set()
+    for id_, document, metadata in entries:
+        if known and id_ not in known:
+            orphans.append(id_)
+            continue
+        key = _text_key((metadata or {}).get("source"), document)
+        if key in kept:
+            # The earliest page keeps the text.
+            duplicates.append(id_)
+        kept.add(key)
+    removed = orphans + duplicates
+    stored = {id_ for id_, _, _ in entries}
+    lexical_orphans = [id_ for id_ in lexical_index.ids() if id_ not in stored]
+    result = {"chunks_before": len(entries), "orphans": len(orphans), "duplicates": len(duplicates),
+              "lexical_orphans": len(lexical_orphans), "chunks_after": len(entries) - len(removed), "dry_run": dry_run}
+    if dry_run:
+        return result
+
+    for start in range(0, len(removed), batch_size):
+        collection.delete(ids=removed[start:start + batch_size])
+    lexical_index.delete(removed + lexical_orphans)
+    dropped = set(duplicates)
+    for entry in manifest.get("files", {}).values():
+        entry["chunk_ids"] = [id_ for id_ in entry.get("chunk_ids", []) if id_ not in dropped]
+    collection.compact()
+    lexical_index.save()
+    if VECTOR_DB_DIR and (duplicates or orphans):
+        save_manifest(manifest, VECTOR_DB_DIR)
+    bump_collection_version()
+    return result
+
+def _mb(n_bytes):
+    return n_bytes / (1 << 20)
+
+def print_stats(stats):
+    width = max([len("Report")] + [len(source) for source in stats["sources"]])
+    print(f"{'Report':<{width}}  {'Chunks':>7}  {'Vectors MB':>10}  {'Dup rate':>8}  {'Orphans':>7}")
+    for source, row in stats["sources"].items():
+        print(f"{source:<{width}}  {row['chunks']:>7}  {_mb(row['vector_bytes']):>10.2f}  {row['duplicate_rate']:>8.1%}  {row['orphans']:>7}")
+    print(f"{'Total':<{width}}  {stats['chunks']:>7}  {_mb(stats['vector_bytes']):>10.2f}  {stats['duplicate_rate']:>8.1%}  {stats['orphans']:>7}")
+    print(f"{stats['reports']} reports in the manifest, {stats['dim']}-d vectors, {stats['legacy_ids']} legacy doc_{{i}} ids, "
+          f"{stats['missing']} manifest chunks missing from the store.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats_parser = commands.add_parser("stats", help="per-report chunk counts, vector bytes, duplicate rates and orphans")
+    stats_parser.add_argument("--json", action="store_true", help="print the stats as JSON")
+    compact_parser = commands.add_parser("compact", help="delete orphaned and duplicate entries")
+    compact_parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    export_parser = commands.add_parser("export", help="write a compressed columnar snapshot")
+    export_parser.add_argument("path", nargs="?" if SNAPSHOT_PATH else None, default=SNAPSHOT_PATH)
+    export_parser.add_argument("--half", action="store_true", help="store vectors as float16 (half the size)")
+    restore_parser = commands.add_parser("restore", help="bulk-load a snapshot")
+    restore_parser.add_argument("path", nargs="?" if SNAPSHOT_PATH else None, default=SNAPSHOT_PATH)
+    restore_parser.add_argument("--replace", action="store_true", help="drop the current contents first")
+    restore_parser.add_argument("--force", action="store_true", help="restore vectors from a different embedding model")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        stats = index_stats()
+        if args.json:
+            print(json.dumps(stats, indent=2))
+        else:
+            print_stats(stats)
+    elif args.command == "compact":
+        result = compact_index(dry_run=args.dry_run)
+        verb = "Would delete" if args.dry_run else "Deleted"
+        print(f"{verb} {result['orphans']} orphaned and {result['duplicates']} duplicate entries "
+              f"({result['chunks_before']} -> {result['chunks_after']} chunks) and {result['lexical_orphans']} stale BM25 entries.")
+    elif args.command == "export":
+        result = export_snapshot(args.path, half=args.half)
+        print(f"📦 Exported {result['chunks']} chunks ({result['dim']}-d) to {result['path']}: "
+              f"{_mb(result['bytes']):.1f} MB in {result['seconds']:.1f}s.")
+    elif args.command == "restore":
+        result = restore_snapshot(args.path, replace=args.replace, force=args.force)
+        print(f"✅ Restored {result['chunks']} chunks of {result['reports']} reports from {result['path']} "
+              f"in {result['seconds']:.1f}s ({result['chunks_per_sec']:.0f} chunks/sec).")
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,141 @@
 import os
+import json
+import time
+import asyncio
 import warnings
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-import chromadb
-from langchain_groq import ChatGroq
-from datetime import datetime
+
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.utils.resources import get_embedding_model, get_collection, get_bm25_index, get_facts_index, get_llm, warmup
+from src.utils.query_cache import query_cache
+from src.utils.tracing import tracer, estimate_tokens
+from src.utils.response_log import get_response_log
+from src.utils.context import assemble_context
 
 load_dotenv()
 
 VECTOR_DB_DIR = os.getenv("VECTOR_DB_DIR")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-client = chromadb.PersistentClient(path=VECTOR_DB_DIR)
-collection = client.get_or_create_collection("financials")
-
-llm = ChatGroq(model_name=os.getenv("GROQ_MODEL"))
+N_RESULTS = int(os.getenv("N_RESULTS", "4"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") != "0"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+FACTS_FAST_PATH = os.getenv("FACTS_FAST_PATH", "1") != "0"
 
 OUTPUT_DIR = "output"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+RESPONSE_LOG_DIR = os.getenv("RESPONSE_LOG_DIR", OUTPUT_DIR)
 
-def query_financials(user_query):
-    query_embedding = embedding_model.embed_query(user_query)
-    results = collection.query(query_embeddings=[query_embedding], n_results=4, include=["documents", "metadatas"])
-    
-    documents = results.get("documents", [[]])[0]
+def embed_query(user_query):
+    return embed_queries([user_query])[0]
 
-    if not documents or all(doc.strip() == "" for doc in documents):
-        return "Information not available."
+def embed_queries(user_queries):
+    # Cache misses are embedded together in a single forward pass.
+    embeddings = [query_cache.embeddings.get(q) for q in user_queries]
+    missing = list(dict.fromkeys(q for q, e in zip(user_queries, embeddings) if e is None))
+    if missing:
+        embedding_model = get_embedding_model()
+        with tracer.span("query.embed"):
+            if len(missing) == 1:
+                computed = [embedding_model.embed_query(missing[0])]
+            else:
+                computed = embedding_model.embed_documents(missing)
+        for q, e in zip(missing, computed):
+            query_cache.embeddings.put(q, e)
+        fresh = dict(zip(missing, computed))
+        embeddings = [e if e is not None else fresh[q] for q, e in zip(user_queries, embeddings)]
+    return embeddings
+
+def retrieve(user_query, n_results=N_RESULTS, filters=None):
+    return retrieve_batch([user_query], n_results=n_results, filters=filters)[0]
+
+def _where(filters):
+    if not filters:
+        return None, None
+    from src.utils.vector_store import build_where  # numpy-backed; kept off the import path
+    where = build_where(filters)
+    return where, json.dumps(where, sort_keys=True, default=str) if where else None
+
+def retrieve_batch(user_queries, n_results=N_RESULTS, filters=None):
+    """Retrieve for many questions at once; filters (e.g. {"company": ..., "fiscal_year": 2024}) are pushed down to the store."""
+    query_cache.check_version()
+    where, where_key = _where(filters)
+    retrieved = [query_cache.retrievals.get((q, n_results, where_key)) for q in user_queries]
+    missing = list(dict.fromkeys(q for q, r in zip(user_queries, retrieved) if r is None))
+    if missing:
+        fresh = _search(missing, n_results, where)
+        for q in missing:
+            query_cache.retrievals.put((q, n_results, where_key), fresh[q])
+        retrieved = [r if r is not None else fresh[q] for q, r in zip(user_queries, retrieved)]
+    return retrieved
+
+def seed_retrievals(user_queries, retrieved, n_results=N_RESULTS):
+    """Cache the top n_results of deeper retrievals so answering those questions skips the search.
 
+    Only valid when the deeper search used the same candidate pool, i.e. its
+    depth was at most max(n_results, HYBRID_CANDIDATES).
+    """
+    for q, r in zip(user_queries, retrieved):
+        query_cache.retrievals.put((q, n_results, None), {key: values[:n_results] for key, values in r.items()})
+
+def _search(user_queries, n_results, where=None):
+    from src.utils.bm25_index import reciprocal_rank_fusion  # numpy-backed; kept off the import path
+
+    collection = get_collection()
+    collection.reload_if_changed()
+    lexical_index = get_bm25_index() if HYBRID_SEARCH else None
+    if lexical_index is not None:
+        lexical_index.reload_if_changed()
+    hybrid = lexical_index is not None and len(lexical_index) > 0
+    n_candidates = max(n_results, HYBRID_CANDIDATES) if hybrid else n_results
+
+    # One multi-embedding query instead of one vector DB round trip per question.
+    query_embeddings = embed_queries(user_queries)
+    with tracer.span("query.vector_search"):
+        results = collection.query(query_embeddings=query_embeddings, n_results=n_candidates, include=["documents", "metadatas"], where=where)
+    empty = [[]] * len(user_queries)
+    found, rankings = {}, {}
+    for i, q in enumerate(user_queries):
+        ids = (results.get("ids") or empty)[i]
+        found.update(zip(ids, zip((results.get("documents") or empty)[i], (results.get("metadatas") or empty)[i])))
+        if hybrid:
+            with tracer.span("query.lexical_search"):
+                lexical_ids = [id_ for id_, _ in lexical_index.search(q, n_candidates)]
+            # BM25 cannot filter, so with a where clause the fused list is cut only after
+            # lexical-only hits have been checked against it below.
+            rankings[q] = reciprocal_rank_fusion([ids, lexical_ids], limit=None if where else n_results)
+        else:
+            rankings[q] = ids[:n_results]
+
+    # Chunks only the lexical side found are fetched in one call.
+    lexical_only = sorted({id_ for ranking in rankings.values() for id_ in ranking} - set(found))
+    if lexical_only:
+        with tracer.span("query.fetch"):
+            extra = collection.get(ids=lexical_only, where=where, include=["documents", "metadatas"])
+        found.update(zip(extra["ids"], zip(extra["documents"], extra["metadatas"])))
+
+    fresh = {}
+    for q, ranking in rankings.items():
+        ranking = [id_ for id_ in ranking if id_ in found][:n_results]
+        fresh[q] = {
+            "ids": ranking,
+            "documents": [found[id_][0] for id_ in ranking],
+            "metadatas": [found[id_][1] for id_ in ranking],
+        }
+    return fresh
+
+def build_prompt(user_query, documents, history=None):
     context = "\n\n".join(documents)
+    conversation = f"""
+Conversation so far (use it only to understand what the question refers to):
+{history}
+""" if history else ""
 
     final_prompt = f"""
 You are a financial analysis assistant with access to a company's financial report. Use only the information provided in the context below to answer the user's question accurately and professionally.
@@ -42,7 +146,7 @@ Instructions:
 - Do not add or assume any information outside the given context.
 - If the answer is not available in the context, respond with: "Information not available."
 - Do not mention the context or documents in your answer.
-
+{conversation}
 Context:
 {context}
 
@@ -51,22 +155,220 @@ Question:
 
 Answer:
 """
+    return final_prompt
+
+def save_response(user_query, answer, chunk_ids=None, timings=None, model=None):
+    # Enqueued for the background writer; see src/utils/response_log.py.
+    get_response_log(RESPONSE_LOG_DIR).append({
+        "question": user_query,
+        "answer": answer,
+        "chunk_ids": list(chunk_ids or []),
+        "timings_ms": timings or {},
+        "model": model or getattr(get_llm(), "model_name", None) or os.getenv("GROQ_MODEL"),
+    })
+
+def fact_answer(user_query, filters=None):
+    """Answer a single-metric lookup straight from the facts index, or None for the RAG path."""
+    filters = filters or {}
+    if not FACTS_FAST_PATH or set(filters) - {"company", "source"} or any(isinstance(v, (list, tuple, set)) for v in filters.values()):
+        return None
+    from src.utils.facts import answer_from_facts
+    with tracer.span("query.facts"):
+        facts_index = get_facts_index()
+        facts_index.reload_if_changed()
+        found = answer_from_facts(facts_index, user_query, filters.get("company"), filters.get("source"))
+    if found is None:
+        return None
+    answer = found[0]
+    tracer.annotate(answer_source="facts")
+    save_response(user_query, answer, timings=tracer.current_spans(), model="facts-index")
+    return answer
+
+def _cached_answer(user_query, retrieved):
+    documents = retrieved["documents"]
+    tracer.annotate(chunks=len(documents))
+    if not documents or all(doc.strip() == "" for doc in documents):
+        return "Information not available."
+    return query_cache.answers.get(query_cache.answer_key(user_query, retrieved["ids"]))
+
+def _store_answer(user_query, retrieved, answer):
+    answer = answer.strip()
+    with tracer.span("query.write"):
+        save_response(user_query, answer, retrieved["ids"], tracer.current_spans())
+    query_cache.answers.put(query_cache.answer_key(user_query, retrieved["ids"]), answer)
+    return answer
+
+def _build_prompt(user_query, retrieved, history=None):
+    with tracer.span("query.prompt_build"):
+        blocks, stats = assemble_context(retrieved["documents"], retrieved["metadatas"])
+        tracer.annotate(context_tokens=stats["tokens_out"], context_tokens_saved=stats["tokens_saved"])
+        return build_prompt(user_query, blocks, history)
+
+def _record_usage(prompt, response):
+    usage = getattr(response, "usage_metadata", None) or {}
+    tracer.annotate(
+        prompt_tokens=usage.get("input_tokens") or estimate_tokens(prompt),
+        completion_tokens=usage.get("output_tokens") or estimate_tokens(response.content),
+    )
+
+def _answer(user_query, retrieved, history=None):
+    answer = _cached_answer(user_query, retrieved)
+    if answer is not None:
+        tracer.annotate(answer_cached=True)
+        return answer
+    prompt = _build_prompt(user_query, retrieved, history)
+    with tracer.span("query.llm"):
+        response = get_llm().invoke(prompt)
+    _record_usage(prompt, response)
+    return _store_answer(user_query, retrieved, response.content)
+
+def _session_retrieve(session, standalone, filters):
+    """(retrieved, embedding) for a conversation turn: the session's cached chunks, extended or replaced as its plan decides."""
+    embedding = embed_query(standalone)
+    # The reuse path skips retrieve(), so the version check happens here: context from before an ingest is dropped.
+    version = query_cache.check_version()
+    mode = session.plan(standalone, embedding, filters, version)
+    tracer.annotate(conversation=mode)
+    retrieved = None if mode == "reuse" else retrieve(standalone, filters=filters)
+    return session.use_context(mode, standalone, embedding, retrieved, filters, version), embedding
+
+def query_financials(user_query, filters=None, session=None):
+    """Answer user_query; filters restricts retrieval by chunk metadata (source, page, company, fiscal_year).
+
+    With a ConversationSession (src.utils.conversation), follow-ups are read
+    against earlier turns and may reuse the session's retrieved context.
+    """
+    with tracer.trace("query", **({"filters": filters} if filters else {})):
+        question = session.standalone(user_query) if session is not None else user_query
+        answer = fact_answer(question, filters)
+        if answer is None:
+            if session is None:
+                return _answer(question, retrieve(question, filters=filters))
+            retrieved, embedding = _session_retrieve(session, question, filters)
+            answer = _answer(question, retrieved, session.history())
+            session.add_turn(user_query, question, answer, retrieved["ids"], embedding)
+        elif session is not None:
+            session.add_turn(user_query, question, answer)
+        return answer
+
+def stream_query_financials(user_query, filters=None, session=None):
+    """Like query_financials, but yields the answer piece by piece as the LLM produces it.
+
+    Cached and "Information not available." answers are yielded in one piece.
+    The full answer is saved and cached once the stream is exhausted.
+    """
+    with tracer.trace("query_stream", **({"filters": filters} if filters else {})):
+        question = session.standalone(user_query) if session is not None else user_query
+        answer = fact_answer(question, filters)
+        retrieved, embedding = {"ids": []}, None
+        if answer is None:
+            if session is None:
+                retrieved = retrieve(question, filters=filters)
+            else:
+                retrieved, embedding = _session_retrieve(session, question, filters)
+            answer = _cached_answer(question, retrieved)
+            if answer is not None:
+                tracer.annotate(answer_cached=True)
+        if answer is not None:
+            if session is not None:
+                session.add_turn(user_query, question, answer, retrieved["ids"], embedding)
+            yield answer
+            return
+
+        prompt = _build_prompt(question, retrieved, session.history() if session is not None else None)
+        parts = []
+        with tracer.span("query.llm"):
+            start = time.perf_counter()
+            for chunk in get_llm().stream(prompt):
+                token = chunk.content
+                if token:
+                    if not parts:
+                        tracer.annotate(first_token_ms=(time.perf_counter() - start) * 1000)
+                    parts.append(token)
+                    yield token
+        answer = "".join(parts)
+        tracer.annotate(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(answer))
+        answer = _store_answer(question, retrieved, answer)
+        if session is not None:
+            session.add_turn(user_query, question, answer, retrieved["ids"], embedding)
+
+def query_financials_batch(user_queries, max_concurrency=LLM_CONCURRENCY, filters=None):
+    """Answer many questions at once; answers come back in input order.
+
+    Questions the facts index answers are done first; the rest are embedded
+    in one forward pass and retrieved with one vector DB query, then up to
+    max_concurrency LLM calls run in parallel.
+    """
+    user_queries = list(user_queries)
+    if not user_queries:
+        return []
+    with tracer.trace("query_batch", questions=len(user_queries)):
+        answers = [fact_answer(q, filters) for q in user_queries]
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        if not pending:
+            return answers
+        queries = [user_queries[i] for i in pending]
+        retrieved = retrieve_batch(queries, filters=filters)
+        # Worker threads run in a copy of this context so their spans land on the batch trace.
+        contexts = [contextvars.copy_context() for _ in queries]
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(queries)))) as pool:
+            for i, answer in zip(pending, pool.map(lambda ctx, q, r: ctx.run(_answer, q, r), contexts, queries, retrieved)):
+                answers[i] = answer
+        return answers
+
+async def aanswer(user_query, retrieved, semaphore=None):
+    """Answer user_query from already retrieved chunks; semaphore, if given, bounds concurrent LLM calls."""
+    answer = _cached_answer(user_query, retrieved)
+    if answer is not None:
+        return answer
+    prompt = _build_prompt(user_query, retrieved)
+    if semaphore is None:
+        with tracer.span("query.llm"):
+            response = await get_llm().ainvoke(prompt)
+    else:
+        async with semaphore:
+            with tracer.span("query.llm"):
+                response = await get_llm().ainvoke(prompt)
+    _record_usage(prompt, response)
+    return await asyncio.to_thread(_store_answer, user_query, retrieved, response.content)
+
+async def aquery_financials(user_query, filters=None):
+    with tracer.trace("query", **({"filters": filters} if filters else {})):
+        answer = fact_answer(user_query, filters)
+        if answer is not None:
+            return answer
+        retrieved = await asyncio.to_thread(retrieve, user_query, N_RESULTS, filters)
+        return await aanswer(user_query, retrieved)
 
-    response = llm.invoke(final_prompt)
+async def aquery_financials_batch(user_queries, max_concurrency=LLM_CONCURRENCY, filters=None):
+    user_queries = list(user_queries)
+    if not user_queries:
+        return []
+    with tracer.trace("query_batch", questions=len(user_queries)):
+        answers = [fact_answer(q, filters) for q in user_queries]
+        pending = [i for i, answer in enumerate(answers) if answer is None]
+        if pending:
+            queries = [user_queries[i] for i in pending]
+            retrieved = await asyncio.to_thread(retrieve_batch, queries, N_RESULTS, filters)
+            semaphore = asyncio.Semaphore(max(1, max_concurrency))
+            generated = await asyncio.gather(*(aanswer(q, r, semaphore) for q, r in zip(queries, retrieved)))
+            for i, answer in zip(pending, generated):
+                answers[i] = answer
+        return answers
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(OUTPUT_DIR, f"response_{timestamp}.txt")
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(f"Question:\n{user_query}\n\n")
-        f.write("Answer:\n")
-        f.write(response.content.strip())
+def cache_stats():
+    return query_cache.stats()
 
-    return response.content.strip()
+def stage_stats():
+    return tracer.stats()
 
 if __name__ == "__main__":
+    warmup()
     while True:
         user_input = input("Ask a question about company financials: ")
         if user_input.lower() in ["exit", "quit"]:
             break
-        response = query_financials(user_input)
-        print("\nAnswer:\n", response)
+        print("\nAnswer:\n", end=" ", flush=True)
+        for token in stream_query_financials(user_input):
+            print(token, end="", flush=True)
+        print()
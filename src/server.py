@@ -0,0 +1,283 @@
+"""Long-lived HTTP service for the query and ingest pipelines.
+
+    python src/server.py                  # uvicorn on SERVER_HOST:SERVER_PORT
+
+Endpoints (JSON in, JSON out):
+    POST /query        {"question": "...", "filters": {...}} -> {"answer": ..., "chunk_ids": [...], "coalesced": bool}
+    POST /ingest       {"filenames": [...]} -> 202 {"job": id}   (reports in SERVER_REPORTS_DIR only)
+    GET  /jobs/<id>    progress snapshot of an ingestion job
+    GET  /stats        server counters, cache hit rates and stage latency
+    GET  /health
+
+Concurrent requests are retrieved together: questions arriving within
+SERVER_BATCH_WINDOW_MS share one embedding forward pass and one vector DB
+query. Identical in-flight questions share one retrieval and one LLM call.
+Once LLM_CONCURRENCY calls are running and SERVER_MAX_QUEUE more are waiting,
+new questions get an immediate 429 instead of queueing without bound.
+"""
+
+import os
+import json
+import asyncio
+import contextvars
+
+from dotenv import load_dotenv
+
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import query
+from src.utils.query_cache import normalize_question
+from src.utils.jobs import get_job_registry
+from src.utils.tracing import tracer
+from src.utils.llm_gateway import LLMUnavailableError
+
+load_dotenv()
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_BATCH_WINDOW_MS = float(os.getenv("SERVER_BATCH_WINDOW_MS", "5"))
+SERVER_MAX_BATCH = int(os.getenv("SERVER_MAX_BATCH", "32"))
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", str(2 * query.LLM_CONCURRENCY)))
+# The only folder /ingest reads from; requests name files in it, never paths.
+SERVER_REPORTS_DIR = os.path.abspath(os.getenv("SERVER_REPORTS_DIR", os.path.join("data", "reports")))
+MAX_BODY_BYTES = 1024 * 1024
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or []
+
+def _filters_key(filters):
+    return json.dumps(filters, sort_keys=True, default=str) if filters else None
+
+class RetrievalBatcher:
+    """Collects questions for up to window_ms and retrieves them with one retrieve_batch() call."""
+
+    def __init__(self, window_ms=SERVER_BATCH_WINDOW_MS, max_batch=SERVER_MAX_BATCH):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.questions = 0
+        self._pending = []
+        self._timer = None
+
+    async def retrieve(self, question, filters=None):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((question, filters, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush, context=contextvars.Context())
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if pending:
+            self.batches += 1
+            self.questions += len(pending)
+            # A shared batch belongs to no single request's trace (create_task's context= needs 3.11).
+            contextvars.Context().run(asyncio.get_running_loop().create_task, self._run(pending))
+
+    async def _run(self, pending):
+        # Questions with the same filters share one retrieve_batch() call.
+        groups = {}
+        for question, filters, future in pending:
+            groups.setdefault(_filters_key(filters), (filters, []))[1].append((question, future))
+        for filters, items in groups.values():
+            try:
+                results = await asyncio.to_thread(query.retrieve_batch, [q for q, _ in items], query.N_RESULTS, filters)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(items, results):
+                if not future.done():
+                    future.set_result(result)
+
+class QueryService:
+    def __init__(self, max_concurrency=query.LLM_CONCURRENCY, max_queue=SERVER_MAX_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.batcher = RetrievalBatcher()
+        self.requests = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.facts_answers = 0
+        self.active = 0
+        self._inflight = {}
+        self._semaphore = None
+
+    async def answer(self, question, filters=None):
+        """Answer question, joining an identical in-flight request if there is one."""
+        self.requests += 1
+        key = (normalize_question(question), _filters_key(filters))
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            # Registered before the first await, so identical questions arriving meanwhile join this task.
+            task = asyncio.ensure_future(self._answer(question, filters))
+            self._inflight[key] = task
+
+            def done(_):
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+
+            task.add_done_callback(done)
+        result = await asyncio.shield(task)
+        return {**result, "coalesced": coalesced}
+
+    async def _answer(self, question, filters):
+        # Metric lookups the facts index can answer never take LLM capacity.
+        answer = await asyncio.to_thread(query.fact_answer, question, filters)
+        if answer is not None:
+            self.facts_answers += 1
+            return {"answer": answer, "chunk_ids": []}
+
+        if self.active >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise HTTPError(429, "LLM capacity exhausted, retry shortly", [(b"retry-after", b"1")])
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.active += 1
+        try:
+            with tracer.trace("query", **({"filters": filters} if filters else {})):
+                retrieved = await self.batcher.retrieve(question, filters)
+                answer = await query.aanswer(question, retrieved, self._semaphore)
+        finally:
+            self.active -= 1
+        return {"answer": answer, "chunk_ids": retrieved["ids"]}
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "facts_answers": self.facts_answers,
+            "active": self.active,
+            "retrieval_batches": self.batcher.batches,
+            "mean_batch_size": self.batcher.questions / self.batcher.batches if self.batcher.batches else 0.0,
+        }
+
+async def _read_json(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "request body too large")
+        if not message.get("more_body"):
+            break
+    try:
+        payload = json.loads(body or b"{}")
+    except json.JSONDecodeError:
+        raise HTTPError(400, "body must be JSON")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "body must be a JSON object")
+    return payload
+
+def _report_filenames(filenames):
+    """filenames checked to be plain names of files in SERVER_REPORTS_DIR."""
+    if filenames is None:
+        return None
+    if not isinstance(filenames, list) or not all(isinstance(name, str) for name in filenames):
+        raise HTTPError(400, "'filenames' must be a list of file names")
+    for name in filenames:
+        if name in ("", ".", "..") or os.path.basename(name) != name or (os.altsep and os.altsep in name):
+            raise HTTPError(400, f"'filenames' must be plain file names, not paths: {name!r}")
+        if not os.path.isfile(os.path.join(SERVER_REPORTS_DIR, name)):
+            raise HTTPError(400, f"report not found: {name}")
+    return filenames
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class App:
+    """Minimal ASGI application; uvicorn is the only serving dependency."""
+
+    def __init__(self, service=None):
+        self.service = service or QueryService()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            status, payload = await self._route(scope["method"], scope["path"], receive)
+            await _send_json(send, status, payload)
+        except HTTPError as e:
+            await _send_json(send, e.status, {"error": e.message}, e.headers)
+        except LLMUnavailableError as e:
+            await _send_json(send, 503, {"error": str(e)}, [(b"retry-after", b"5")])
+        except Exception as e:
+            await _send_json(send, 500, {"error": repr(e)})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Load the models before taking traffic rather than on the first request.
+                await asyncio.to_thread(query.warmup)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _route(self, method, path, receive):
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/query":
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            body = await _read_json(receive)
+            question, filters = body.get("question"), body.get("filters")
+            if not isinstance(question, str) or not question.strip():
+                raise HTTPError(400, "'question' must be a non-empty string")
+            if filters is not None and not isinstance(filters, dict):
+                raise HTTPError(400, "'filters' must be an object, e.g. {\"company\": \"...\", \"fiscal_year\": 2024}")
+            return 200, await self.service.answer(question, filters)
+        if path == "/ingest":
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            body = await _read_json(receive)
+            if "folder" in body:
+                raise HTTPError(400, "'folder' is not accepted; reports are ingested from the server's reports folder")
+            filenames = _report_filenames(body.get("filenames"))
+            if not os.path.isdir(SERVER_REPORTS_DIR):
+                raise HTTPError(503, "reports folder not found on the server")
+            # Without filenames the whole folder is synced, including removals.
+            job = get_job_registry().submit(SERVER_REPORTS_DIR, filenames)
+            return 202, {"job": job.id}
+        if path.startswith("/jobs/"):
+            job = get_job_registry().get(path[len("/jobs/"):])
+            if job is None:
+                raise HTTPError(404, "unknown job")
+            return 200, job.snapshot()
+        if path == "/stats":
+            llm = query.get_llm()
+            return 200, {"server": self.service.stats(), "cache": query.cache_stats(), "stages": query.stage_stats(),
+                         "llm": llm.stats() if hasattr(llm, "stats") else {}}
+        raise HTTPError(404, "not found")
+
+app = App()
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT, log_level="warning")
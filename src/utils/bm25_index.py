@@ -0,0 +1,189 @@
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+INDEX_FILENAME = "bm25_index.npz"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+def tokenize(text):
+    # Keeps figures like "2024", "12.5" and "1,234" as single terms.
+    return _TOKEN_RE.findall(text.lower())
+
+class _Postings:
+    """Immutable CSR snapshot: the docs and term frequencies of term t are
+    docs[offsets[t]:offsets[t + 1]] and tfs[offsets[t]:offsets[t + 1]]."""
+
+    def __init__(self, vocab, offsets, docs, tfs, doc_ids, doc_len, alive):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_ids = doc_ids
+        self.doc_len = doc_len
+        self.alive = alive
+        self.id_to_row = {doc_id: row for row, doc_id in enumerate(doc_ids)}
+        live_len = doc_len[alive]
+        self.n_live = int(alive.sum())
+        self.avg_len = float(live_len.mean()) if len(live_len) else 0.0
+
+    @classmethod
+    def empty(cls):
+        return cls({}, np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32),
+                   [], np.zeros(0, dtype=np.float32), np.zeros(0, dtype=bool))
+
+class BM25Index:
+    """Okapi BM25 over chunk texts with array-backed postings.
+
+    Additions and deletions are buffered and folded into a new compact snapshot
+    by commit(); queries always run against the last committed snapshot, so a
+    commit in one thread never disturbs searches in another.
+    """
+
+    def __init__(self, path=None, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._snapshot = _Postings.empty()
+        self._pending_add = {}
+        self._pending_delete = set()
+        self._lock = threading.Lock()
+        self._mtime = None
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return self._snapshot.n_live
+
+    def ids(self):
+        """Ids of the committed documents."""
+        snap = self._snapshot
+        return [doc_id for doc_id, live in zip(snap.doc_ids, snap.alive) if live]
+
+    def add(self, ids, texts):
+        with self._lock:
+            for id_, text in zip(ids, texts):
+                self._pending_delete.discard(id_)
+                self._pending_add[id_] = Counter(tokenize(text))
+
+    def delete(self, ids):
+        with self._lock:
+            for id_ in ids:
+                self._pending_add.pop(id_, None)
+                self._pending_delete.add(id_)
+
+    def commit(self):
+        with self._lock:
+            if not self._pending_add and not self._pending_delete:
+                return
+            pending_add, self._pending_add = self._pending_add, {}
+            pending_delete, self._pending_delete = self._pending_delete, set()
+
+        old = self._snapshot
+        alive = old.alive.copy()
+        for id_ in pending_delete | set(pending_add):
+            row = old.id_to_row.get(id_)
+            if row is not None:
+                alive[row] = False
+
+        # Existing postings as (term, old row, tf) triples, dropping dead rows.
+        old_terms = np.repeat(np.arange(len(old.vocab), dtype=np.int64), np.diff(old.offsets))
+        keep = alive[old.docs] if len(old.docs) else np.zeros(0, dtype=bool)
+        old_terms, old_rows, old_tfs = old_terms[keep], old.docs[keep], old.tfs[keep]
+
+        # Renumber surviving rows densely, then append the new documents.
+        new_row_of_old = np.cumsum(alive) - 1
+        doc_ids = [doc_id for doc_id, live in zip(old.doc_ids, alive) if live]
+        doc_len = list(old.doc_len[alive])
+        vocab = dict(old.vocab)
+        add_terms, add_rows, add_tfs = [], [], []
+        for id_, counts in pending_add.items():
+            row = len(doc_ids)
+            doc_ids.append(id_)
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                add_terms.append(vocab.setdefault(term, len(vocab)))
+                add_rows.append(row)
+                add_tfs.append(tf)
+
+        terms = np.concatenate([old_terms, np.asarray(add_terms, dtype=np.int64)])
+        rows = np.concatenate([new_row_of_old[old_rows], np.asarray(add_rows, dtype=np.int64)]).astype(np.int32)
+        tfs = np.concatenate([old_tfs, np.asarray(add_tfs, dtype=np.float32)])
+        order = np.lexsort((rows, terms))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+
+        self._snapshot = _Postings(
+            vocab, offsets, rows[order], tfs[order], doc_ids,
+            np.asarray(doc_len, dtype=np.float32), np.ones(len(doc_ids), dtype=bool),
+        )
+
+    def search(self, query, k=10):
+        """Return up to k (chunk_id, score) pairs, best first."""
+        snap = self._snapshot
+        if snap.n_live == 0:
+            return []
+        term_ids = {snap.vocab[t] for t in tokenize(query) if t in snap.vocab}
+        if not term_ids:
+            return []
+
+        scores = np.zeros(len(snap.doc_ids), dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * snap.doc_len / snap.avg_len)
+        for t in term_ids:
+            start, stop = snap.offsets[t], snap.offsets[t + 1]
+            docs, tfs = snap.docs[start:stop], snap.tfs[start:stop]
+            df = len(docs)
+            idf = np.log(1 + (snap.n_live - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+        k = min(k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(snap.doc_ids[i], float(scores[i])) for i in top]
+
+    def save(self, path=None):
+        self.commit()
+        path = path or self.path
+        if not path:
+            return
+        snap = self._snapshot
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        vocab = sorted(snap.vocab, key=snap.vocab.get)
+        np.savez(
+            tmp_path,
+            vocab=np.asarray(vocab, dtype=str), offsets=snap.offsets, docs=snap.docs, tfs=snap.tfs,
+            doc_ids=np.asarray(snap.doc_ids, dtype=str), doc_len=snap.doc_len,
+        )
+        os.replace(tmp_path, path)
+        self._mtime = os.path.getmtime(path)
+
+    def load(self, path=None):
+        path = path or self.path
+        with np.load(path) as data:
+            vocab = {term: i for i, term in enumerate(data["vocab"].tolist())}
+            doc_ids = data["doc_ids"].tolist()
+            self._snapshot = _Postings(
+                vocab, data["offsets"], data["docs"], data["tfs"], doc_ids, data["doc_len"],
+                np.ones(len(doc_ids), dtype=bool),
+            )
+        self._mtime = os.path.getmtime(path)
+
+    def reload_if_changed(self):
+        # Picks up commits made by another process (e.g. a CLI ingestion run).
+        if self.path and os.path.exists(self.path) and os.path.getmtime(self.path) != self._mtime:
+            self.load()
+
+def reciprocal_rank_fusion(rankings, k=60, limit=None):
+    """Fuse several ranked id lists; an id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank + 1)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:limit] if limit else fused
@@ -0,0 +1,139 @@
+import os
+import re
+import hashlib
+
+from src.utils.tracing import estimate_tokens
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+MIN_OVERLAP_CHARS = 20
+
+_WS_RE = re.compile(r"\s+")
+
+def normalize_text(text):
+    return _WS_RE.sub(" ", text).strip().lower()
+
+def shingles(text, n=5):
+    words = normalize_text(text).split()
+    if len(words) < n:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def _suffix_prefix_overlap(a, b, max_overlap=1000):
+    # Length of the longest suffix of a that is also a prefix of b (at least MIN_OVERLAP_CHARS).
+    if len(b) < MIN_OVERLAP_CHARS:
+        return 0
+    anchor = b[:MIN_OVERLAP_CHARS]
+    pos = a.find(anchor, max(0, len(a) - max_overlap))
+    while pos != -1:
+        size = len(a) - pos
+        if size <= len(b) and b.startswith(a[pos:]):
+            return size
+        pos = a.find(anchor, pos + 1)
+    return 0
+
+class _Block:
+    def __init__(self, text, rank, source, page, start, part=None):
+        self.text = text
+        self.rank = rank
+        self.source = source
+        self.page = page
+        self.part = part
+        self.start = start
+        self.end = start + len(text) if start is not None else None
+
+    def try_merge(self, other):
+        """Merge other into this block if they overlap or touch; return True on success."""
+        if self.source != other.source or self.page != other.page or self.part != other.part:
+            return False
+        if self.start is not None and other.start is not None:
+            first, second = (self, other) if self.start <= other.start else (other, self)
+            if second.start > first.end:
+                return False
+            text = first.text + second.text[first.end - second.start:] if second.end > first.end else first.text
+            self.text, self.start, self.end = text, first.start, max(first.end, second.end)
+        elif self.text in other.text or other.text in self.text:
+            self.text = max(self.text, other.text, key=len)
+        else:
+            # No offsets (chunks stored before start_index was recorded): detect the splitter overlap in the text.
+            overlap = _suffix_prefix_overlap(self.text, other.text)
+            if overlap:
+                self.text = self.text + other.text[overlap:]
+            else:
+                overlap = _suffix_prefix_overlap(other.text, self.text)
+                if not overlap:
+                    return False
+                self.text = other.text + self.text[overlap:]
+        self.rank = min(self.rank, other.rank)
+        return True
+
+def _truncate_to_tokens(text, tokens):
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit]
+
+def assemble_context(documents, metadatas=None, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Turn ranked retrieved chunks into a compact, budgeted list of context blocks.
+
+    Overlapping or adjacent chunks from the same source and page are merged,
+    exact and near-duplicate blocks are dropped, and blocks are packed best rank
+    first until token_budget is reached. Returns (blocks, stats).
+    """
+    metadatas = metadatas or [{}] * len(documents)
+    tokens_in = sum(estimate_tokens(doc) for doc in documents)
+
+    blocks = []
+    for rank, (doc, meta) in enumerate(zip(documents, metadatas)):
+        if not doc or not doc.strip():
+            continue
+        meta = meta or {}
+        # Offsets are only comparable within one part of a page: its running text or one table row group.
+        part = (meta.get("table_index"), meta.get("rows")) if meta.get("content_type") == "table" else None
+        block = _Block(doc.strip() if meta.get("start_index") is None else doc, rank,
+                       meta.get("source"), meta.get("page"), meta.get("start_index"), part)
+        merged = next((existing for existing in blocks if existing.try_merge(block)), None)
+        if merged is None:
+            blocks.append(block)
+            continue
+        # The grown block may now reach blocks it did not before: in the order A, C, B, chunk B bridges A and C.
+        while True:
+            other = next((existing for existing in blocks if existing is not merged and merged.try_merge(existing)), None)
+            if other is None:
+                break
+            blocks.remove(other)
+
+    unique, seen_hashes, seen_shingles = [], set(), []
+    for block in sorted(blocks, key=lambda b: b.rank):
+        digest = hashlib.sha1(normalize_text(block.text).encode("utf-8")).hexdigest()
+        block_shingles = shingles(block.text)
+        if digest in seen_hashes or any(jaccard(block_shingles, s) >= NEAR_DUPLICATE_THRESHOLD for s in seen_shingles):
+            continue
+        seen_hashes.add(digest)
+        seen_shingles.append(block_shingles)
+        unique.append(block)
+
+    packed, used = [], 0
+    for block in unique:
+        cost = estimate_tokens(block.text)
+        if used + cost <= token_budget:
+            packed.append(block.text)
+            used += cost
+        elif not packed:
+            packed.append(_truncate_to_tokens(block.text, token_budget))
+            used = estimate_tokens(packed[0])
+
+    stats = {
+        "chunks_in": len(documents),
+        "blocks_out": len(packed),
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "tokens_saved": max(0, tokens_in - used),
+    }
+    return packed, stats
@@ -0,0 +1,135 @@
+"""Per-conversation state for follow-up questions in the chat tab.
+
+A follow-up like "and what about 2023?" is first rewritten into a standalone
+question from the previous one. Its embedding is then compared with the
+embedding of the question that produced the cached context:
+
+* reuse   -- near-identical topic and no new figures/years: answer from the
+             cached chunks, no vector search;
+* extend  -- related topic: search, then keep the new chunks followed by the
+             cached ones (bounded by CONVERSATION_MAX_CHUNKS);
+* replace -- unrelated: a normal fresh retrieval.
+
+Cached context belongs to the collection version it was retrieved at, so
+after an ingest the next turn searches again instead of reusing stale chunks.
+
+Earlier turns are condensed into a short history bounded by
+CONVERSATION_HISTORY_TOKENS, so prompts do not grow with the chat.
+"""
+
+import os
+import re
+import threading
+from collections import deque
+
+import numpy as np
+
+from src.utils.tracing import estimate_tokens
+
+CONVERSATION_REUSE_SIMILARITY = float(os.getenv("CONVERSATION_REUSE_SIMILARITY", "0.92"))
+CONVERSATION_EXTEND_SIMILARITY = float(os.getenv("CONVERSATION_EXTEND_SIMILARITY", "0.6"))
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "6"))
+CONVERSATION_MAX_CHUNKS = int(os.getenv("CONVERSATION_MAX_CHUNKS", "8"))
+CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "300"))
+ANSWER_SUMMARY_WORDS = 40
+
+_FOLLOW_UP_RE = re.compile(r"^\s*(?:and|also|then|so|what about|how about|same for|what of)\b", re.IGNORECASE)
+_REFERENCE_RE = re.compile(r"\b(?:it|its|that|those|these|they|them|this|same)\b", re.IGNORECASE)
+_FILLER_RE = re.compile(r"\b(?:and|also|then|so|what|how|about|for|same|of|in|the|year|fy)\b", re.IGNORECASE)
+_FIGURE_RE = re.compile(r"\b\d[\d,.]*\b")
+_YEAR_RE = re.compile(r"\b(?:19[89]\d|20\d\d)\b")
+FOLLOW_UP_MAX_WORDS = 8
+
+def _cosine(a, b):
+    a, b = np.asarray(a, dtype=np.float32), np.asarray(b, dtype=np.float32)
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / denom if denom else 0.0
+
+class ConversationSession:
+    def __init__(self, max_turns=CONVERSATION_MAX_TURNS, max_chunks=CONVERSATION_MAX_CHUNKS,
+                 history_tokens=CONVERSATION_HISTORY_TOKENS):
+        self.turns = deque(maxlen=max_turns)
+        self.max_chunks = max_chunks
+        self.history_tokens = history_tokens
+        self.context = None            # retrieved dict (ids, documents, metadatas) of the last search
+        self.context_query = None      # standalone question that produced it
+        self.context_embedding = None
+        self.context_filters = None
+        self.context_version = None    # collection version the context was retrieved at
+        self.plans = {"reuse": 0, "extend": 0, "replace": 0}
+        self._lock = threading.Lock()
+
+    def standalone(self, question):
+        """question rewritten to stand on its own, using the previous turn for short follow-ups."""
+        if not self.turns:
+            return question
+        previous = self.turns[-1]["standalone"]
+        words = question.split()
+        if len(words) > FOLLOW_UP_MAX_WORDS or not (_FOLLOW_UP_RE.search(question) or _REFERENCE_RE.search(question)):
+            return question
+        new_years, old_years = _YEAR_RE.findall(question), _YEAR_RE.findall(previous)
+        if new_years and old_years and not _FILLER_RE.sub("", _YEAR_RE.sub("", question)).strip(" ?.!,"):
+            # "and 2023?" / "what about 2023?": the same question for another year.
+            rewritten = previous
+            for old, new in zip(dict.fromkeys(old_years), new_years):
+                rewritten = rewritten.replace(old, new)
+            return rewritten
+        return f"{previous} {question}"
+
+    def plan(self, standalone, embedding, filters=None, version=None):
+        """Whether to "reuse", "extend" or "replace" the cached context for a question with this embedding."""
+        if self.context is None or filters != self.context_filters or version != self.context_version:
+            return "replace"
+        similarity = _cosine(embedding, self.context_embedding)
+        new_figures = set(_FIGURE_RE.findall(standalone)) - set(_FIGURE_RE.findall(self.context_query))
+        if similarity >= CONVERSATION_REUSE_SIMILARITY and not new_figures:
+            return "reuse"
+        if similarity >= CONVERSATION_EXTEND_SIMILARITY:
+            return "extend"
+        return "replace"
+
+    def use_context(self, mode, standalone, embedding, retrieved, filters=None, version=None):
+        """Cache the context for mode and return the retrieved dict to answer from."""
+        with self._lock:
+            self.plans[mode] += 1
+            if mode == "reuse":
+                return self.context
+            if mode == "extend":
+                # New chunks first, then the cached ones the new search did not return.
+                seen, merged = set(), {"ids": [], "documents": [], "metadatas": []}
+                for source in (retrieved, self.context):
+                    for id_, doc, meta in zip(source["ids"], source["documents"], source["metadatas"]):
+                        if id_ not in seen and len(merged["ids"]) < self.max_chunks:
+                            seen.add(id_)
+                            merged["ids"].append(id_)
+                            merged["documents"].append(doc)
+                            merged["metadatas"].append(meta)
+                retrieved = merged
+            self.context, self.context_query, self.context_embedding, self.context_filters = retrieved, standalone, embedding, filters
+            self.context_version = version
+            return retrieved
+
+    def add_turn(self, question, standalone, answer, chunk_ids=(), embedding=None):
+        """Record a turn with the chunks its answer came from and its question embedding (None for facts answers)."""
+        with self._lock:
+            self.turns.append({"question": question, "standalone": standalone, "answer": answer,
+                               "chunk_ids": list(chunk_ids), "embedding": embedding})
+
+    def history(self):
+        """Condensed earlier turns, newest kept first when the token budget runs out."""
+        lines, used = [], 0
+        for turn in reversed(self.turns):
+            words = turn["answer"].split()
+            answer = " ".join(words[:ANSWER_SUMMARY_WORDS]) + (" ..." if len(words) > ANSWER_SUMMARY_WORDS else "")
+            entry = f"User: {turn['standalone']}\nAssistant: {answer}"
+            cost = estimate_tokens(entry)
+            if used + cost > self.history_tokens:
+                break
+            lines.append(entry)
+            used += cost
+        return "\n".join(reversed(lines))
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.context = self.context_query = self.context_embedding = self.context_filters = self.context_version = None
@@ -0,0 +1,164 @@
+"""Ingest-time removal of page furniture and duplicate chunks.
+
+Lines that recur on a large share of a report's pages (running headers and
+footers, "Page N", legal disclaimers) are stripped before chunking. They are
+learned from a sample of each report's first pages, and the rest of the
+report streams through, so memory does not grow with report length. Chunks
+are then deduplicated exactly and by MinHash/LSH near-duplicate detection
+(verified with the exact 5-gram Jaccard used by the context assembler).
+
+Both steps work within one report at a time: a chunk is never dropped because
+another report contains it, so deleting or re-ingesting one report cannot
+remove text another report still needs.
+"""
+
+import os
+import re
+import zlib
+import hashlib
+from itertools import chain, groupby
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.utils.context import normalize_text, shingles, jaccard
+
+INGEST_DEDUP = os.getenv("INGEST_DEDUP", "1") != "0"
+BOILERPLATE_MIN_FRACTION = float(os.getenv("BOILERPLATE_MIN_FRACTION", "0.5"))
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", "3"))
+BOILERPLATE_SAMPLE_PAGES = int(os.getenv("BOILERPLATE_SAMPLE_PAGES", "50"))
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", "0.9"))
+
+SHORT_LINE_CHARS = 40
+EDGE_LINES = 2
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_rng = np.random.default_rng(20240531)
+_A = _rng.integers(1, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+_DIGITS_RE = re.compile(r"\d+")
+_LETTER_RE = re.compile(r"[^\W\d_]")
+
+def _line_keys(text):
+    """Boilerplate key per line of text; None for lines that are never furniture."""
+    lines = text.splitlines()
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(filled[:EDGE_LINES] + filled[-EDGE_LINES:])
+    keys = []
+    for i, line in enumerate(lines):
+        line = " ".join(line.split()).lower()
+        if not _LETTER_RE.search(line):
+            # Table cells and bare numbers are always content.
+            keys.append(None)
+        elif len(line) > SHORT_LINE_CHARS:
+            # Long lines (disclaimers) must repeat verbatim, or prose differing only in figures would match.
+            keys.append(line)
+        elif i in edges:
+            # Short header/footer lines have digits masked, so "Page 3" and "Page 4" match.
+            keys.append(_DIGITS_RE.sub("#", line))
+        else:
+            # Short lines mid-page are mostly wrapped sentence tails ("banking."), not furniture.
+            keys.append(None)
+    return lines, keys
+
+def minhash(text_shingles):
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in text_shingles), dtype=np.uint64, count=len(text_shingles))
+    return ((hashes[:, None] * _A + _B) % _PRIME).min(axis=0)
+
+class Deduplicator:
+    """Strips repeated page lines and drops duplicate chunks, counting what was saved."""
+
+    def __init__(self, enabled=INGEST_DEDUP, min_fraction=BOILERPLATE_MIN_FRACTION, min_pages=BOILERPLATE_MIN_PAGES,
+                 near_threshold=DEDUP_NEAR_THRESHOLD, sample_pages=BOILERPLATE_SAMPLE_PAGES):
+        self.enabled = enabled
+        self.min_fraction = min_fraction
+        self.min_pages = min_pages
+        self.sample_pages = sample_pages
+        self.near_threshold = near_threshold
+        self.stats = {"pages": 0, "boilerplate_lines": 0, "boilerplate_chars": 0,
+                      "chunks_in": 0, "exact_duplicates": 0, "near_duplicates": 0}
+
+    def strip_boilerplate(self, pages):
+        """Yield pages with lines repeated across their report removed. Pages must arrive grouped by report."""
+        if not self.enabled:
+            yield from pages
+            return
+        for _, report in groupby(pages, key=lambda page: page.metadata.get("source")):
+            yield from self._strip_report(report)
+
+    def _strip_report(self, pages):
+        # Only the first sample_pages text pages are held back, to learn the report's repeated lines.
+        sample, split = [], {}
+        for page in pages:
+            sample.append(page)
+            # Table row groups are never furniture; the running text of each page is.
+            if page.metadata.get("content_type") != "table":
+                split[id(page)] = _line_keys(page.page_content)
+                if len(split) >= self.sample_pages:
+                    break
+        boilerplate = self._boilerplate([keys for _, keys in split.values()])
+        for page in chain(sample, pages):
+            yield self._strip_page(page, boilerplate, split.pop(id(page), None))
+
+    def _boilerplate(self, page_keys):
+        """Line keys found on at least min_fraction (and min_pages) of the sampled pages."""
+        if len(page_keys) < self.min_pages:
+            return set()
+        page_counts = {}
+        for keys in page_keys:
+            for key in set(keys) - {None}:
+                page_counts[key] = page_counts.get(key, 0) + 1
+        threshold = max(self.min_pages, self.min_fraction * len(page_keys))
+        return {key for key, count in page_counts.items() if count >= threshold}
+
+    def _strip_page(self, page, boilerplate, split=None):
+        if page.metadata.get("content_type") == "table":
+            return page
+        self.stats["pages"] += 1
+        if not boilerplate:
+            return page
+        kept = []
+        for line, key in zip(*(split or _line_keys(page.page_content))):
+            if key in boilerplate:
+                self.stats["boilerplate_lines"] += 1
+                self.stats["boilerplate_chars"] += len(line)
+            else:
+                kept.append(line)
+        return Document(page_content="\n".join(kept), metadata=page.metadata)
+
+    def unique_chunks(self, chunks):
+        """Yield chunks, skipping exact and near duplicates of an earlier chunk of the same report."""
+        if not self.enabled:
+            yield from chunks
+            return
+        for _, report in groupby(chunks, key=lambda doc: doc.metadata.get("source")):
+            digests, buckets, kept_shingles = set(), {}, []
+            for doc in report:
+                self.stats["chunks_in"] += 1
+                if not doc.page_content.strip():
+                    self.stats["exact_duplicates"] += 1
+                    continue
+                digest = hashlib.sha1(normalize_text(doc.page_content).encode("utf-8")).digest()
+                if digest in digests:
+                    self.stats["exact_duplicates"] += 1
+                    continue
+                doc_shingles = shingles(doc.page_content)
+                rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+                signature = minhash(list(doc_shingles))
+                keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(MINHASH_BANDS)]
+                # LSH: only chunks sharing a band with this one are compared exactly.
+                candidates = {i for key in keys for i in buckets.get(key, ())}
+                if any(jaccard(doc_shingles, kept_shingles[i]) >= self.near_threshold for i in candidates):
+                    self.stats["near_duplicates"] += 1
+                    continue
+                digests.add(digest)
+                for key in keys:
+                    buckets.setdefault(key, []).append(len(kept_shingles))
+                kept_shingles.append(doc_shingles)
+                yield doc
+
+    def summary(self):
+        removed = self.stats["exact_duplicates"] + self.stats["near_duplicates"]
+        return {**self.stats, "chunks_out": self.stats["chunks_in"] - removed, "chunks_saved": removed}
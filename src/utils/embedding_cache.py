@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import heapq
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in different processes are not serialized.
+    fcntl = None
+
+MAX_PENDING = 4096
+KEY_BYTES = 16
+
+def _row_tag(key):
+    return np.frombuffer(hashlib.blake2b(key.encode("utf-8"), digest_size=KEY_BYTES).digest(), dtype=np.uint8)
+
+class EmbeddingCache:
+    """Content-addressed store of embeddings for one model.
+
+    Vectors live in a memory-mapped float32 matrix (<name>.f32); a JSON index
+    maps each key to its row and a last-used tick so the least recently used
+    rows are overwritten once max_entries is reached.
+
+    Every process shares the cache directory, so new vectors are held in memory
+    until flush(), which takes a file lock, re-reads the index other processes
+    may have written and only then picks rows for them. Rows are therefore
+    never handed out twice, and an index that changed on disk is picked up by
+    the next lookup.
+
+    A reader can still hold an index from before another process evicted and
+    rewrote one of its rows, so each row's key is stored next to it
+    (<name>.keys) and checked on every read; a row that now belongs to another
+    key is a miss.
+    """
+
+    def __init__(self, cache_dir, model_name, max_entries=200_000, flush_interval=5.0):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_flush = time.monotonic()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in model_name)
+        self._matrix_path = os.path.join(cache_dir, f"{slug}.f32")
+        self._index_path = os.path.join(cache_dir, f"{slug}.index.json")
+        self._keys_path = os.path.join(cache_dir, f"{slug}.keys")
+        self._lock_path = os.path.join(cache_dir, f"{slug}.lock")
+
+        self.dim = None
+        self._capacity = 0
+        self._rows = {}  # key -> [row, last_used_tick]
+        self._tick = 0
+        self._matrix = None
+        self._keys = None  # row -> tag of the key whose vector it holds
+        self._pending = {}  # key -> vector not yet written to the matrix
+        self._index_mtime = None
+        self._refresh()
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self, force=False):
+        """Adopt the on-disk index if another process rewrote it since it was last read."""
+        try:
+            mtime = os.stat(self._index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if (mtime == self._index_mtime and not force) or not os.path.exists(self._matrix_path):
+            return
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            rows = index["rows"]
+            for key, entry in rows.items():
+                # Keep recency from lookups made here since the last flush.
+                local = self._rows.get(key)
+                if local is not None and local[0] == entry[0]:
+                    entry[1] = max(entry[1], local[1])
+            if index["capacity"] != self._capacity or self._matrix is None:
+                self._map(index["capacity"], index["dim"])
+            self.dim = index["dim"]
+            self._capacity = index["capacity"]
+            self._rows = rows
+            self._tick = max(self._tick, index["tick"])
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable embedding cache {self._index_path}: {e}")
+            self.dim, self._capacity, self._rows, self._tick, self._matrix, self._keys = None, 0, {}, 0, None, None
+        self._index_mtime = mtime
+
+    def _grow(self, needed):
+        capacity = max(1024, self._capacity)
+        while capacity < needed and capacity < self.max_entries:
+            capacity *= 2
+        capacity = min(capacity, self.max_entries)
+        if capacity <= self._capacity:
+            return
+        self._map(capacity, self.dim)
+        self._capacity = capacity
+
+    def _map(self, capacity, dim):
+        """Map the vector matrix and the row keys for capacity rows, extending the files if they are shorter."""
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._keys.flush()
+            self._matrix = self._keys = None
+        for path, size in ((self._matrix_path, capacity * dim * 4), (self._keys_path, capacity * KEY_BYTES)):
+            with open(path, "ab") as f:
+                if os.path.getsize(path) < size:
+                    f.truncate(size)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        self._keys = np.memmap(self._keys_path, dtype=np.uint8, mode="r+", shape=(capacity, KEY_BYTES))
+
+    def key(self, text, kind="doc"):
+        return hashlib.sha256(f"{self.model_name}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()[:32]
+
+    def get_many(self, keys):
+        with self._lock:
+            self._refresh()
+            found = []
+            for key in keys:
+                pending = self._pending.get(key)
+                if pending is not None:
+                    self.hits += 1
+                    found.append(pending.copy())
+                    continue
+                entry = self._rows.get(key)
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                    continue
+                vector = np.array(self._matrix[entry[0]])
+                if not np.array_equal(self._keys[entry[0]], _row_tag(key)):
+                    # Another process reused the row after this index was read.
+                    del self._rows[key]
+                    self.misses += 1
+                    found.append(None)
+                    continue
+                self.hits += 1
+                self._tick += 1
+                entry[1] = self._tick
+                found.append(vector)
+                self._dirty = True
+            return found
+
+    def put_many(self, keys, vectors):
+        if self.max_entries <= 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            for key, vector in zip(keys, vectors):
+                if key not in self._rows:
+                    self._pending[key] = vector
+            self._dirty = True
+            pending = len(self._pending)
+        if pending >= MAX_PENDING or time.monotonic() - self._last_flush > self.flush_interval:
+            self.flush()
+
+    def _write_pending(self):
+        # Keys that missed on a reused row are still in the index: give them a new row.
+        for key in self._pending:
+            entry = self._rows.get(key)
+            if entry is not None and not np.array_equal(self._keys[entry[0]], _row_tag(key)):
+                del self._rows[key]
+        new_keys = [key for key in self._pending if key not in self._rows]
+        self._grow(len(self._rows) + len(new_keys))
+
+        used = {entry[0] for entry in self._rows.values()}
+        free_rows = [row for row in range(self._capacity) if row not in used]
+        overflow = len(new_keys) - len(free_rows)
+        if overflow > 0:
+            for victim, _ in heapq.nsmallest(overflow, self._rows.items(), key=lambda item: item[1][1]):
+                free_rows.append(self._rows.pop(victim)[0])
+
+        for key, row in zip(new_keys[-self._capacity:], free_rows):
+            self._tick += 1
+            # The old key is cleared first, so a reader never pairs it with a half-written vector.
+            self._keys[row] = 0
+            self._matrix[row] = self._pending[key]
+            self._keys[row] = _row_tag(key)
+            self._rows[key] = [row, self._tick]
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            with self._file_lock():
+                # Rows are only handed out against the latest index, so two processes never pick the same one.
+                # The re-read is forced: coarse mtimes can hide a rewrite made within the same tick.
+                self._refresh(force=True)
+                if self._pending:
+                    self._write_pending()
+                if self._matrix is None:
+                    return
+                self._matrix.flush()
+                self._keys.flush()
+                tmp_path = self._index_path + f".{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "capacity": self._capacity, "tick": self._tick, "rows": self._rows}, f)
+                os.replace(tmp_path, self._index_path)
+                self._index_mtime = os.stat(self._index_path).st_mtime_ns
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows) + len(self._pending),
+            "capacity": self._capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class CachedEmbeddings(Embeddings):
+    """Wraps a LangChain embedding model so each distinct text is only embedded once."""
+
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+        atexit.register(cache.flush)
+
+    def embed_documents(self, texts):
+        keys = [self.cache.key(text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            computed = self.model.embed_documents([texts[positions[0]] for positions in missing.values()])
+            self.cache.put_many(list(missing), computed)
+            for positions, vector in zip(missing.values(), computed):
+                for i in positions:
+                    vectors[i] = vector
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        key = self.cache.key(text, kind="query")
+        vector = self.cache.get_many([key])[0]
+        if vector is None:
+            vector = self.model.embed_query(text)
+            self.cache.put_many([key], [vector])
+        return np.asarray(vector, dtype=np.float32).tolist()
@@ -0,0 +1,36 @@
+import os
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join(".cache", "embeddings"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "200000"))
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "0") == "1"
+
+def load_embedding_model(model_name=EMBEDDING_MODEL, backend=EMBEDDING_BACKEND, quantize=EMBEDDING_QUANTIZE, cache_size=EMBEDDING_CACHE_SIZE):
+    """Build the embedding model for backend "huggingface" (PyTorch), "onnx" or "hashing"."""
+    if backend == "hashing":
+        # Offline stand-in for benchmarks and local development; never worth caching.
+        from src.utils.fakes import HashingEmbeddings
+        return HashingEmbeddings()
+
+    if backend == "onnx":
+        from src.utils.onnx_embeddings import OnnxEmbeddings
+
+        model = OnnxEmbeddings(model_name, quantize=quantize)
+        # int8 vectors differ slightly from fp32 ones, so each variant caches separately.
+        cache_name = f"{model_name}@onnx-int8" if quantize else f"{model_name}@onnx"
+    elif backend == "huggingface":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        model = HuggingFaceEmbeddings(model_name=model_name)
+        cache_name = model_name
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend!r}")
+
+    if cache_size <= 0:
+        return model
+
+    from src.utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+    cache = EmbeddingCache(EMBEDDING_CACHE_DIR, cache_name, max_entries=cache_size)
+    return CachedEmbeddings(model, cache)
@@ -0,0 +1,367 @@
+"""Numeric financial facts extracted at ingestion, for LLM-free answers.
+
+Facts come from two shapes of page text:
+
+* statement tables as PyMuPDF flattens them: a header of period lines
+  ("31 March 2025", "31 March 2024", "(PKR millions)") followed by rows of a
+  label line and one number line per period (or "label | n | n" rows);
+* table rows serialized at parse time (see pdf_tables), each cell carrying
+  its column header: "Revenue | 31 March 2025 (PKR millions): 23,101 | ...";
+* prose such as "The net profit for 2021 was PKR 558,658 million ...".
+
+Each fact is {metric, period, year, value, text, currency, unit, source, page,
+company, kind}. The index is one JSON file keyed by report, so incremental
+ingestion simply replaces a changed report's facts.
+"""
+
+import os
+import re
+import json
+import threading
+
+FACTS_FILENAME = "facts_index.json"
+
+# canonical metric -> (display label, pattern over lower-cased text)
+METRICS = {
+    "revenue": ("revenue", r"\b(?:total |net )?revenues?\b|\btotal income\b"),
+    "net_profit": ("net profit", r"\bnet profit\b|\bprofit after tax(?:ation)?\b|\bnet income\b"),
+    "profit_before_tax": ("profit before tax", r"\bprofit before tax(?:ation)?\b"),
+    "total_assets": ("total assets", r"\btotal assets\b"),
+    "roe": ("return on equity (ROE)", r"\breturn on (?:average )?equity\b|\broe\b"),
+    "roa": ("return on assets (ROA)", r"\breturn on (?:average )?assets\b|\broa\b"),
+    "efficiency_ratio": ("efficiency ratio", r"\befficiency ratio\b|\bcost[ -]to[ -]income(?: ratio)?\b"),
+}
+_METRIC_RES = {metric: re.compile(pattern) for metric, (_, pattern) in METRICS.items()}
+
+_YEAR = r"(?:19[89]\d|20\d\d)"
+_YEAR_RE = re.compile(r"\b(" + _YEAR + r")\b")
+_PERIOD_LINE_RE = re.compile(
+    r"^\s*(?:(?:\d{1,2}(?:st|nd|rd|th)?\s+)?[A-Za-z]{3,9}\.?\s+(?:\d{1,2},\s*)?" + _YEAR + r"|FY\s?" + _YEAR + r"|" + _YEAR + r")\s*$",
+    re.IGNORECASE,
+)
+_UNIT_LINE_RE = re.compile(r"^\s*\(?\s*(?P<currency>PKR|Rs\.?|Rupees|USD|US\$|\$|GBP|£|EUR|€)?\s*'?(?P<unit>millions?|billions?|thousands?|mn|bn|'000)?\s*\)?\s*$", re.IGNORECASE)
+_NUMBER = r"\(?-?\d{1,3}(?:,\d{3})+(?:\.\d+)?\)?|\(?-?\d+(?:\.\d+)?\)?"
+_NUMBER_LINE_RE = re.compile(r"^\s*(" + _NUMBER + r")\s*%?\s*$")
+_ROW_CELL_RE = re.compile(r"^(?P<header>.*?):\s*(?P<value>" + _NUMBER + r")\s*%?$")
+_PERIOD_RE = re.compile(
+    r"(?:\d{1,2}(?:st|nd|rd|th)?\s+)?[A-Za-z]{3,9}\.?\s+(?:\d{1,2},\s*)?" + _YEAR + r"|FY\s?" + _YEAR + r"|" + _YEAR,
+    re.IGNORECASE,
+)
+_UNIT_RE = re.compile(r"\([^)]*\)")
+_PROSE_VALUE_RE = re.compile(
+    r"(?P<currency>PKR|Rs\.?|USD|US\$|\$|GBP|£|EUR|€)?\s?(?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?)"
+    r"\s?(?P<unit>%|percent\b|million\b|billion\b|bn\b|mn\b|thousand\b)?",
+    re.IGNORECASE,
+)
+# Prose that reports a movement ("lower by PKR 6.4bn") or a peer/industry figure is not a level of this company's metric.
+_CHANGE_RE = re.compile(r"\b(?:by|lower|higher|up|down|increased?|decreased?|grew|fell|rose|declined?|growth)\b")
+_PERIOD_AFTER_RE = re.compile(r"\s*(?:in|at|for|as at|as of|during|on)\b[^.;]{0,20}?\b(" + _YEAR + r")\b", re.IGNORECASE)
+_PEER_RE = re.compile(r"\b(?:industry|sector|peers?|banking system|market average)\b")
+# Words that turn a metric into a different quantity: "net profit margin", "revenue per employee", "ROE target",
+# whether in a table label or in a question.
+_QUALIFIER_RE = re.compile(
+    r"\b(?:margins?|per|ratios?|growth|change[ds]?|targets?|guidance|forecasts?|budget(?:ed)?|projected|projections?"
+    r"|expected|estimates?|outlook|cagr|share|average|percentage|yield|rate)\b"
+)
+# "PKR 1 7.0bn": a figure the PDF split in two; neither piece is the value.
+_SPLIT_NUMBER_RE = re.compile(r"\s?\d")
+_SCALE_UNITS = ("million", "billion", "thousand")
+# Without a scale unit, a currency amount must be a full figure ("Rs. 12,345,678"), not a stray digit.
+MIN_BARE_AMOUNT = 1000
+
+def _parse_number(text):
+    text = text.strip()
+    negative = text.startswith("(") and text.endswith(")") or text.startswith("-")
+    value = float(text.strip("()-").replace(",", ""))
+    return -value if negative else value
+
+def _normalize_unit(unit):
+    unit = (unit or "").lower()
+    return {"mn": "million", "millions": "million", "bn": "billion", "billions": "billion", "thousands": "thousand",
+            "'000": "thousand", "percent": "%"}.get(unit, unit) or None
+
+def _normalize_currency(currency):
+    if not currency:
+        return None
+    currency = currency.upper().rstrip(".")
+    return {"RS": "PKR", "RUPEES": "PKR", "US$": "USD", "$": "USD", "£": "GBP", "€": "EUR"}.get(currency, currency)
+
+def _metric_of(label):
+    label = label.lower()
+    for metric, pattern in _METRIC_RES.items():
+        if pattern.search(label):
+            # "Net profit margin", "Total assets growth": a row of another quantity.
+            return None if _QUALIFIER_RE.search(pattern.sub(" ", label)) else metric
+    return None
+
+def _year_of(period):
+    match = _YEAR_RE.search(period)
+    return int(match.group(1)) if match else None
+
+def _table_facts(lines):
+    facts = []
+    periods, currency, unit = [], None, None
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if _PERIOD_LINE_RE.match(line):
+            # A run of period lines starts a new statement header.
+            run = []
+            while i < len(lines) and _PERIOD_LINE_RE.match(lines[i].strip()):
+                run.append(lines[i].strip())
+                i += 1
+            if len(run) >= 2:
+                periods, currency, unit = run, None, None
+            continue
+        unit_match = _UNIT_LINE_RE.match(line) if line.startswith("(") else None
+        if periods and unit_match and (unit_match.group("currency") or unit_match.group("unit")):
+            currency = _normalize_currency(unit_match.group("currency")) or currency
+            unit = _normalize_unit(unit_match.group("unit")) or unit
+            i += 1
+            continue
+        metric = _metric_of(line.split("|")[0]) if periods and line and not _NUMBER_LINE_RE.match(line) else None
+        if metric:
+            values = []
+            inline = line.split("|")
+            if len(inline) > 1:
+                # "label | value | value" rows (serialized tables).
+                values = [v.strip() for v in inline[1:] if _NUMBER_LINE_RE.match(v.strip())]
+            else:
+                j = i + 1
+                while j < len(lines) and len(values) < len(periods) and _NUMBER_LINE_RE.match(lines[j]):
+                    values.append(_NUMBER_LINE_RE.match(lines[j]).group(1))
+                    j += 1
+            if len(values) == len(periods):
+                for period, value in zip(periods, values):
+                    is_ratio = metric in ("roe", "roa", "efficiency_ratio")
+                    facts.append({
+                        "metric": metric, "period": period, "year": _year_of(period), "value": _parse_number(value),
+                        "text": value, "currency": None if is_ratio else currency, "unit": "%" if is_ratio else unit, "kind": "table",
+                    })
+        i += 1
+    return facts
+
+def _row_facts(lines):
+    facts = []
+    for line in lines:
+        cells = [cell.strip() for cell in line.split(" | ")]
+        metric = _metric_of(cells[0]) if len(cells) > 1 else None
+        if not metric:
+            continue
+        is_ratio = metric in ("roe", "roa", "efficiency_ratio")
+        for cell in cells[1:]:
+            match = _ROW_CELL_RE.match(cell)
+            period = _PERIOD_RE.search(match.group("header")) if match else None
+            if not period:
+                continue
+            unit_text = _UNIT_RE.search(match.group("header"))
+            unit_match = _UNIT_LINE_RE.match(unit_text.group(0)) if unit_text else None
+            currency = _normalize_currency(unit_match.group("currency")) if unit_match else None
+            unit = _normalize_unit(unit_match.group("unit")) if unit_match else None
+            value = match.group("value")
+            facts.append({
+                "metric": metric, "period": period.group(0), "year": _year_of(period.group(0)), "value": _parse_number(value),
+                "text": value, "currency": None if is_ratio else currency, "unit": "%" if is_ratio else unit, "kind": "table",
+            })
+    return facts
+
+def _prose_facts(text, default_year):
+    facts = []
+    for sentence in re.split(r"(?<=[.;])\s+(?=[A-Z])|\n{2,}", text):
+        flat = " ".join(sentence.split())
+        lowered = flat.lower()
+        if _PEER_RE.search(lowered):
+            continue
+        for metric, pattern in _METRIC_RES.items():
+            mention = pattern.search(lowered)
+            if not mention:
+                continue
+            is_ratio = metric in ("roe", "roa", "efficiency_ratio")
+            # The first qualified value shortly after the mention belongs to the metric.
+            window = flat[mention.end():mention.end() + 120]
+            for value in _PROSE_VALUE_RE.finditer(window):
+                if _CHANGE_RE.search(window[:value.start()].lower()):
+                    break
+                if not value.group("unit") and _SPLIT_NUMBER_RE.match(window[value.end():]):
+                    break
+                unit = _normalize_unit(value.group("unit"))
+                currency = _normalize_currency(value.group("currency"))
+                number = float(value.group("number").replace(",", ""))
+                if is_ratio and unit != "%":
+                    continue
+                if not is_ratio and unit not in _SCALE_UNITS and not (currency and number >= MIN_BARE_AMOUNT):
+                    continue
+                # Period: a year right after the value ("... million in 2020"), else the latest year before it.
+                after = _PERIOD_AFTER_RE.match(window[value.end():])
+                before = _YEAR_RE.findall(flat[:mention.end() + value.start()])
+                year = int(after.group(1)) if after else int(before[-1]) if before else default_year
+                facts.append({
+                    "metric": metric, "period": str(year) if year else None, "year": year, "value": number,
+                    "text": value.group("number"), "currency": currency, "unit": unit, "kind": "prose",
+                })
+                break
+    return facts
+
+def extract_facts(page_text, metadata):
+    """Facts in one parsed page part (running text or table rows); metadata supplies source, page, company and fiscal_year."""
+    lines = [line for line in page_text.splitlines() if line.strip()]
+    if metadata.get("content_type") == "table":
+        facts = _row_facts(lines)
+    else:
+        facts = _table_facts(lines) + _prose_facts(page_text, metadata.get("fiscal_year"))
+    for fact in facts:
+        fact.update(source=metadata.get("source"), page=metadata.get("page"), company=metadata.get("company"))
+    return facts
+
+def detect_metrics(question):
+    lowered = question.lower()
+    return [metric for metric, pattern in _METRIC_RES.items() if pattern.search(lowered)]
+
+class FactsIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self._reports = {}
+        self._lock = threading.Lock()
+        self._mtime = None
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return sum(len(facts) for facts in self._reports.values())
+
+    def replace_report(self, source, facts):
+        with self._lock:
+            # Overlapping prose and table mentions of the same number collapse to one fact.
+            unique = {}
+            for fact in facts:
+                key = (fact["metric"], fact["year"], fact["value"], fact["page"])
+                if key not in unique or fact["kind"] == "table":
+                    unique[key] = fact
+            self._reports[source] = list(unique.values())
+
+    def has_report(self, source):
+        return source in self._reports
+
+    def remove_report(self, source):
+        with self._lock:
+            self._reports.pop(source, None)
+
+    def reports(self):
+        """{source: facts} for every report, e.g. for a snapshot."""
+        with self._lock:
+            return {source: list(facts) for source, facts in self._reports.items()}
+
+    def companies(self):
+        return sorted({fact["company"] for facts in self._reports.values() for fact in facts if fact.get("company")})
+
+    def lookup(self, metric, year=None, company=None, source=None):
+        """Facts for metric, best first: matching year, table over prose, the report's own year, earliest page."""
+        with self._lock:
+            facts = [
+                fact for src, facts in self._reports.items() if source is None or src == source
+                for fact in facts
+                if fact["metric"] == metric and (company is None or fact.get("company") == company)
+                and (year is None or fact["year"] == year)
+            ]
+        return sorted(facts, key=lambda f: (f["kind"] != "table", -(f["year"] or 0), f["page"] or 0))
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._lock:
+            payload = json.dumps({"reports": self._reports}, ensure_ascii=False)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._mtime = os.path.getmtime(path)
+
+    def load(self, path=None):
+        path = path or self.path
+        with open(path, "r", encoding="utf-8") as f:
+            reports = json.load(f)["reports"]
+        with self._lock:
+            self._reports = reports
+        self._mtime = os.path.getmtime(path)
+
+    def reload_if_changed(self):
+        # Picks up facts written by another process (e.g. a CLI ingestion run).
+        if self.path and os.path.exists(self.path) and os.path.getmtime(self.path) != self._mtime:
+            self.load()
+
+# Questions that need reasoning over several figures go to the LLM instead.
+_ANALYTICAL_RE = re.compile(
+    r"\b(?:compare[ds]?|comparison|why|explain|trend|change[ds]?|growth|grew|increase[ds]?|decrease[ds]?|decline[ds]?"
+    r"|vs\.?|versus|difference|drivers?|reasons?|between|each|all)\b"
+)
+# Facts are reported per statement period; a quarter, half year or nine months is a different figure.
+_SUBPERIOD_RE = re.compile(r"\b(?:q[1-4]|quarters?|quarterly|half[- ]?year(?:ly)?|h[12]|(?:three|six|nine) months?|[369]m)\b")
+# "of HBL", "for Standard Chartered", "MCB's": an entity the answer has to belong to.
+_ENTITY_RE = re.compile(r"\b(?:of|for|at|by|from)\s+(?:the\s+)?([A-Z][\w&.-]*(?:\s+[A-Z][\w&.-]*)*)|\b([A-Z][\w&.-]*(?:\s+[A-Z][\w&.-]*)*)'s\b")
+_NOT_ENTITY_RE = re.compile(r"\b(?:fy\s?\d*|q[1-4]|h[12]|jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+                            r"|sep(?:tember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?|pkr|rs|usd|roe|roa)\b")
+_COMPANY_NOISE_RE = re.compile(r"\b(?:limited|ltd|plc|inc|corp(?:oration)?|company|co|group|bank|the)\b\.?")
+
+def _company_key(name):
+    return " ".join(_COMPANY_NOISE_RE.sub(" ", name.lower()).split())
+
+def _mentioned_companies(question, companies):
+    lowered = " ".join(question.lower().split())
+    return [c for c in companies if c.lower() in lowered or (_company_key(c) and re.search(r"\b" + re.escape(_company_key(c)) + r"\b", lowered))]
+
+def _unknown_entities(question, companies):
+    """Names in the question ("of HBL") that match none of the indexed companies."""
+    keys = [_company_key(c) for c in companies]
+    unknown = []
+    for match in _ENTITY_RE.finditer(question):
+        name = _company_key(_NOT_ENTITY_RE.sub(" ", (match.group(1) or match.group(2)).lower()))
+        if name and not any(key and (re.search(r"\b" + re.escape(name) + r"\b", key) or re.search(r"\b" + re.escape(key) + r"\b", name))
+                            for key in keys):
+            unknown.append(name)
+    return unknown
+
+def format_fact(fact):
+    number = fact["text"].strip("()-")
+    if fact["value"] < 0:
+        number = "-" + number
+    if fact["unit"] == "%":
+        number += "%"
+    parts = [fact.get("currency"), number, fact["unit"] if fact["unit"] not in (None, "%") else None]
+    return " ".join(part for part in parts if part)
+
+def answer_from_facts(index, question, company=None, source=None):
+    """(answer, fact) for a single-metric lookup question, or None when it needs the RAG path.
+
+    Fires only for a bare lookup of exactly one recognised metric, at most one
+    year and an unambiguous company (given, named in the question, or the only
+    one indexed). A qualifier outside the metric's own name ("net profit
+    margin", "revenue per employee"), a part-year period ("Q1 2024", "half
+    year") or a company that is not indexed asks for another figure, so it
+    falls through to RAG.
+    """
+    lowered = question.lower()
+    metrics = detect_metrics(question)
+    years = set(_YEAR_RE.findall(question))
+    if len(metrics) != 1 or len(years) > 1 or _ANALYTICAL_RE.search(lowered) or _SUBPERIOD_RE.search(lowered):
+        return None
+    if _QUALIFIER_RE.search(_METRIC_RES[metrics[0]].sub(" ", lowered)):
+        return None
+    companies = index.companies()
+    if _unknown_entities(question, companies):
+        return None
+    if company is None and source is None:
+        mentioned = _mentioned_companies(question, companies)
+        if len(mentioned) > 1:
+            return None
+        company = mentioned[0] if mentioned else None
+    facts = index.lookup(metrics[0], int(years.pop()) if years else None, company, source)
+    if not facts or len({f.get("company") or f["source"] for f in facts}) > 1:
+        return None
+    fact = facts[0]
+    label = METRICS[fact["metric"]][0]
+    who = f" of {fact['company']}" if fact.get("company") else ""
+    page = f", page {fact['page'] + 1}" if fact.get("page") is not None else ""
+    answer = f"The {label}{who} for {fact['period']} was {format_fact(fact)} (source: {fact['source']}{page})."
+    return answer, fact
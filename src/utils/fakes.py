@@ -0,0 +1,101 @@
+"""Deterministic offline stand-ins for the embedding model and the chat model.
+
+Used by the benchmark suite, the HTTP service's load tests and local development
+without a GROQ_API_KEY. Select them with EMBEDDING_BACKEND=hashing and
+LLM_BACKEND=fake.
+"""
+
+import os
+import re
+import time
+import asyncio
+import hashlib
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+class HashingEmbeddings(Embeddings):
+    """Bag-of-words feature hashing into a unit vector.
+
+    Not semantic, but deterministic, instant and shares vocabulary signal between
+    questions and chunks, which is all the benchmarks need.
+    """
+
+    def __init__(self, size=384):
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in _WORD_RE.findall(text.lower()):
+            h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.size] += 1.0 if (h >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers from the prompt's own context after a simulated delay.
+
+    The answer is the first context sentence sharing a word with the question
+    (or "Information not available."), so identical prompts always produce
+    identical answers. Latency is latency_s plus per_token_s per answer token;
+    streaming spreads the per-token part across the chunks.
+    """
+
+    model_name: str = "fake-chat"
+    latency_s: float = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+    per_token_s: float = float(os.getenv("FAKE_LLM_PER_TOKEN", "0.0"))
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, prompt: str) -> str:
+        context = prompt.split("Context:", 1)[-1].split("Question:", 1)[0]
+        question = prompt.rsplit("Question:", 1)[-1].split("Answer:", 1)[0]
+        keywords = {w for w in _WORD_RE.findall(question.lower()) if len(w) > 3}
+        for sentence in re.split(r"(?<=[.!?])\s+", context):
+            if keywords & set(_WORD_RE.findall(sentence.lower())):
+                return sentence.strip()
+        return "Information not available."
+
+    def _result(self, messages) -> ChatResult:
+        prompt = "\n".join(str(m.content) for m in messages)
+        answer = self._answer(prompt)
+        message = AIMessage(content=answer, usage_metadata={
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(answer.split()),
+            "total_tokens": len(prompt) // 4 + len(answer.split()),
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _delay(self, result: ChatResult) -> float:
+        return self.latency_s + self.per_token_s * len(result.generations[0].message.content.split())
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        result = self._result(messages)
+        time.sleep(self._delay(result))
+        return result
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs) -> ChatResult:
+        result = self._result(messages)
+        await asyncio.sleep(self._delay(result))
+        return result
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs):
+        answer = self._result(messages).generations[0].message.content
+        time.sleep(self.latency_s)
+        for word in answer.split(" "):
+            time.sleep(self.per_token_s)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
@@ -1,17 +1,236 @@
 import os
-from langchain_community.document_loaders import PyMuPDFLoader
+import json
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+from langchain_core.documents import Document
+
+from src.utils.pdf_tables import find_tables, table_chunks, text_lines, inside
+from src.utils.tracing import tracer
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0")) or os.cpu_count() or 1
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+TABLE_EXTRACTION = os.getenv("TABLE_EXTRACTION", "1") != "0"
+TABLE_ROWS_PER_CHUNK = int(os.getenv("TABLE_ROWS_PER_CHUNK", "10"))
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join(".cache", "pages"))
+PAGE_CACHE = os.getenv("PAGE_CACHE", "1") != "0"
+# Bump when the parsed output of a page changes, so cached pages are parsed again.
+PARSER_VERSION = 1
+PARSE_STAGES = ("cache", "text", "tables")
+
+def list_pdfs(folder_path):
+    return [
+        os.path.join(folder_path, filename)
+        for filename in sorted(os.listdir(folder_path))
+        if filename.lower().endswith(".pdf")
+    ]
+
+def _page_key(pdf, page, options):
+    # The content stream alone is not enough: pages that only draw a form
+    # XObject ("/Fm0 Do") share it across reports, so the forms and fonts
+    # the page uses are hashed too.
+    digest = hashlib.sha256(json.dumps([PARSER_VERSION, options, list(page.rect), page.rotation]).encode("utf-8"))
+    digest.update(page.read_contents())
+    for xref, *_ in page.get_xobjects():
+        digest.update(pdf.xref_stream_raw(xref) or b"")
+    for _, _, font_type, basefont, _, encoding in page.get_fonts():
+        digest.update(f"{font_type}/{basefont}/{encoding}".encode("utf-8"))
+    return digest.hexdigest()
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key + ".json")
+
+def _read_cached(cache_dir, key):
+    try:
+        with open(_cache_path(cache_dir, key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_cached(cache_dir, key, parts):
+    path = _cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Several workers may parse identical pages; each writes its own temp file.
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(parts, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _extract_page(page, tables_enabled, rows_per_chunk, seconds):
+    """Parsed parts of a page as [text, metadata] pairs: the running text, then one part per table row group."""
+    start = time.perf_counter()
+    if not tables_enabled:
+        text = page.get_text()
+        seconds["text"] += time.perf_counter() - start
+        return [[text, {"content_type": "text"}]]
+    page_dict = page.get_text("dict")
+    lines = text_lines(page_dict)
+    seconds["text"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    tables = find_tables(page, page_dict)
+    boxes = [table["bbox"] for table in tables]
+    # Table cells leave the running text, so they are embedded once, as rows.
+    text = "".join(line + "\n" for bbox, line in lines if not boxes or not inside(bbox, boxes))
+    parts = [[text, {"content_type": "text"}]]
+    for index, table in enumerate(tables):
+        bbox = ",".join(f"{v:.1f}" for v in table["bbox"])
+        for chunk, first, last in table_chunks(table, rows_per_chunk):
+            parts.append([chunk, {"content_type": "table", "table_index": index, "bbox": bbox, "rows": f"{first}-{last}"}])
+    seconds["tables"] += time.perf_counter() - start
+    return parts
+
+def _parse_pages(pdf_path, start, stop, cache_dir=None, tables_enabled=TABLE_EXTRACTION, rows_per_chunk=TABLE_ROWS_PER_CHUNK):
+    # Runs inside a worker process; only the requested page range is extracted
+    # so a single huge report never has to be held in memory at once.
+    # Returns the page documents and how long each parse stage took.
+    filename = os.path.basename(pdf_path)
+    pages = []
+    stats = {"pages": stop - start, "cached": 0, "tables": 0, "seconds": dict.fromkeys(PARSE_STAGES, 0.0)}
+    seconds = stats["seconds"]
+    with fitz.open(pdf_path) as pdf:
+        total_pages = pdf.page_count
+        for number in range(start, stop):
+            page = pdf[number]
+            began = time.perf_counter()
+            key = _page_key(pdf, page, [tables_enabled, rows_per_chunk]) if cache_dir else None
+            parts = _read_cached(cache_dir, key) if key else None
+            seconds["cache"] += time.perf_counter() - began
+            if parts is None:
+                parts = _extract_page(page, tables_enabled, rows_per_chunk, seconds)
+                if key:
+                    began = time.perf_counter()
+                    _write_cached(cache_dir, key, parts)
+                    seconds["cache"] += time.perf_counter() - began
+            else:
+                stats["cached"] += 1
+            stats["tables"] += len({meta["table_index"] for _, meta in parts if meta["content_type"] == "table"})
+            for text, meta in parts:
+                pages.append(Document(
+                    page_content=text,
+                    metadata={"source": filename, "file_path": pdf_path, "page": number, "total_pages": total_pages, **meta},
+                ))
+    return pages, stats
+
+def _page_ranges(pdf_paths, pages_per_task, progress):
+    for pdf_path in pdf_paths:
+        filename = os.path.basename(pdf_path)
+        try:
+            with fitz.open(pdf_path) as pdf:
+                page_count = pdf.page_count
+        except Exception as e:
+            progress.fail(pdf_path, f"Could not open {filename}: {e}")
+            continue
+        print(f"📥 Loading PDF: {filename}")
+        for start in range(0, page_count, pages_per_task):
+            yield pdf_path, start, min(start + pages_per_task, page_count), page_count
+
+class _ParseProgress:
+    """Per-report parse counters, reported as pages/sec per stage when a report is done.
+
+    failed collects the file names of reports that could not be opened or had
+    pages fail to parse.
+    """
+
+    def __init__(self, failed=None):
+        self.files = {}
+        self.failed = set() if failed is None else failed
+
+    def fail(self, pdf_path, message):
+        print(f"❌ {message}")
+        self.failed.add(os.path.basename(pdf_path))
+
+    def add(self, pdf_path, stats):
+        totals = self.files.setdefault(pdf_path, {"pages": 0, "cached": 0, "tables": 0, "seconds": dict.fromkeys(PARSE_STAGES, 0.0)})
+        for field in ("pages", "cached", "tables"):
+            totals[field] += stats[field]
+        parsed = stats["pages"] - stats["cached"]
+        for stage, seconds in stats["seconds"].items():
+            totals["seconds"][stage] += seconds
+            pages = stats["pages"] if stage == "cache" else parsed
+            if pages:
+                tracer.record(f"parse.{stage}", seconds * 1000 / pages)
+        tracer.annotate(pages_parsed=parsed, pages_cached=stats["cached"], tables=stats["tables"])
+
+    def done(self, pdf_path, page_count):
+        totals = self.files.pop(pdf_path, None)
+        if totals is None:
+            print(f"✅ Loaded {page_count} pages from {os.path.basename(pdf_path)}")
+            return
+        parsed = totals["pages"] - totals["cached"]
+        rates = ", ".join(
+            f"{stage} {(totals['pages'] if stage == 'cache' else parsed) / seconds:,.0f} pages/s"
+            for stage, seconds in totals["seconds"].items() if seconds > 0 and (parsed or stage == "cache")
+        )
+        print(f"✅ Loaded {page_count} pages from {os.path.basename(pdf_path)} "
+              f"({totals['tables']} tables, {totals['cached']} pages from cache; {rates})")
+
+def iter_pdf_pages(pdf_paths, max_workers=PDF_WORKERS, pages_per_task=PAGES_PER_TASK,
+                   cache_dir=PAGE_CACHE_DIR if PAGE_CACHE else None, failed=None):
+    """Yield the parsed Documents of every page of every PDF in pdf_paths.
+
+    Each page yields its running text (content_type "text") followed by one
+    Document per table row group (content_type "table", with table_index,
+    bbox and rows). Parsed pages are cached in cache_dir by a hash of the
+    page content, so unchanged pages are never parsed twice.
+
+    Page ranges are parsed in a process pool (one worker per core by default)
+    and yielded in file/page order. At most two ranges per worker are in flight,
+    which keeps memory bounded regardless of how many reports are ingested.
+
+    failed, if given, is a set that receives the file name of every report
+    that could not be opened or had a page range fail to parse; its pages
+    are missing from the output.
+    """
+    progress = _ParseProgress(failed)
+    ranges = _page_ranges(pdf_paths, pages_per_task, progress)
+
+    if max_workers <= 1:
+        for pdf_path, start, stop, page_count in ranges:
+            try:
+                pages, stats = _parse_pages(pdf_path, start, stop, cache_dir)
+            except Exception as e:
+                progress.fail(pdf_path, f"Failed to parse pages of {os.path.basename(pdf_path)} before page {stop}: {e}")
+                continue
+            progress.add(pdf_path, stats)
+            yield from pages
+            if stop == page_count:
+                progress.done(pdf_path, page_count)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for pdf_path, start, stop, page_count in ranges:
+            pending.append((executor.submit(_parse_pages, pdf_path, start, stop, cache_dir), pdf_path, stop, page_count))
+            while len(pending) >= 2 * max_workers:
+                yield from _drain_one(pending, progress)
+        while pending:
+            yield from _drain_one(pending, progress)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def _drain_one(pending, progress):
+    future, pdf_path, stop, page_count = pending.popleft()
+    try:
+        pages, stats = future.result()
+    except Exception as e:
+        progress.fail(pdf_path, f"Failed to parse pages of {os.path.basename(pdf_path)} before page {stop}: {e}")
+        return
+    progress.add(pdf_path, stats)
+    yield from pages
+    if stop == page_count:
+        progress.done(pdf_path, page_count)
+
+def load_pdf(pdf_path):
+    return list(iter_pdf_pages([pdf_path]))
 
 def load_pdf_from_folder(folder_path):
-    for filename in os.listdir(folder_path):
-        if filename.endswith(".pdf"):
-            pdf_path = os.path.join(folder_path, filename)
-            print(f"📥 Loading PDF: {filename}")
-            loader = PyMuPDFLoader(pdf_path)
-            docs = loader.load()
-            print(f"✅ Loaded {len(docs)} chunks from {filename}")
-            for doc in docs:
-                doc.metadata["source"] = filename
-            return docs
-    
-    print("❌ No PDF file found in the folder.")
-    return []
+    pdf_paths = list_pdfs(folder_path)
+    if not pdf_paths:
+        print("❌ No PDF file found in the folder.")
+        return []
+    return list(iter_pdf_pages(pdf_paths))
@@ -0,0 +1,148 @@
+"""Background ingestion jobs with per-file progress.
+
+The Streamlit app submits uploads here and polls job.snapshot() on a timer.
+Jobs run one at a time on a single worker thread, so two ingestions never race
+on the vector store or the manifest, and the UI thread is never blocked.
+"""
+
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_FINISHED_JOBS = int(os.getenv("MAX_FINISHED_JOBS", "20"))
+
+def _file_progress(pages_total):
+    return {"pages_total": pages_total, "pages_parsed": 0, "pages_embedded": 0, "chunks_parsed": 0, "chunks_embedded": 0}
+
+class IngestJob:
+    """One ingest_reports() run; also the progress sink it reports into."""
+
+    def __init__(self, folder_path, filenames, use_persistent=True):
+        self.id = uuid.uuid4().hex[:8]
+        self.folder_path = folder_path
+        self.filenames = list(filenames) if filenames is not None else None
+        self.use_persistent = use_persistent
+        self.status = "queued"
+        self.error = None
+        self.result = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.files = {}
+        self._lock = threading.Lock()
+
+    # ---- progress hooks called by src.ingest ----
+    def on_start(self, changed):
+        import fitz
+
+        with self._lock:
+            for name in changed:
+                try:
+                    with fitz.open(os.path.join(self.folder_path, name)) as pdf:
+                        pages = pdf.page_count
+                except Exception:
+                    pages = 0
+                self.files[name] = _file_progress(pages)
+
+    def on_chunk(self, doc):
+        with self._lock:
+            entry = self._entry(doc.metadata)
+            entry["chunks_parsed"] += 1
+            entry["pages_parsed"] = max(entry["pages_parsed"], doc.metadata.get("page", 0) + 1)
+
+    def on_stored(self, docs):
+        with self._lock:
+            for doc in docs:
+                entry = self._entry(doc.metadata)
+                entry["chunks_embedded"] += 1
+                entry["pages_embedded"] = max(entry["pages_embedded"], doc.metadata.get("page", 0) + 1)
+
+    def _entry(self, metadata):
+        entry = self.files.get(metadata["source"])
+        if entry is None:
+            entry = self.files[metadata["source"]] = _file_progress(metadata.get("total_pages", 0))
+        return entry
+
+    # ---- lifecycle ----
+    def run(self):
+        from src.ingest import ingest_reports
+
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            self.result = ingest_reports(self.folder_path, use_persistent=self.use_persistent, filenames=self.filenames, progress=self)
+            with self._lock:
+                for entry in self.files.values():
+                    entry["pages_parsed"] = entry["pages_embedded"] = entry["pages_total"]
+            self.status = "done"
+        except Exception as e:
+            self.error = repr(e)
+            self.status = "failed"
+        finally:
+            self.finished_at = time.time()
+
+    def snapshot(self):
+        """A consistent copy of the job state with overall progress and ETA, for display."""
+        with self._lock:
+            files = {name: dict(entry) for name, entry in self.files.items()}
+        pages_total = sum(e["pages_total"] for e in files.values())
+        pages_embedded = sum(min(e["pages_embedded"], e["pages_total"]) for e in files.values())
+        fraction = pages_embedded / pages_total if pages_total else (1.0 if self.status == "done" else 0.0)
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        eta = elapsed * (1 - fraction) / fraction if self.status == "running" and fraction > 0 else None
+        return {
+            "id": self.id,
+            "status": self.status,
+            "filenames": self.filenames,
+            "files": files,
+            "progress": fraction,
+            "elapsed_s": elapsed,
+            "eta_s": eta,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobRegistry:
+    def __init__(self, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-job")
+
+    def submit(self, folder_path, filenames, use_persistent=True):
+        job = IngestJob(folder_path, filenames, use_persistent)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(job.run)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All tracked jobs, newest first."""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def active(self):
+        return [job for job in self.jobs() if job.status in ("queued", "running")]
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+_lock = threading.Lock()
+_registry = None
+
+def get_job_registry():
+    global _registry
+    if _registry is None:
+        with _lock:
+            if _registry is None:
+                _registry = JobRegistry()
+    return _registry
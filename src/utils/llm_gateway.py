@@ -0,0 +1,364 @@
+"""Rate-limit-aware access to the chat model.
+
+LLMGateway wraps any LangChain chat model and is what get_llm() hands out:
+
+* two token buckets sized to the provider's quotas, requests per minute
+  (LLM_RPM) and tokens per minute (LLM_TPM), admit calls before they are sent;
+* at most LLM_CONCURRENCY calls are in flight (per sync/async mode);
+* 429s, 5xx, timeouts and connection errors are retried with full-jitter
+  exponential backoff that honours Retry-After;
+* every call has a deadline (LLM_DEADLINE_S) that covers queueing and retries.
+  A sync call that hits it cannot stop the model call running in its worker
+  thread, so it keeps its concurrency slot until that call returns: abandoned
+  calls count against LLM_CONCURRENCY instead of piling up behind it;
+* with LLM_HEDGE_AFTER_S set, a second identical request is sent when the
+  first has not answered by then, and whichever finishes first wins.
+
+Time spent waiting for admission and time spent in the model are recorded as
+the separate tracer stages llm.queue and llm.model.
+"""
+
+import os
+import time
+import random
+import asyncio
+import weakref
+import itertools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from src.utils.tracing import tracer, estimate_tokens
+
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_BURST_S = float(os.getenv("LLM_BURST_S", "10"))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_S = float(os.getenv("LLM_RETRY_BASE_S", "0.5"))
+LLM_RETRY_MAX_S = float(os.getenv("LLM_RETRY_MAX_S", "8"))
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "60"))
+LLM_HEDGE_AFTER_S = float(os.getenv("LLM_HEDGE_AFTER_S", "0"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "256"))
+
+class LLMUnavailableError(RuntimeError):
+    """The model could not answer in time: rate limited, failing or over the deadline."""
+
+class LLMDeadlineExceeded(LLMUnavailableError):
+    pass
+
+class TokenBucket:
+    def __init__(self, per_minute, burst_s=LLM_BURST_S):
+        self.rate = per_minute / 60
+        # Per-minute quotas are enforced over short windows too, so only burst_s of quota may be spent at once.
+        self.capacity = max(1.0, self.rate * burst_s)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """Take amount (going into debt if needed); return the seconds to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def try_take(self, amount):
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill()
+            if self.level < amount:
+                return False
+            self.level -= amount
+            return True
+
+    def adjust(self, amount):
+        # Settles an estimate against actual usage; a negative amount refunds.
+        if self.rate > 0:
+            with self._lock:
+                self.level = min(self.capacity, self.level - amount)
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def _is_transient(error):
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or "Timeout" in name or "Connection" in name
+
+class LLMGateway:
+    def __init__(self, model, rpm=LLM_RPM, tpm=LLM_TPM, max_concurrency=LLM_CONCURRENCY, max_retries=LLM_MAX_RETRIES,
+                 deadline_s=LLM_DEADLINE_S, hedge_after_s=LLM_HEDGE_AFTER_S, expected_output_tokens=LLM_EXPECTED_OUTPUT_TOKENS):
+        self.model = model
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.deadline_s = deadline_s
+        self.hedge_after_s = hedge_after_s
+        self.expected_output_tokens = expected_output_tokens
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._async_slots = weakref.WeakKeyDictionary()
+        # Room for one hedge per in-flight call; abandoned attempts finish in the background.
+        self._executor = ThreadPoolExecutor(max_workers=2 * max_concurrency, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "attempts": 0, "retries": 0, "rate_limited": 0, "server_errors": 0,
+                         "hedged": 0, "hedge_wins": 0, "deadline_exceeded": 0, "abandoned": 0, "failed": 0}
+
+    @property
+    def model_name(self):
+        return getattr(self.model, "model_name", None)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def _admission_delay(self, prompt, deadline):
+        estimate = estimate_tokens(prompt) + self.expected_output_tokens
+        delay = max(self.request_bucket.reserve(1), self.token_bucket.reserve(estimate))
+        if time.monotonic() + delay >= deadline:
+            self._count(deadline_exceeded=1)
+            raise LLMDeadlineExceeded(f"LLM quota exhausted; the next slot is {delay:.1f}s away")
+        return estimate, delay
+
+    def _settle(self, estimate, response):
+        usage = getattr(response, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self.token_bucket.adjust(usage["total_tokens"] - estimate)
+
+    def _settle_stream(self, estimate, prompt, parts, reported):
+        # Providers report usage on the last chunk at most; otherwise count what was streamed.
+        used = reported or estimate_tokens(prompt) + estimate_tokens("".join(parts))
+        self.token_bucket.adjust(used - estimate)
+
+    def _release_when_done(self, futures):
+        """Give the call's slot back once every abandoned attempt has actually returned."""
+        self._count(abandoned=1)
+        remaining = [len(futures)]
+
+        def done(_):
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._slots.release()
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Seconds to wait before retrying after error, or None to give up."""
+        status = _status_code(error)
+        if status == 429:
+            self._count(rate_limited=1)
+        elif status is not None and status >= 500:
+            self._count(server_errors=1)
+        elif not (status is None and _is_transient(error)):
+            return None
+        if attempt >= self.max_retries:
+            return None
+        delay = max(random.uniform(0, min(LLM_RETRY_MAX_S, LLM_RETRY_BASE_S * 2 ** attempt)), _retry_after(error) or 0.0)
+        return delay if time.monotonic() + delay < deadline else None
+
+    def _give_up(self, error):
+        self._count(failed=1)
+        if isinstance(error, LLMDeadlineExceeded):
+            return error
+        status = _status_code(error)
+        if status == 429 or (status is not None and status >= 500) or (status is None and _is_transient(error)):
+            return LLMUnavailableError(f"The language model is unavailable or rate limited ({error!r}); please retry shortly.")
+        return error
+
+    # --- sync -----------------------------------------------------------------
+
+    def invoke(self, prompt, **kwargs):
+        self._count(requests=1)
+        deadline = time.monotonic() + self.deadline_s
+        queued = time.perf_counter()
+        estimate, delay = self._admission_delay(prompt, deadline)
+        time.sleep(delay)
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._count(deadline_exceeded=1, failed=1)
+            raise LLMDeadlineExceeded("no LLM slot became free before the deadline")
+        abandoned = None
+        try:
+            tracer.record("llm.queue", (time.perf_counter() - queued) * 1000)
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self._attempt(prompt, deadline, kwargs)
+                    break
+                except Exception as e:
+                    abandoned = getattr(e, "abandoned", None)
+                    retry_in = None if isinstance(e, LLMDeadlineExceeded) else self._retry_delay(e, attempt, deadline)
+                    if retry_in is None:
+                        raise self._give_up(e) from e
+                    self._count(retries=1)
+                    time.sleep(max(retry_in, self.request_bucket.reserve(1)))
+        finally:
+            if abandoned:
+                self._release_when_done(abandoned)
+            else:
+                self._slots.release()
+        self._settle(estimate, response)
+        return response
+
+    def _attempt(self, prompt, deadline, kwargs):
+        start = time.perf_counter()
+        self._count(attempts=1)
+        futures = [self._executor.submit(contextvars.copy_context().run, self.model.invoke, prompt, **kwargs)]
+        if self.hedge_after_s > 0:
+            done, _ = wait(futures, timeout=min(self.hedge_after_s, max(0.0, deadline - time.monotonic())))
+            # A hedge is only sent when the request quota has room for it right now.
+            if not done and deadline - time.monotonic() > 0 and self.request_bucket.try_take(1):
+                self._count(hedged=1, attempts=1)
+                futures.append(self._executor.submit(contextvars.copy_context().run, self.model.invoke, prompt, **kwargs))
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                self._count(deadline_exceeded=1)
+                error = LLMDeadlineExceeded(f"LLM did not answer within {self.deadline_s:.0f}s")
+                # Threads cannot be cancelled; the caller holds its slot until these return.
+                error.abandoned = list(pending)
+                raise error
+            for future in done:
+                if future.exception() is None:
+                    if future is not futures[0]:
+                        self._count(hedge_wins=1)
+                    tracer.record("llm.model", (time.perf_counter() - start) * 1000)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stream(self, prompt, **kwargs):
+        """Yield the model's chunks; failures before the first chunk are retried, later ones are raised."""
+        self._count(requests=1)
+        deadline = time.monotonic() + self.deadline_s
+        queued = time.perf_counter()
+        estimate, delay = self._admission_delay(prompt, deadline)
+        time.sleep(delay)
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self._count(deadline_exceeded=1, failed=1)
+            raise LLMDeadlineExceeded("no LLM slot became free before the deadline")
+        parts, reported, answered = [], 0, False
+        try:
+            tracer.record("llm.queue", (time.perf_counter() - queued) * 1000)
+            for attempt in range(self.max_retries + 1):
+                start = time.perf_counter()
+                self._count(attempts=1)
+                chunks = self.model.stream(prompt, **kwargs)
+                try:
+                    first = next(chunks)
+                    break
+                except StopIteration:
+                    answered = True
+                    return
+                except Exception as e:
+                    retry_in = self._retry_delay(e, attempt, deadline)
+                    if retry_in is None:
+                        raise self._give_up(e) from e
+                    self._count(retries=1)
+                    time.sleep(max(retry_in, self.request_bucket.reserve(1)))
+            answered = True
+            for chunk in itertools.chain([first], chunks):
+                content = getattr(chunk, "content", None)
+                if isinstance(content, str):
+                    parts.append(content)
+                reported += (getattr(chunk, "usage_metadata", None) or {}).get("total_tokens") or 0
+                yield chunk
+            tracer.record("llm.model", (time.perf_counter() - start) * 1000)
+        finally:
+            self._slots.release()
+            # Settled like invoke, including streams the caller stopped reading early.
+            if answered:
+                self._settle_stream(estimate, prompt, parts, reported)
+
+    # --- async ----------------------------------------------------------------
+
+    def _async_slot(self):
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = self._async_slots[loop] = asyncio.Semaphore(self.max_concurrency)
+        return slots
+
+    async def ainvoke(self, prompt, **kwargs):
+        self._count(requests=1)
+        deadline = time.monotonic() + self.deadline_s
+        queued = time.perf_counter()
+        estimate, delay = self._admission_delay(prompt, deadline)
+        await asyncio.sleep(delay)
+        slots = self._async_slot()
+        try:
+            await asyncio.wait_for(slots.acquire(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            self._count(deadline_exceeded=1, failed=1)
+            raise LLMDeadlineExceeded("no LLM slot became free before the deadline")
+        try:
+            tracer.record("llm.queue", (time.perf_counter() - queued) * 1000)
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await self._aattempt(prompt, deadline, kwargs)
+                    break
+                except Exception as e:
+                    retry_in = None if isinstance(e, LLMDeadlineExceeded) else self._retry_delay(e, attempt, deadline)
+                    if retry_in is None:
+                        raise self._give_up(e) from e
+                    self._count(retries=1)
+                    await asyncio.sleep(max(retry_in, self.request_bucket.reserve(1)))
+        finally:
+            slots.release()
+        self._settle(estimate, response)
+        return response
+
+    async def _aattempt(self, prompt, deadline, kwargs):
+        start = time.perf_counter()
+        self._count(attempts=1)
+        tasks = [asyncio.ensure_future(self.model.ainvoke(prompt, **kwargs))]
+        try:
+            if self.hedge_after_s > 0:
+                done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_after_s, max(0.0, deadline - time.monotonic())))
+                if not done and deadline - time.monotonic() > 0 and self.request_bucket.try_take(1):
+                    self._count(hedged=1, attempts=1)
+                    tasks.append(asyncio.ensure_future(self.model.ainvoke(prompt, **kwargs)))
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._count(deadline_exceeded=1)
+                    raise LLMDeadlineExceeded(f"LLM did not answer within {self.deadline_s:.0f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self._count(hedge_wins=1)
+                        tracer.record("llm.model", (time.perf_counter() - start) * 1000)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing hedge (or every attempt, past the deadline) is cancelled.
+            for task in tasks:
+                task.cancel()
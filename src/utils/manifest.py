@@ -0,0 +1,57 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def manifest_path(db_dir):
+    return os.path.join(db_dir, MANIFEST_FILENAME)
+
+def load_manifest(db_dir):
+    path = manifest_path(db_dir)
+    if not os.path.exists(path):
+        return {"files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, db_dir):
+    os.makedirs(db_dir, exist_ok=True)
+    path = manifest_path(db_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def diff_reports(folder_path, manifest, filenames=None):
+    """Compare the PDFs in folder_path against the manifest.
+
+    Returns (changed, removed, hashes): filenames that are new or whose content
+    changed, manifest entries whose file no longer exists, and the current hash
+    of every scanned file. If filenames is given only those files are scanned
+    and nothing is reported as removed.
+    """
+    if filenames is None:
+        scan = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(".pdf"))
+    else:
+        scan = sorted(filenames)
+
+    known = manifest.get("files", {})
+    hashes = {name: file_sha256(os.path.join(folder_path, name)) for name in scan}
+    changed = [name for name, sha in hashes.items() if known.get(name, {}).get("sha256") != sha]
+    removed = [] if filenames is not None else sorted(set(known) - set(hashes))
+    return changed, removed, hashes
+
+def record_report(manifest, filename, sha256, chunk_ids):
+    manifest.setdefault("files", {})[filename] = {
+        "sha256": sha256,
+        "chunk_ids": sorted(chunk_ids),
+        "ingested_at": datetime.now().isoformat(timespec="seconds"),
+    }
@@ -0,0 +1,117 @@
+"""sentence-transformers models on onnxruntime instead of PyTorch.
+
+Uses the ONNX export published in the model's Hub repo (onnx/model.onnx) and
+its fast tokenizer, then applies the same mean pooling and L2 normalisation
+as all-MiniLM-L6-v2, so vectors are interchangeable with the PyTorch backend
+(test/benchmark_embeddings.py reports the cosine parity). Texts are sorted by
+token length before batching, so each batch is padded only to its own longest
+text rather than to the longest text in the call.
+"""
+
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "256"))
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(".cache", "onnx"))
+
+# Pre-quantized export shipped alongside onnx/model.onnx; used when the `onnx`
+# package needed for local quantization is not installed.
+PREQUANTIZED_FILE = "onnx/model_quint8_avx2.onnx"
+
+def _quantized_model(model_name, model_path):
+    """Path of a dynamically int8-quantized copy of model_path, built once and cached."""
+    out_dir = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "__"))
+    out_path = os.path.join(out_dir, "model_int8.onnx")
+    if os.path.exists(out_path):
+        return out_path
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError:
+        from huggingface_hub import hf_hub_download
+
+        print(f"⚠️ `onnx` is not installed; using the published {PREQUANTIZED_FILE} instead of quantizing locally.")
+        return hf_hub_download(model_name, PREQUANTIZED_FILE)
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_path = out_path + ".tmp"
+    quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+class OnnxEmbeddings(Embeddings):
+    def __init__(self, model_name, quantize=False, threads=EMBEDDING_THREADS, batch_size=EMBEDDING_BATCH_SIZE,
+                 max_length=EMBEDDING_MAX_LENGTH, session=None, tokenizer=None):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.batch_size = batch_size
+        self.tokenizer = tokenizer or self._load_tokenizer(model_name, max_length)
+        self.session = session or self._load_session(model_name, quantize, threads)
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def _load_tokenizer(model_name, max_length):
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        tokenizer = Tokenizer.from_file(hf_hub_download(model_name, "tokenizer.json"))
+        tokenizer.enable_truncation(max_length=max_length)
+        tokenizer.no_padding()
+        return tokenizer
+
+    @staticmethod
+    def _load_session(model_name, quantize, threads):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+
+        model_path = hf_hub_download(model_name, "onnx/model.onnx")
+        if quantize:
+            model_path = _quantized_model(model_name, model_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    def _run(self, encodings):
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(encodings), length), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real tokens, then L2 normalisation (the model's Pooling + Normalize modules).
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_array(self, texts):
+        """Embed texts into a float32 (len(texts), dim) array, in input order."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(list(texts))
+        # Length bucketing: neighbours in sorted order have similar lengths, so little padding.
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        out = None
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            vectors = self._run([encodings[i] for i in rows])
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[rows] = vectors
+        return out
+
+    def embed_documents(self, texts):
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed_array([text])[0].tolist()
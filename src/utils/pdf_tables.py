@@ -0,0 +1,268 @@
+"""Table detection on PDF pages, serialized row by row for retrieval.
+
+PyMuPDF's plain text dump puts every label and every figure of a statement on
+its own line, so "Revenue  23,101  29,455" reaches the embedder as number soup.
+Tables are recovered from the page layout instead:
+
+* ruled tables (drawn cell borders) come from PyMuPDF's find_tables, which is
+  only tried on pages that have vector drawings since it is slow;
+* borderless tables, the usual case in financial statements, are runs of rows
+  with a text label and figures right-aligned in shared columns. The lines
+  above the figures ("Period ended", "31 March 2025", "(PKR millions)") are
+  the column headers, and a single label line between rows ("Profit and
+  Loss") is a section.
+
+Each row is serialized with its column headers, e.g.
+"Revenue | Period ended 31 March 2025 (PKR millions): 23,101 | ...", so a row
+still reads correctly on its own inside a chunk.
+"""
+
+import re
+import statistics
+
+ROW_TOLERANCE = 3.0        # points between the vertical centres of cells on one row
+COLUMN_TOLERANCE = 12.0    # points between the right edges of figures in one column
+CELL_GAP = 0.8             # span gap, in font sizes, that separates two cells of a line
+MAX_ROW_GAP = 2.5          # vertical gap, in median line heights, that ends a table
+MIN_TABLE_ROWS = 3
+MAX_HEADER_ROWS = 4
+RULED_MIN_DRAWINGS = 4
+
+_NUMBER_CELL_RE = re.compile(r"^(?:\(?[-–]?\s?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\s?%?\)?|[-–—])$")
+_YEAR_CELL_RE = re.compile(r"^(?:FY\s?)?(?:19[89]\d|20\d\d)$")
+
+class _Cell:
+    __slots__ = ("x0", "y0", "x1", "y1", "text", "is_number")
+
+    def __init__(self, x0, y0, x1, y1, text):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.text = text
+        self.is_number = bool(_NUMBER_CELL_RE.match(text))
+
+    @property
+    def yc(self):
+        return (self.y0 + self.y1) / 2
+
+def text_lines(page_dict):
+    """(bbox, text) of every text line of page.get_text("dict"), in reading order."""
+    lines = []
+    for block in page_dict["blocks"]:
+        for line in block.get("lines", ()):
+            lines.append((line["bbox"], "".join(span["text"] for span in line["spans"])))
+    return lines
+
+def _cells(page_dict):
+    cells = []
+    for block in page_dict["blocks"]:
+        for line in block.get("lines", ()):
+            current = None
+            for span in line["spans"]:
+                if not span["text"].strip():
+                    continue
+                x0, y0, x1, y1 = span["bbox"]
+                if current and x0 - current[2] <= CELL_GAP * span["size"]:
+                    current[1], current[2], current[3] = min(current[1], y0), max(current[2], x1), max(current[3], y1)
+                    current[4] += span["text"]
+                else:
+                    current = [x0, y0, x1, y1, span["text"]]
+                    cells.append(current)
+    return [_Cell(x0, y0, x1, y1, " ".join(text.split())) for x0, y0, x1, y1, text in cells]
+
+def _rows(cells):
+    rows = []
+    for cell in sorted(cells, key=lambda c: c.yc):
+        if rows and cell.yc - rows[-1][0].yc <= ROW_TOLERANCE:
+            rows[-1].append(cell)
+        else:
+            rows.append([cell])
+    return [sorted(row, key=lambda c: c.x0) for row in rows]
+
+def _data_row(row):
+    """(label cells, figure cells) if row is a label followed only by figures, else None."""
+    first = next((i for i, cell in enumerate(row) if cell.is_number), None)
+    if first is None:
+        return None
+    label, figures = row[:first], row[first:]
+    if not all(cell.is_number for cell in figures):
+        return None
+    if not label and (len(figures) < 2 or all(_YEAR_CELL_RE.match(cell.text) for cell in figures)):
+        # A bare row of years is a header, and a lone number is a page number or a stray figure.
+        return None
+    return label, figures
+
+def _row_y(row):
+    return statistics.median(cell.yc for cell in row)
+
+def _columns(figure_rows):
+    """Figure columns as [x0, x1, members], clustered on the figures' right edges."""
+    columns = []
+    for cell in sorted((cell for figures in figure_rows for cell in figures), key=lambda c: c.x1):
+        if columns and cell.x1 - columns[-1][1] <= COLUMN_TOLERANCE:
+            column = columns[-1]
+            column[0], column[1] = min(column[0], cell.x0), cell.x1
+            column[2] += 1
+        else:
+            columns.append([cell.x0, cell.x1, 1])
+    return columns
+
+def _column_of(cell, columns):
+    def overlap(column):
+        return min(cell.x1, column[1]) - max(cell.x0, column[0])
+    return max(range(len(columns)), key=lambda i: (overlap(columns[i]), -abs(cell.x1 - columns[i][1])))
+
+def _is_section(row, label_x0, page_width):
+    cell = row[0]
+    return (len(row) == 1 and not cell.is_number and cell.x1 - cell.x0 < page_width / 2
+            and abs(cell.x0 - label_x0) <= COLUMN_TOLERANCE * 2)
+
+def _is_header(row, columns, label_x1):
+    if _data_row(row) is not None:
+        return False
+    in_columns = [cell for cell in row if cell.x0 >= label_x1 - COLUMN_TOLERANCE
+                  or any(min(cell.x1, c[1]) > max(cell.x0, c[0]) for c in columns)]
+    # At most one cell over the label column ("Particulars", "Rupees in '000").
+    return bool(in_columns) and len(row) - len(in_columns) <= 1
+
+def _layout_tables(page_dict, page_width):
+    cells = _cells(page_dict)
+    if not cells:
+        return []
+    rows = _rows(cells)
+    parsed = [_data_row(row) for row in rows]
+    max_gap = MAX_ROW_GAP * statistics.median(cell.y1 - cell.y0 for cell in cells)
+
+    tables, i = [], 0
+    while i < len(rows):
+        if parsed[i] is None:
+            i += 1
+            continue
+        label_x0 = parsed[i][0][0].x0 if parsed[i][0] else rows[i][0].x0
+        end, j = i, i + 1
+        while j < len(rows) and _row_y(rows[j]) - _row_y(rows[j - 1]) <= max_gap:
+            if parsed[j] is not None:
+                end = j
+            elif not _is_section(rows[j], label_x0, page_width):
+                break
+            j += 1
+        data = [k for k in range(i, end + 1) if parsed[k] is not None]
+        columns = _columns([parsed[k][1] for k in data])
+        if len(data) >= MIN_TABLE_ROWS and max(column[2] for column in columns) >= MIN_TABLE_ROWS:
+            tables.append(_build_table(rows, parsed, i, end, columns, label_x0, max_gap, page_width))
+        i = end + 1
+    return tables
+
+def _build_table(rows, parsed, start, end, columns, label_x0, max_gap, page_width):
+    label_x1 = max((cell.x1 for k in range(start, end + 1) if parsed[k] for cell in parsed[k][0]), default=label_x0)
+    first = start
+    # Walk up from the first figures: section lines, then header lines, then one title line.
+    leading_sections, headers, title = [], [], None
+    k = start - 1
+    while k >= 0 and _row_y(rows[k + 1]) - _row_y(rows[k]) <= max_gap:
+        if not headers and _is_section(rows[k], label_x0, page_width) and len(leading_sections) < 2:
+            leading_sections.insert(0, k)
+        elif len(headers) < MAX_HEADER_ROWS and _is_header(rows[k], columns, label_x1):
+            headers.insert(0, k)
+        else:
+            if (headers or leading_sections) and _is_section(rows[k], label_x0, page_width):
+                title = rows[k][0].text
+            break
+        first = k
+        k -= 1
+    if leading_sections and not headers and title is None and len(leading_sections) > 1:
+        title = rows[leading_sections.pop(0)][0].text
+
+    column_headers = [[] for _ in columns]
+    label_header = []
+    for k in headers:
+        for cell in rows[k]:
+            if cell.x1 <= label_x1 + COLUMN_TOLERANCE and cell.x0 < columns[0][0] - COLUMN_TOLERANCE:
+                label_header.append(cell.text)
+            else:
+                column_headers[_column_of(cell, columns)].append(cell.text)
+
+    table_rows = [{"section": rows[k][0].text} for k in leading_sections]
+    for k in range(start, end + 1):
+        if parsed[k] is None:
+            table_rows.append({"section": rows[k][0].text})
+            continue
+        label, figures = parsed[k]
+        values = [None] * len(columns)
+        for cell in figures:
+            column = _column_of(cell, columns)
+            values[column] = cell.text if values[column] is None else f"{values[column]} {cell.text}"
+        table_rows.append({"label": " ".join(cell.text for cell in label), "values": values})
+
+    covered = [cell for k in range(first, end + 1) for cell in rows[k]]
+    bbox = (min(c.x0 for c in covered), min(c.y0 for c in covered), max(c.x1 for c in covered), max(c.y1 for c in covered))
+    return {"bbox": bbox, "title": title, "label_header": " ".join(label_header) or None,
+            "columns": [" ".join(texts) for texts in column_headers], "rows": table_rows}
+
+def _clean(value):
+    return " ".join(str(value).split()) if value not in (None, "") else None
+
+def _ruled_tables(page):
+    try:
+        found = page.find_tables().tables
+    except Exception:
+        return []
+    tables = []
+    for tab in found:
+        if tab.row_count < 2 or tab.col_count < 2:
+            continue
+        extracted = tab.extract()
+        names = [_clean(name) for name in tab.header.names]
+        if not tab.header.external and extracted:
+            extracted = extracted[1:]
+        table_rows = []
+        for cells in extracted:
+            cells = [_clean(cell) for cell in cells]
+            if not any(cells[1:]):
+                if cells[0]:
+                    table_rows.append({"section": cells[0]})
+                continue
+            table_rows.append({"label": cells[0] or "", "values": cells[1:]})
+        if table_rows:
+            tables.append({"bbox": tuple(tab.bbox), "title": None, "label_header": names[0],
+                           "columns": [name or "" for name in names[1:]], "rows": table_rows})
+    return tables
+
+def find_tables(page, page_dict):
+    """Tables on a fitz page, as dicts of bbox, title, column headers and rows (top to bottom)."""
+    tables = _ruled_tables(page) if len(page.get_cdrawings()) >= RULED_MIN_DRAWINGS else []
+    if tables:
+        # Lines inside ruled tables are not offered to the layout detector again.
+        page_dict = {"blocks": [{**block, "lines": [line for line in block.get("lines", ())
+                                                    if not inside(line["bbox"], [t["bbox"] for t in tables])]}
+                                for block in page_dict["blocks"]]}
+    tables += _layout_tables(page_dict, page.rect.width)
+    return sorted(tables, key=lambda table: (table["bbox"][1], table["bbox"][0]))
+
+def inside(bbox, boxes):
+    """Whether the centre of bbox lies in any of boxes."""
+    x, y = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return any(x0 <= x <= x1 and y0 <= y <= y1 for x0, y0, x1, y1 in boxes)
+
+def serialize_row(row, columns):
+    if "section" in row:
+        return row["section"]
+    parts = [row["label"]] if row["label"] else []
+    for header, value in zip(columns, row["values"]):
+        if value:
+            parts.append(f"{header}: {value}" if header else value)
+    return " | ".join(parts)
+
+def table_chunks(table, rows_per_chunk):
+    """(text, first_row, last_row) per group of rows, each group prefixed with the title and current section."""
+    chunks, section = [], None
+    rows = table["rows"]
+    for start in range(0, len(rows), rows_per_chunk):
+        group = rows[start:start + rows_per_chunk]
+        lines = [table["title"]] if table["title"] else []
+        if section and "section" not in group[0]:
+            lines.append(section)
+        for row in group:
+            if "section" in row:
+                section = row["section"]
+            lines.append(serialize_row(row, table["columns"]))
+        chunks.append(("\n".join(lines), start, start + len(group) - 1))
+    return chunks
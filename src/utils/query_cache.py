@@ -0,0 +1,135 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+VERSION_FILENAME = "collection_version"
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+
+_MISSING = object()
+_local_version = 0
+
+class LRUCache:
+    """Thread-safe LRU mapping with an optional per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._data[key]
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+def _version_path():
+    db_dir = os.getenv("VECTOR_DB_DIR")
+    return os.path.join(db_dir, VERSION_FILENAME) if db_dir else None
+
+def collection_version():
+    """Version of the financials collection as seen by this process.
+
+    Combines an in-process counter with a counter file in VECTOR_DB_DIR so that
+    ingestion in another process (the CLI, a Streamlit worker) also invalidates
+    cached retrievals and answers here.
+    """
+    path = _version_path()
+    on_disk = 0
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                on_disk = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            pass
+    return _local_version, on_disk
+
+def bump_collection_version():
+    global _local_version
+    _local_version += 1
+    path = _version_path()
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    current = collection_version()[1]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(str(current + 1))
+    os.replace(tmp_path, path)
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?.!")
+
+class QueryCache:
+    """Two-level cache for the query pipeline.
+
+    Level 1 holds query embeddings (valid forever) and retrieval results (valid
+    for one collection version). Level 2 holds final answers keyed by normalized
+    question plus the retrieved chunk ids, with a TTL. Retrievals and answers
+    are dropped whenever the collection version changes.
+    """
+
+    def __init__(self, size=QUERY_CACHE_SIZE, answer_size=ANSWER_CACHE_SIZE, answer_ttl=ANSWER_CACHE_TTL):
+        self.embeddings = LRUCache(size)
+        self.retrievals = LRUCache(size)
+        self.answers = LRUCache(answer_size, ttl=answer_ttl)
+        self._version = collection_version()
+
+    def check_version(self):
+        """Drop retrievals and answers if the collection changed; returns the current version."""
+        version = collection_version()
+        if version != self._version:
+            self._version = version
+            self.retrievals.clear()
+            self.answers.clear()
+        return version
+
+    def answer_key(self, question, chunk_ids):
+        return normalize_question(question), tuple(chunk_ids)
+
+    def clear(self):
+        self.embeddings.clear()
+        self.retrievals.clear()
+        self.answers.clear()
+
+    def stats(self):
+        return {
+            "embeddings": self.embeddings.stats(),
+            "retrievals": self.retrievals.stats(),
+            "answers": self.answers.stats(),
+        }
+
+# Shared by every importer of the query pipeline in this process.
+query_cache = QueryCache()
@@ -0,0 +1,61 @@
+import os
+import re
+from collections import Counter
+
+import fitz
+
+# Bump when the report-level metadata attached to chunks, or the way pages are
+# cleaned and chunked, changes, so the next ingestion re-chunks every report
+# instead of keeping chunks built the old way. 2: boilerplate stripping,
+# 3: table rows parsed into their own chunks.
+METADATA_VERSION = 3
+
+_YEAR = r"(19[89]\d|20\d\d)"
+_PERIOD_END_RE = re.compile(r"(?:year|period|quarter|months)\s+ended[^\n]{0,40}?\b" + _YEAR + r"\b", re.IGNORECASE)
+_REPORT_YEAR_RE = re.compile(r"\b(?:annual|interim|financial)\s+(?:report|statements)\s+(?:for\s+)?" + _YEAR + r"\b", re.IGNORECASE)
+_DATE_LINE_RE = re.compile(r"^\s*\d{1,2}(?:st|nd|rd|th)?\s+[A-Za-z]+\s+" + _YEAR + r"\s*$", re.MULTILINE)
+_ANY_YEAR_RE = re.compile(r"\b" + _YEAR + r"\b")
+_STEM_NOISE_RE = re.compile(r"\b(?:annual|interim|report|financial|statements|fy)\b|" + _YEAR, re.IGNORECASE)
+
+def _stem(filename):
+    # Underscores and dashes are word characters to \b, so treat them as spaces first.
+    stem = re.sub(r"[_\-.]+", " ", os.path.splitext(filename)[0])
+    return re.sub(r"(?i)\bfy(?=\d)", "FY ", stem)
+
+def _fiscal_year(filename, text):
+    match = _ANY_YEAR_RE.search(_stem(filename))
+    if match:
+        return int(match.group(1))
+    for pattern in (_PERIOD_END_RE, _REPORT_YEAR_RE, _DATE_LINE_RE):
+        match = pattern.search(text)
+        if match:
+            return int(match.group(1))
+    years = Counter(_ANY_YEAR_RE.findall(text))
+    return int(years.most_common(1)[0][0]) if years else None
+
+def _company(filename, title):
+    if title and title.strip():
+        return title.strip()
+    stem = _STEM_NOISE_RE.sub(" ", _stem(filename))
+    return re.sub(r"\s+", " ", stem).strip() or os.path.splitext(filename)[0]
+
+def extract_report_metadata(pdf_path, pages=2):
+    """Report-level metadata for every chunk of pdf_path: company and fiscal_year.
+
+    The company is the PDF title, else the cleaned file name; the fiscal year
+    comes from the file name, else from "year/period ended ..." style phrases
+    or the most frequent year on the first pages. Unknown fields are omitted,
+    since vector stores reject None metadata values.
+    """
+    filename = os.path.basename(pdf_path)
+    try:
+        with fitz.open(pdf_path) as pdf:
+            title = (pdf.metadata or {}).get("title", "")
+            text = "\n".join(pdf[i].get_text() for i in range(min(pages, pdf.page_count)))
+    except Exception:
+        title, text = "", ""
+    metadata = {"company": _company(filename, title)}
+    year = _fiscal_year(filename, text)
+    if year is not None:
+        metadata["fiscal_year"] = year
+    return metadata
@@ -0,0 +1,122 @@
+"""Process-wide, lazily constructed pipeline resources.
+
+The embedding model, vector store and chat model are expensive to
+build (seconds of model loading and heavy imports), so nothing is constructed at
+import time. Each getter builds its resource on first use and hands the same
+instance to every later caller in the process.
+"""
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COLLECTION_NAME = "financials"
+
+_lock = threading.RLock()
+_embedding_model = None
+_clients = {}
+_collections = {}
+_llm = None
+_bm25_indexes = {}
+_facts_indexes = {}
+
+def get_embedding_model():
+    global _embedding_model
+    if _embedding_model is None:
+        with _lock:
+            if _embedding_model is None:
+                from src.utils.embeddings import load_embedding_model
+                _embedding_model = load_embedding_model()
+    return _embedding_model
+
+def get_chroma_client(use_persistent=True):
+    if use_persistent not in _clients:
+        with _lock:
+            if use_persistent not in _clients:
+                import chromadb
+                if use_persistent:
+                    _clients[use_persistent] = chromadb.PersistentClient(path=os.getenv("VECTOR_DB_DIR"))
+                else:
+                    _clients[use_persistent] = chromadb.Client()
+    return _clients[use_persistent]
+
+def get_collection(name=COLLECTION_NAME, use_persistent=True):
+    """The vector store for name: Chroma, or the memory-mapped NumPy store with VECTOR_STORE=numpy.
+
+    With VECTOR_SHARDING=1 it is split into one store of that kind per report.
+    """
+    key = (name, use_persistent)
+    if key not in _collections:
+        with _lock:
+            if key not in _collections:
+                from src.utils.vector_store import VECTOR_SHARDING, ShardedVectorStore
+                db_dir = os.getenv("VECTOR_DB_DIR") if use_persistent else None
+                if VECTOR_SHARDING:
+                    catalog_path = os.path.join(db_dir, f"shards_{name}.json") if db_dir else None
+                    _collections[key] = ShardedVectorStore(name, lambda shard: _open_store(shard, use_persistent), catalog_path)
+                else:
+                    _collections[key] = _open_store(name, use_persistent)
+    return _collections[key]
+
+def _open_store(name, use_persistent):
+    from src.utils.vector_store import VECTOR_STORE, ChromaVectorStore, NumpyVectorStore
+    if VECTOR_STORE == "numpy":
+        db_dir = os.getenv("VECTOR_DB_DIR")
+        return NumpyVectorStore(os.path.join(db_dir, "numpy_store", name) if use_persistent and db_dir else None)
+    return ChromaVectorStore(get_chroma_client(use_persistent).get_or_create_collection(name=name))
+
+def get_bm25_index(use_persistent=True):
+    if use_persistent not in _bm25_indexes:
+        with _lock:
+            if use_persistent not in _bm25_indexes:
+                from src.utils.bm25_index import BM25Index, INDEX_FILENAME
+                db_dir = os.getenv("VECTOR_DB_DIR")
+                path = os.path.join(db_dir, INDEX_FILENAME) if use_persistent and db_dir else None
+                _bm25_indexes[use_persistent] = BM25Index(path)
+    return _bm25_indexes[use_persistent]
+
+def get_facts_index(use_persistent=True):
+    if use_persistent not in _facts_indexes:
+        with _lock:
+            if use_persistent not in _facts_indexes:
+                from src.utils.facts import FactsIndex, FACTS_FILENAME
+                db_dir = os.getenv("VECTOR_DB_DIR")
+                path = os.path.join(db_dir, FACTS_FILENAME) if use_persistent and db_dir else None
+                _facts_indexes[use_persistent] = FactsIndex(path)
+    return _facts_indexes[use_persistent]
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                use_gateway = os.getenv("LLM_GATEWAY", "1") != "0"
+                if os.getenv("LLM_BACKEND", "groq") == "fake":
+                    from src.utils.fakes import FakeChatModel
+                    model = FakeChatModel()
+                else:
+                    from langchain_groq import ChatGroq
+                    # Retries are the gateway's job; GROQ_API_BASE can point at a local fake server.
+                    model = ChatGroq(model_name=os.getenv("GROQ_MODEL"), max_retries=0 if use_gateway else 2)
+                if use_gateway:
+                    from src.utils.llm_gateway import LLMGateway
+                    model = LLMGateway(model)
+                _llm = model
+    return _llm
+
+def warmup(llm=True):
+    """Eagerly build every resource, e.g. before a worker starts taking traffic.
+
+    With SNAPSHOT_PATH set, an empty collection is first restored from that
+    snapshot (see src.utils.snapshot), so a fresh worker needs no ingestion.
+    """
+    if os.getenv("SNAPSHOT_PATH"):
+        from src.utils.snapshot import warm_start
+        warm_start(os.getenv("SNAPSHOT_PATH"))
+    get_embedding_model().embed_query("warmup")
+    get_collection()
+    if llm:
+        get_llm()
@@ -0,0 +1,120 @@
+"""Append-only log of answered questions.
+
+Request threads only enqueue records; a background thread appends them as JSON
+lines to the current segment and rotates it once it exceeds max_segment_bytes,
+gzip-compressing the closed segment. Segment names carry a timestamp, the pid
+and a sequence number, so concurrent processes and bursts within one second
+never overwrite each other.
+"""
+
+import os
+import glob
+import gzip
+import json
+import queue
+import atexit
+import shutil
+import threading
+from datetime import datetime
+
+RESPONSE_LOG_SEGMENT_MB = float(os.getenv("RESPONSE_LOG_SEGMENT_MB", "32"))
+
+_STOP = object()
+
+class ResponseLog:
+    def __init__(self, directory, max_segment_bytes=int(RESPONSE_LOG_SEGMENT_MB * 1024 * 1024), compress=True):
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.compress = compress
+        self.written = 0
+        self._queue = queue.Queue()
+        self._sequence = 0
+        self._file = None
+        self._path = None
+        self._thread = threading.Thread(target=self._run, name="response-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, record):
+        """Queue a record for writing; never touches the disk on the caller's thread."""
+        record.setdefault("ts", datetime.now().isoformat(timespec="milliseconds"))
+        self._queue.put(record)
+
+    def flush(self):
+        """Block until every record queued so far has been written."""
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        name = f"responses_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._sequence:04d}.jsonl"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, "a", encoding="utf-8")
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        if self.compress and os.path.exists(self._path) and os.path.getsize(self._path) > 0:
+            with open(self._path, "rb") as src, gzip.open(self._path + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self._path)
+        self._file = None
+
+    def _run(self):
+        stop = False
+        while not stop:
+            # Take everything already queued so the segment is flushed once per burst.
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in items)
+            try:
+                self._write([item for item in items if item is not _STOP])
+            except Exception as e:
+                print(f"⚠️ Response log write failed: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+        self._close_segment()
+
+    def _write(self, batch):
+        for record in batch:
+            if self._file is None:
+                self._open_segment()
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self.written += 1
+            if self._file.tell() >= self.max_segment_bytes:
+                self._close_segment()
+        if self._file is not None:
+            self._file.flush()
+
+def iter_responses(directory):
+    """Yield every logged record, oldest segment first; tolerates a torn final line."""
+    paths = glob.glob(os.path.join(directory, "responses_*.jsonl")) + glob.glob(os.path.join(directory, "responses_*.jsonl.gz"))
+    for path in sorted(paths, key=lambda p: os.path.basename(p).split(".")[0]):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+_lock = threading.Lock()
+_logs = {}
+
+def get_response_log(directory):
+    if directory not in _logs:
+        with _lock:
+            if directory not in _logs:
+                _logs[directory] = ResponseLog(directory)
+    return _logs[directory]
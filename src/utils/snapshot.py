@@ -0,0 +1,226 @@
+"""Compressed columnar snapshots of the financials collection.
+
+A snapshot is a single .npz file (zip/deflate) holding one column per field:
+
+    header                     JSON: format, collection, count, dim, embedding model, metadata column kinds
+    ids                        chunk ids
+    embeddings                 (count, dim) float32, or float16 when exported with half=True
+    documents                  UTF-8 text of every chunk, concatenated and sliced by document_offsets
+    meta.<key>                 one column per metadata key; meta_present.<key> marks the rows that have it
+    manifest, facts            the ingest manifest and the facts index, as JSON
+
+Restoring one is a few bulk upserts instead of re-parsing and re-embedding
+every report, so a new worker can start from a snapshot (SNAPSHOT_PATH) in
+seconds. The BM25 index is rebuilt from the documents on restore.
+"""
+
+import os
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent warm starts are not serialized.
+    fcntl = None
+
+from src.utils.embeddings import EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_QUANTIZE
+from src.utils.manifest import load_manifest, save_manifest
+from src.utils.query_cache import bump_collection_version
+from src.utils.report_metadata import METADATA_VERSION
+from src.utils.resources import COLLECTION_NAME, get_collection, get_bm25_index, get_facts_index
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "4096"))
+RESTORE_LOCK_FILENAME = "snapshot_restore.lock"
+
+_FILL = {"bool": False, "int": 0, "float": 0.0, "str": "", "json": ""}
+
+def embedding_fingerprint():
+    """The embedding model vectors come from; vectors of different models must not be mixed."""
+    return f"{EMBEDDING_BACKEND}:{EMBEDDING_MODEL}" + ("@int8" if EMBEDDING_BACKEND == "onnx" and EMBEDDING_QUANTIZE else "")
+
+def _json_column(value):
+    return np.frombuffer(json.dumps(value, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+
+def _from_json_column(column):
+    return json.loads(column.tobytes().decode("utf-8"))
+
+def _kind(values):
+    types = {type(value) for value in values}
+    for kind, allowed in (("bool", {bool}), ("int", {int}), ("float", {float}), ("str", {str})):
+        if types <= allowed:
+            return kind
+    # Mixed types keep their exact values as JSON rather than being coerced to one type.
+    return "json"
+
+def _metadata_columns(metadatas):
+    keys = sorted({key for metadata in metadatas if metadata for key in metadata})
+    columns, kinds = {}, {}
+    for key in keys:
+        present = np.array([bool(metadata) and key in metadata for metadata in metadatas], dtype=bool)
+        kind = kinds[key] = _kind([metadata[key] for metadata in metadatas if metadata and key in metadata])
+        values = [(metadata[key] if kind != "json" else json.dumps(metadata[key])) if metadata and key in metadata else _FILL[kind]
+                  for metadata in metadatas]
+        columns[f"meta.{key}"] = np.array(values, dtype={"bool": bool, "int": np.int64, "float": np.float64}.get(kind, str))
+        columns[f"meta_present.{key}"] = present
+    return columns, kinds
+
+def _read_collection(collection, batch_size):
+    ids = collection.get(include=[])["ids"]
+    out_ids, embeddings, documents, metadatas = [], [], [], []
+    for start in range(0, len(ids), batch_size):
+        # Backends do not promise to return rows in the order asked for, so every batch carries its own ids.
+        part = collection.get(ids=ids[start:start + batch_size], include=["embeddings", "documents", "metadatas"])
+        out_ids.extend(part["ids"])
+        embeddings.append(np.asarray(part["embeddings"], dtype=np.float32))
+        documents.extend(part["documents"])
+        metadatas.extend(part["metadatas"])
+    return out_ids, embeddings, documents, metadatas
+
+def export_snapshot(path, collection=None, db_dir=None, half=False, batch_size=SNAPSHOT_BATCH_SIZE):
+    """Write the collection, ingest manifest and facts index to one compressed snapshot; returns a summary."""
+    start = time.perf_counter()
+    collection = get_collection() if collection is None else collection
+    db_dir = db_dir or os.getenv("VECTOR_DB_DIR")
+    ids, embeddings, documents, metadatas = _read_collection(collection, batch_size)
+    matrix = np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+    encoded = [(document or "").encode("utf-8") for document in documents]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    meta_columns, kinds = _metadata_columns(metadatas)
+    header = {
+        "format": SNAPSHOT_FORMAT, "collection": COLLECTION_NAME, "count": len(ids), "dim": int(matrix.shape[1]),
+        "embedding": embedding_fingerprint(), "metadata": kinds, "created_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    facts = get_facts_index().reports() if db_dir else {}
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        header=_json_column(header),
+        ids=np.array(ids, dtype=str),
+        embeddings=matrix.astype(np.float16 if half else np.float32),
+        documents=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        document_offsets=offsets,
+        manifest=_json_column(load_manifest(db_dir) if db_dir else {"files": {}}),
+        facts=_json_column(facts),
+        **meta_columns,
+    )
+    os.replace(tmp_path, path)
+    return {"path": path, "chunks": len(ids), "dim": header["dim"], "bytes": os.path.getsize(path),
+            "seconds": time.perf_counter() - start}
+
+def read_snapshot(path):
+    """The snapshot at path as {header, ids, embeddings, documents, metadatas, manifest, facts}."""
+    with np.load(path, allow_pickle=False) as data:
+        header = _from_json_column(data["header"])
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {header.get('format')!r} in {path}")
+        blob, offsets = data["documents"].tobytes(), data["document_offsets"]
+        documents = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(header["count"])]
+        metadatas = [{} for _ in range(header["count"])]
+        for key, kind in header["metadata"].items():
+            values, present = data[f"meta.{key}"].tolist(), data[f"meta_present.{key}"]
+            for row in np.flatnonzero(present):
+                metadatas[row][key] = json.loads(values[row]) if kind == "json" else values[row]
+        return {
+            "header": header,
+            "ids": data["ids"].tolist(),
+            "embeddings": data["embeddings"].astype(np.float32),
+            "documents": documents,
+            "metadatas": metadatas,
+            "manifest": _from_json_column(data["manifest"]),
+            "facts": _from_json_column(data["facts"]),
+        }
+
+def _clear(collection, lexical_index, facts_index, batch_size):
+    ids = collection.get(include=[])["ids"]
+    for start in range(0, len(ids), batch_size):
+        collection.delete(ids=ids[start:start + batch_size])
+    lexical_index.delete(ids)
+    for source in facts_index.reports():
+        facts_index.remove_report(source)
+
+def restore_snapshot(path, collection=None, lexical_index=None, facts_index=None, db_dir=None, replace=False, force=False,
+                     batch_size=SNAPSHOT_BATCH_SIZE):
+    """Bulk-load a snapshot into the vector store, BM25 index, facts index and ingest manifest.
+
+    With replace=True the current contents are dropped first; otherwise the
+    snapshot's chunks are upserted over them. A snapshot of vectors from a
+    different embedding model is refused unless force=True, since queries
+    embedded with the current model could not be compared against them.
+    """
+    start = time.perf_counter()
+    snapshot = read_snapshot(path)
+    header = snapshot["header"]
+    if header["embedding"] != embedding_fingerprint() and not force:
+        raise ValueError(f"Snapshot vectors come from {header['embedding']}, but this deployment embeds with "
+                         f"{embedding_fingerprint()}; re-ingest instead, or force the restore.")
+    # An empty BM25 or facts index is falsy, but is still the one to fill.
+    collection = get_collection() if collection is None else collection
+    lexical_index = get_bm25_index() if lexical_index is None else lexical_index
+    facts_index = get_facts_index() if facts_index is None else facts_index
+    db_dir = db_dir or os.getenv("VECTOR_DB_DIR")
+    if replace:
+        _clear(collection, lexical_index, facts_index, batch_size)
+
+    ids, embeddings = snapshot["ids"], snapshot["embeddings"]
+    for i in range(0, len(ids), batch_size):
+        collection.upsert(ids=ids[i:i + batch_size], embeddings=embeddings[i:i + batch_size],
+                          documents=snapshot["documents"][i:i + batch_size], metadatas=snapshot["metadatas"][i:i + batch_size])
+    lexical_index.add(ids, snapshot["documents"])
+    for source, facts in snapshot["facts"].items():
+        facts_index.replace_report(source, facts)
+    collection.persist()
+    lexical_index.save()
+    facts_index.save()
+
+    if db_dir:
+        manifest = {"files": {}} if replace else load_manifest(db_dir)
+        restored = snapshot["manifest"]
+        if restored.get("metadata_version") != METADATA_VERSION:
+            # Chunks built the old way are re-embedded by the next ingestion.
+            for entry in restored.get("files", {}).values():
+                entry["sha256"] = None
+        manifest.setdefault("files", {}).update(restored.get("files", {}))
+        manifest.setdefault("metadata_version", METADATA_VERSION)
+        save_manifest(manifest, db_dir)
+    bump_collection_version()
+
+    elapsed = time.perf_counter() - start
+    return {"path": path, "chunks": len(ids), "reports": len(snapshot["manifest"].get("files", {})), "seconds": elapsed,
+            "chunks_per_sec": len(ids) / elapsed if elapsed > 0 else 0.0}
+
+@contextmanager
+def _restore_lock(db_dir):
+    if not db_dir or fcntl is None:
+        yield
+        return
+    os.makedirs(db_dir, exist_ok=True)
+    with open(os.path.join(db_dir, RESTORE_LOCK_FILENAME), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def warm_start(path=SNAPSHOT_PATH):
+    """Restore the snapshot at path into an empty collection, so a fresh worker starts with a populated index.
+
+    Returns the restore summary, or None if there was nothing to do.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    collection = get_collection()
+    with _restore_lock(os.getenv("VECTOR_DB_DIR")):
+        # Workers starting together restore once: the others find the collection filled when they get the lock.
+        collection.reload_if_changed()
+        if collection.count():
+            return None
+        return restore_snapshot(path, collection=collection)
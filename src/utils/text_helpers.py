@@ -1,5 +1,24 @@
+import hashlib
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+def iter_split_documents(docs, chunk_size=1000, chunk_overlap=200):
+    # Splits page by page so chunks can flow downstream while later pages are still being parsed.
+    # start_index lets the query-time context assembler merge overlapping neighbours exactly.
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+    for doc in docs:
+        if doc.metadata.get("content_type") == "table":
+            # Table row groups are already chunk-sized; splitting them would separate rows from their headers.
+            yield doc
+        else:
+            yield from splitter.split_documents([doc])
+
 def split_documents(docs, chunk_size=1000, chunk_overlap=200):
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    return splitter.split_documents(docs)
+    return list(iter_split_documents(docs, chunk_size=chunk_size, chunk_overlap=chunk_overlap))
+
+def chunk_id(doc):
+    # Stable across runs: the same text from the same page of the same report
+    # always maps to the same id, so re-ingestion upserts instead of duplicating.
+    source = str(doc.metadata.get("source", ""))
+    page = str(doc.metadata.get("page", ""))
+    digest = hashlib.sha256("\x1f".join([source, page, doc.page_content]).encode("utf-8"))
+    return digest.hexdigest()[:32]
@@ -0,0 +1,174 @@
+"""Lightweight stage timing for the ingest and query pipelines.
+
+    with tracer.trace("query", question=q):      # one JSONL record per trace
+        with tracer.span("query.llm"):           # timed stage, added to the record
+            ...
+        tracer.annotate(prompt_tokens=123)       # extra fields on the record
+
+Every span also feeds a rolling window of recent durations from which
+p50/p95/p99 are computed. With RAG_TRACE=0 span() and trace() return a shared
+no-op context manager, so instrumentation costs one attribute check.
+"""
+
+import os
+import json
+import time
+import threading
+import contextvars
+from collections import deque
+from datetime import datetime
+
+TRACE_ENABLED = os.getenv("RAG_TRACE", "1") != "0"
+TRACE_FILE = os.getenv("RAG_TRACE_FILE", "")
+TRACE_WINDOW = int(os.getenv("RAG_TRACE_WINDOW", "1024"))
+
+_current = contextvars.ContextVar("rag_trace", default=None)
+
+class _Noop:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NOOP = _Noop()
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+class _Trace:
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.spans = {}
+
+    def __enter__(self):
+        self.token = _current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        _current.reset(self.token)
+        self.tracer.record(self.name, duration_ms)
+        record = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "trace": self.name,
+            "duration_ms": round(duration_ms, 3),
+            "spans": {name: round(ms, 3) for name, ms in self.spans.items()},
+            **self.attrs,
+        }
+        if exc is not None:
+            record["error"] = repr(exc)
+        self.tracer.emit(record)
+        return False
+
+class Tracer:
+    def __init__(self, enabled=TRACE_ENABLED, path=TRACE_FILE, window=TRACE_WINDOW):
+        self.enabled = enabled
+        self.path = path
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name)
+
+    def trace(self, name, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return _Trace(self, name, attrs)
+
+    def annotate(self, **attrs):
+        """Set fields on the current trace record; numeric fields accumulate."""
+        if not self.enabled:
+            return
+        trace = _current.get()
+        if trace is None:
+            return
+        for key, value in attrs.items():
+            if isinstance(value, (int, float)) and isinstance(trace.attrs.get(key), (int, float)):
+                trace.attrs[key] += value
+            else:
+                trace.attrs[key] = value
+
+    def current_spans(self):
+        """Stage timings recorded so far on the current trace, in ms."""
+        trace = _current.get() if self.enabled else None
+        return {name: round(ms, 3) for name, ms in trace.spans.items()} if trace is not None else {}
+
+    def record(self, name, duration_ms):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(duration_ms)
+        trace = _current.get()
+        if trace is not None and trace.name != name:
+            trace.spans[name] = trace.spans.get(name, 0.0) + duration_ms
+
+    def emit(self, record):
+        if not self.path:
+            return
+        line = json.dumps(record, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def timed_iter(self, name, iterable):
+        """Yield from iterable, recording the time spent producing items as one span."""
+        if not self.enabled:
+            yield from iterable
+            return
+        total = 0.0
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                total += time.perf_counter() - start
+            yield item
+        self.record(name, total * 1000)
+
+    def stats(self):
+        """Rolling p50/p95/p99 (ms) per stage over the last `window` samples."""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+        stats = {}
+        for name, samples in sorted(snapshot.items()):
+            if not samples:
+                continue
+            def pct(p):
+                return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+            stats[name] = {"count": len(samples), "p50": pct(50), "p95": pct(95), "p99": pct(99)}
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+def estimate_tokens(text):
+    # ~4 characters per token for English prose; good enough for budgeting and trends.
+    return max(1, len(text) // 4) if text else 0
+
+# Shared by the ingest and query pipelines in this process.
+tracer = Tracer()
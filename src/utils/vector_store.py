@@ -0,0 +1,523 @@
+"""Vector store backends behind the subset of Chroma's Collection API the pipelines use.
+
+    store.upsert(ids=..., embeddings=..., documents=..., metadatas=...)
+    store.query(query_embeddings=..., n_results=..., include=[...], where={...})
+    store.get(ids=..., where=..., include=[...])
+    store.delete(ids=...)
+    store.count(); store.persist(); store.compact(); store.reload_if_changed()
+
+ChromaVectorStore wraps a Chroma collection. ShardedVectorStore keeps one such
+store per report and fans queries out only to the reports a filter can match.
+NumpyVectorStore keeps normalized
+float32 (or float16) vectors in a memory-mapped file and answers a query with
+one matrix product plus argpartition: exact top-k, no client or index overhead,
+and startup only maps the file. Rows are append-only until persist(), which
+compacts away deleted rows when they pile up, so the persisted records always
+describe a consistent matrix even if a process dies mid-ingest.
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+VECTOR_SHARDING = os.getenv("VECTOR_SHARDING", "0") == "1"
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "8"))
+RECORDS_FILENAME = "records.json"
+# Report-level metadata kept in the shard catalog, so filters on it skip whole shards.
+SHARD_KEYS = ("source", "company", "fiscal_year")
+_SCORE_BLOCK_ROWS = 16384
+
+class ChromaVectorStore:
+    """Adapter over a Chroma collection; Chroma persists and syncs on its own."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results=10, include=("documents", "metadatas"), where=None):
+        return self.collection.query(query_embeddings=query_embeddings, n_results=n_results, include=list(include), where=where or None)
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        return self.collection.get(ids=ids, where=where or None, include=list(include))
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where or None)
+
+    def count(self):
+        return self.collection.count()
+
+    def persist(self):
+        pass
+
+    def compact(self):
+        # Chroma reclaims deleted entries on its own.
+        pass
+
+    def reload_if_changed(self):
+        pass
+
+def _matches(value, condition):
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq":
+            ok = value == operand
+        elif op == "$ne":
+            ok = value != operand
+        elif op == "$in":
+            ok = value in operand
+        elif op == "$nin":
+            ok = value not in operand
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            ok = {"$gt": value > operand, "$gte": value >= operand, "$lt": value < operand, "$lte": value <= operand}[op]
+        else:
+            raise ValueError(f"Unsupported where operator: {op}")
+        if not ok:
+            return False
+    return True
+
+def matches_where(metadata, where):
+    """Evaluate a Chroma-style where filter ($and/$or, $eq/$ne/$in/$nin/$gt/$gte/$lt/$lte) on one metadata dict."""
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, sub) for sub in condition):
+                return False
+        elif not _matches(metadata.get(key), condition):
+            return False
+    return True
+
+def build_where(filters):
+    """Turn {"company": "X", "fiscal_year": [2023, 2024]} into a Chroma where clause, or None.
+
+    List values become $in; dict values are passed through as operator clauses.
+    """
+    clauses = []
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({key: {"$in": list(value)}})
+        else:
+            clauses.append({key: value})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _may_match(shard_metadata, where):
+    # Like matches_where, but keys the catalog does not know (e.g. page) cannot rule a shard out.
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_may_match(shard_metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(_may_match(shard_metadata, sub) for sub in condition):
+                return False
+        elif key in shard_metadata and not _matches(shard_metadata[key], condition):
+            return False
+    return True
+
+class NumpyVectorStore:
+    def __init__(self, directory=None, dtype=VECTOR_STORE_DTYPE):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._reset()
+        if directory and os.path.exists(os.path.join(directory, RECORDS_FILENAME)):
+            self.load()
+
+    def _reset(self):
+        self.dim = None
+        self._matrix = None
+        self._vectors_file = None
+        self._generation = 0
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._live = np.zeros(0, dtype=bool)
+        self._rows = {}
+        self._filter_cache = {}
+
+    # ---- storage ----
+    def _records_path(self):
+        return os.path.join(self.directory, RECORDS_FILENAME)
+
+    def _open_matrix(self, name, capacity):
+        path = os.path.join(self.directory, name)
+        size = capacity * self.dim * self.dtype.itemsize
+        if not os.path.exists(path) or os.path.getsize(path) < size:
+            with open(path, "ab") as f:
+                f.truncate(size)
+        return np.memmap(path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        capacity = max(1024, capacity * 2, rows)
+        if self.directory is None:
+            grown = np.zeros((capacity, self.dim), dtype=self.dtype)
+            if self._matrix is not None:
+                grown[:len(self._ids)] = self._matrix[:len(self._ids)]
+            self._matrix = grown
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        if self._vectors_file is None:
+            self._vectors_file = f"vectors_{self._generation}.{self.dtype.name}"
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._matrix = self._open_matrix(self._vectors_file, capacity)
+
+    def persist(self):
+        """Write the record list (and compact deleted rows if they make up a quarter of the matrix)."""
+        if self.directory is None:
+            return
+        with self._lock:
+            if self._matrix is None:
+                return
+            if len(self._ids) and (~self._live).sum() * 4 >= len(self._ids):
+                self._compact()
+            self._matrix.flush()
+            records = {
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+                "vectors_file": self._vectors_file,
+                "generation": self._generation,
+                "ids": self._ids,
+                "documents": self._documents,
+                "metadatas": self._metadatas,
+            }
+            tmp_path = self._records_path() + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(tmp_path, self._records_path())
+            self._mtime = os.path.getmtime(self._records_path())
+            self._remove_stale_files()
+
+    def compact(self):
+        """Rewrite the matrix without deleted rows, whatever their share, and persist."""
+        with self._lock:
+            if self._matrix is not None and not self._live.all():
+                self._compact()
+        self.persist()
+
+    def _compact(self):
+        keep = np.flatnonzero(self._live)
+        old_matrix = self._matrix
+        self._generation += 1
+        self._vectors_file = f"vectors_{self._generation}.{self.dtype.name}"
+        self._matrix = self._open_matrix(self._vectors_file, max(1024, len(keep) * 2))
+        self._matrix[:len(keep)] = old_matrix[keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._live = np.ones(len(keep), dtype=bool)
+        self._rows = {id_: row for row, id_ in enumerate(self._ids)}
+        self._filter_cache.clear()
+
+    def _remove_stale_files(self):
+        for name in os.listdir(self.directory):
+            if name.startswith("vectors_") and name != self._vectors_file:
+                os.remove(os.path.join(self.directory, name))
+
+    def load(self):
+        with self._lock:
+            with open(self._records_path(), "r", encoding="utf-8") as f:
+                records = json.load(f)
+            self._reset()
+            self.dim = records["dim"]
+            self.dtype = np.dtype(records["dtype"])
+            self._vectors_file = records["vectors_file"]
+            self._generation = records["generation"]
+            self._ids = records["ids"]
+            self._documents = records["documents"]
+            self._metadatas = records["metadatas"]
+            self._live = np.array([id_ is not None for id_ in self._ids], dtype=bool)
+            self._rows = {id_: row for row, id_ in enumerate(self._ids) if id_ is not None}
+            # Zero-copy: rows are paged in by the OS as queries touch them.
+            capacity = os.path.getsize(os.path.join(self.directory, self._vectors_file)) // (self.dim * self.dtype.itemsize)
+            self._matrix = np.memmap(os.path.join(self.directory, self._vectors_file), dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+            self._mtime = os.path.getmtime(self._records_path())
+
+    def reload_if_changed(self):
+        # Picks up ingestion done by another process (e.g. a CLI run).
+        if self.directory and os.path.exists(self._records_path()) and os.path.getmtime(self._records_path()) != self._mtime:
+            self.load()
+
+    # ---- Chroma-compatible API ----
+    def count(self):
+        return int(self._live.sum())
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.clip(norms, 1e-12, None)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self.dim}")
+            start = len(self._ids)
+            self._ensure_capacity(start + len(ids))
+            self._matrix[start:start + len(ids)] = vectors
+            # Rows are appended, never overwritten, so the last persisted state stays intact.
+            self._tombstone(ids)
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(dict(m) if m else None for m in metadatas)
+            self._live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            self._rows.update((id_, start + i) for i, id_ in enumerate(ids))
+            self._filter_cache.clear()
+
+    def _tombstone(self, ids):
+        for id_ in ids:
+            row = self._rows.pop(id_, None)
+            if row is not None:
+                self._live[row] = False
+                self._ids[row] = None
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            if where:
+                # Unknown ids are skipped, as Chroma does.
+                ids = [id_ for id_ in (ids if ids is not None else list(self._rows))
+                       if id_ in self._rows and matches_where(self._metadatas[self._rows[id_]], where)]
+            self._tombstone(ids or [])
+            self._filter_cache.clear()
+
+    def _select(self, include, rows):
+        result = {"ids": [self._ids[r] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [self._documents[r] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[r] for r in rows]
+        if "embeddings" in include:
+            result["embeddings"] = self._matrix[rows].astype(np.float32) if len(rows) else np.zeros((0, self.dim or 0), dtype=np.float32)
+        return result
+
+    def _mask(self, where):
+        n = len(self._ids)
+        if not where:
+            return self._live
+        key = json.dumps(where, sort_keys=True)
+        mask = self._filter_cache.get(key)
+        if mask is None:
+            mask = self._live & np.fromiter((matches_where(m, where) for m in self._metadatas), dtype=bool, count=n)
+            self._filter_cache[key] = mask
+        return mask
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        with self._lock:
+            if ids is not None:
+                rows = [self._rows[id_] for id_ in ids if id_ in self._rows]
+                if where:
+                    rows = [r for r in rows if matches_where(self._metadatas[r], where)]
+            else:
+                rows = np.flatnonzero(self._mask(where)).tolist()
+            return self._select(include, rows)
+
+    def query(self, query_embeddings, n_results=10, include=("documents", "metadatas"), where=None):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+        with self._lock:
+            n = len(self._ids)
+            mask = self._mask(where)
+            candidates = int(mask.sum())
+            k = min(n_results, candidates)
+            results = {"ids": [], "distances": []}
+            for key in ("documents", "metadatas", "embeddings"):
+                if key in include:
+                    results[key] = []
+            if k == 0:
+                for values in results.values():
+                    values.extend([] for _ in queries)
+                return results
+
+            if candidates * 2 >= n:
+                # Mostly live rows: score the whole mapped matrix in place and mask the rest out.
+                rows = None
+                scores = self._scores(queries, None)
+                if candidates < n:
+                    scores[:, ~mask] = -np.inf
+            else:
+                # Narrow filter: gather only the matching rows.
+                rows = np.flatnonzero(mask)
+                scores = self._scores(queries, rows)
+            if k < scores.shape[1]:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(scores.shape[1]), (len(queries), 1))
+            for i in range(len(queries)):
+                order = top[i][np.argsort(-scores[i, top[i]], kind="stable")]
+                found = order if rows is None else rows[order]
+                selected = self._select(include, found.tolist())
+                for key, values in selected.items():
+                    results[key].append(values)
+                # Squared L2 between unit vectors, matching Chroma's default distance.
+                results["distances"].append((2.0 - 2.0 * scores[i, order]).tolist())
+            return results
+
+    def _scores(self, queries, rows):
+        matrix = self._matrix[:len(self._ids)] if rows is None else self._matrix[rows]
+        if matrix.dtype == np.float32:
+            return queries @ matrix.T
+        # float16 storage halves the file; BLAS needs float32, so upcast block by block.
+        scores = np.empty((len(queries), matrix.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], _SCORE_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + block.shape[0]] = queries @ block.T
+        return scores
+
+class ShardedVectorStore:
+    """One vector store per report (metadata "source") behind the same API.
+
+    A catalog maps each report to its shard and the report-level metadata in
+    SHARD_KEYS. Queries go only to the shards a where filter can match, in
+    parallel, and the per-shard top-k lists are merged by distance, so search
+    cost follows the reports a question touches rather than the whole corpus.
+    Deletes by id are broadcast, since chunk ids do not encode their report.
+    """
+
+    def __init__(self, name, open_shard, catalog_path=None, workers=SHARD_WORKERS):
+        self.name = name
+        self.open_shard = open_shard
+        self.catalog_path = catalog_path
+        self._catalog = {}
+        self._shards = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vector-shard")
+        self._mtime = None
+        if catalog_path and os.path.exists(catalog_path):
+            self._load_catalog()
+
+    def _load_catalog(self):
+        with open(self.catalog_path, "r", encoding="utf-8") as f:
+            self._catalog = json.load(f)["shards"]
+        self._mtime = os.path.getmtime(self.catalog_path)
+
+    def _shard(self, source):
+        entry = self._catalog[source]
+        shard = self._shards.get(entry["shard"])
+        if shard is None:
+            shard = self._shards[entry["shard"]] = self.open_shard(entry["shard"])
+        return shard
+
+    def _select(self, where):
+        with self._lock:
+            sources = [source for source, entry in self._catalog.items() if not where or _may_match(entry["metadata"], where)]
+            return [self._shard(source) for source in sources]
+
+    def _fan_out(self, shards, fn):
+        if len(shards) <= 1:
+            return [fn(shard) for shard in shards]
+        return list(self._executor.map(fn, shards))
+
+    def shards(self):
+        """Catalog of report -> {"shard": name, "metadata": {...}}."""
+        with self._lock:
+            return {source: dict(entry) for source, entry in self._catalog.items()}
+
+    def count(self):
+        return sum(self._fan_out(self._select(None), lambda shard: shard.count()))
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        metadatas = metadatas or [{}] * len(ids)
+        documents = documents or [None] * len(ids)
+        groups = defaultdict(list)
+        for i, metadata in enumerate(metadatas):
+            groups[(metadata or {}).get("source", "")].append(i)
+        for source, rows in groups.items():
+            with self._lock:
+                if source not in self._catalog:
+                    first = metadatas[rows[0]] or {}
+                    metadata = {key: first[key] for key in SHARD_KEYS if key in first}
+                    metadata["source"] = source
+                    shard_name = f"{self.name}_{hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]}"
+                    self._catalog[source] = {"shard": shard_name, "metadata": metadata}
+                shard = self._shard(source)
+            shard.upsert(
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+
+    def delete(self, ids=None, where=None):
+        self._fan_out(self._select(where), lambda shard: shard.delete(ids=ids, where=where))
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        # Every requested key is present even when no shard matches the filter.
+        merged = {"ids": [], **{key: [] for key in include}}
+        for part in self._fan_out(self._select(where), lambda shard: shard.get(ids=ids, where=where, include=include)):
+            for key, values in part.items():
+                if key in merged and values is not None:
+                    merged[key].extend(list(values))
+        return merged
+
+    def query(self, query_embeddings, n_results=10, include=("documents", "metadatas"), where=None):
+        include = list(include)
+        parts = self._fan_out(
+            self._select(where),
+            lambda shard: shard.query(query_embeddings=query_embeddings, n_results=n_results, include=include + ["distances"], where=where),
+        )
+        keys = ["ids", "distances"] + [key for key in ("documents", "metadatas", "embeddings") if key in include]
+        results = {key: [] for key in keys}
+        for i in range(len(query_embeddings)):
+            # Distances share one metric across shards, so the global top-k is a plain merge.
+            candidates = [
+                (part["distances"][i][j], p, j)
+                for p, part in enumerate(parts)
+                for j in range(len(part["ids"][i]))
+            ]
+            candidates.sort(key=lambda c: c[0])
+            top = candidates[:n_results]
+            for key in keys:
+                results[key].append([parts[p][key][i][j] for _, p, j in top])
+        return results
+
+    def persist(self):
+        with self._lock:
+            shards = list(self._shards.values())
+            catalog = {"shards": self._catalog}
+        self._fan_out(shards, lambda shard: shard.persist())
+        if not self.catalog_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.catalog_path)), exist_ok=True)
+        tmp_path = self.catalog_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(catalog, f, indent=2)
+        os.replace(tmp_path, self.catalog_path)
+        self._mtime = os.path.getmtime(self.catalog_path)
+
+    def compact(self):
+        with self._lock:
+            shards = [self._shard(source) for source in self._catalog]
+        self._fan_out(shards, lambda shard: shard.compact())
+        self.persist()
+
+    def reload_if_changed(self):
+        # New reports ingested by another process appear as new catalog entries.
+        if self.catalog_path and os.path.exists(self.catalog_path) and os.path.getmtime(self.catalog_path) != self._mtime:
+            with self._lock:
+                self._load_catalog()
+        with self._lock:
+            shards = list(self._shards.values())
+        for shard in shards:
+            shard.reload_if_changed()
@@ -1,6 +1,5 @@
 import os
-import tempfile
-import shutil
+import threading
 from datetime import datetime
 
 import streamlit as st
@@ -12,27 +11,65 @@ sys.path.append(os.path.abspath('.'))
 
 # Import ingest and query helpers from the user's repo
 try:
-    from ingest import load_and_chunk_reports, embed_and_store
+    from ingest import ingest_reports
 except Exception:
     # If ingest is in src, try that
     try:
-        from src.ingest import load_and_chunk_reports, embed_and_store
+        from src.ingest import ingest_reports
     except Exception:
-        load_and_chunk_reports = None
-        embed_and_store = None
+        ingest_reports = None
 
 try:
-    from query import query_financials
+    from query import query_financials, stream_query_financials, cache_stats, stage_stats
 except Exception:
     try:
-        from src.query import query_financials
+        from src.query import query_financials, stream_query_financials, cache_stats, stage_stats
     except Exception:
         query_financials = None
+        stream_query_financials = None
+        cache_stats = None
+        stage_stats = None
+
+try:
+    from src.utils.jobs import get_job_registry
+    from src.utils.resources import warmup
+    from src.utils.conversation import ConversationSession
+    from src.utils.llm_gateway import LLMUnavailableError
+except Exception:
+    get_job_registry = None
+    warmup = None
+    ConversationSession = None
+    LLMUnavailableError = RuntimeError
 
 load_dotenv()
 
+
+@st.cache_resource(show_spinner=False)
+def job_registry():
+    # One registry (and ingest worker thread) per server process, shared by every session and rerun.
+    return get_job_registry()
+
+
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    # Build the embedder, Chroma client and LLM once per process, off the script thread.
+    thread = threading.Thread(target=warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "estimating..."
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+
 st.set_page_config(page_title="Financial RAG Assistant", page_icon="💼", layout="wide")
 
+if warmup is not None:
+    start_warmup()
+
 st.title("💼 Financial RAG Assistant")
 st.markdown("Upload financial reports (PDF) to ingest into the vector DB, then ask questions about the company's financials.")
 
@@ -45,9 +82,26 @@ with st.sidebar:
     st.write("\\.env should contain GROQ_API_KEY and optional settings used by your ingest/query scripts.")
     st.markdown("---")
     st.write("**Status checks**")
-    st.write(f"ingest functions available: {bool(load_and_chunk_reports and embed_and_store)}")
+    st.write(f"ingest functions available: {bool(ingest_reports)}")
     st.write(f"query function available: {bool(query_financials)}")
     st.write(f"VECTOR_DB_DIR: `{VECTOR_DB_DIR}`")
+    if warmup is not None:
+        st.write(f"models loaded: {not start_warmup().is_alive()}")
+    if cache_stats is not None:
+        st.markdown("---")
+        st.write("**Query cache hit rates**")
+        for level, stats in cache_stats().items():
+            st.write(f"{level}: {stats['hit_rate']:.0%} ({stats['hits']} hits / {stats['misses']} misses)")
+    if stage_stats is not None:
+        # Rolling latency per pipeline stage; shows whether time goes to retrieval or the LLM provider.
+        stages = stage_stats()
+        if stages:
+            st.markdown("---")
+            st.write("**Stage latency (ms)**")
+            st.table([
+                {"stage": name, "n": s["count"], "p50": round(s["p50"], 1), "p95": round(s["p95"], 1), "p99": round(s["p99"], 1)}
+                for name, s in stages.items()
+            ])
 
 # Tabs for Ingest and Chat
 tab = st.tabs(["Ingest reports", "Chat with financials"])
@@ -68,39 +122,56 @@ with tab[0]:
     if ingest_btn:
         if not uploaded:
             st.error("Please upload at least one PDF before ingesting.")
+        elif get_job_registry is None or ingest_reports is None:
+            st.error("Could not find ingest functions in the repo. Ensure `ingest.py` exports `ingest_reports`.")
         else:
             # Save uploads into data/reports
             dest_dir = os.path.join("data", "reports")
             os.makedirs(dest_dir, exist_ok=True)
-
-            temp_dir = tempfile.mkdtemp(prefix="streamlit_ingest_")
             try:
-                st.info(f"Saving {len(uploaded)} file(s) to `{dest_dir}` and running ingest...")
                 for f in uploaded:
                     out_path = os.path.join(dest_dir, f.name)
                     with open(out_path, "wb") as out:
                         out.write(f.getbuffer())
+                # Only the uploaded files are ingested, in the background; unchanged ones are skipped.
+                job = job_registry().submit(dest_dir, [f.name for f in uploaded], use_persistent=use_persistent)
+                st.info(f"Saved {len(uploaded)} file(s) to `{dest_dir}`; ingestion job `{job.id}` queued. You can keep chatting meanwhile.")
+            except Exception as e:
+                st.exception(e)
 
-                if load_and_chunk_reports is None or embed_and_store is None:
-                    st.error("Could not find ingest functions in the repo. Ensure `ingest.py` exports `load_and_chunk_reports` and `embed_and_store`.")
+    if get_job_registry is not None:
+        @st.fragment(run_every=1.0)
+        def ingestion_jobs():
+            jobs = job_registry().jobs()[:5]
+            if not jobs:
+                return
+            st.subheader("Ingestion jobs")
+            for job in jobs:
+                snap = job.snapshot()
+                label = f"`{snap['id']}` — {', '.join(snap['filenames'] or ['all reports'])}"
+                if snap["status"] == "done":
+                    stats = snap["result"]
+                    st.success(
+                        f"{label}: embedded {stats['stored']} chunks from {len(stats['changed'])} new or changed report(s) "
+                        f"in {format_seconds(snap['elapsed_s'])}."
+                    )
+                    if stats["failed"]:
+                        st.warning(f"{len(stats['failed'])} chunks failed and will be retried on the next ingestion.")
+                    if stats.get("unparsed"):
+                        st.warning(f"Could not parse {', '.join(stats['unparsed'])}; retried on the next ingestion.")
+                elif snap["status"] == "failed":
+                    st.error(f"{label}: ingestion failed: {snap['error']}")
                 else:
-                    with st.spinner("Loading and chunking reports — this may take a while depending on file size..."):
-                        docs = load_and_chunk_reports(dest_dir)
-                        st.success(f"Loaded and chunked {len(docs)} pieces.")
-
-                    with st.spinner("Embedding and storing chunks into the vector DB..."):
-                        # allow the ingest helper to use persistent or in-memory
-                        embed_and_store(docs, use_persistent=use_persistent)
-                        st.success("Embedding + storage complete.")
+                    text = "queued" if snap["status"] == "queued" else f"{snap['progress']:.0%} — ETA {format_seconds(snap['eta_s'])}"
+                    st.progress(snap["progress"], text=f"{label}: {text}")
+                    if snap["files"]:
+                        st.table([
+                            {"file": name, "pages parsed": f"{p['pages_parsed']}/{p['pages_total']}",
+                             "chunks parsed": p["chunks_parsed"], "chunks embedded": p["chunks_embedded"]}
+                            for name, p in snap["files"].items()
+                        ])
 
-                    st.balloons()
-            except Exception as e:
-                st.exception(e)
-            finally:
-                try:
-                    shutil.rmtree(temp_dir)
-                except Exception:
-                    pass
+        ingestion_jobs()
 
     if clear_btn:
         st.warning("Clearing `data/reports` folder (deleting files). Proceed with caution.")
@@ -126,20 +197,40 @@ with tab[1]:
     else:
         if "chat_history" not in st.session_state:
             st.session_state.chat_history = []
+        if "conversation" not in st.session_state:
+            # Follow-ups ("and what about 2023?") are read against earlier turns and reuse their context.
+            st.session_state.conversation = ConversationSession() if ConversationSession is not None else None
 
         question = st.text_input("Ask a question about the company's financials:")
-        ask_btn = st.button("Ask")
+        col1, col2 = st.columns([1, 5])
+        with col1:
+            ask_btn = st.button("Ask")
+        with col2:
+            if st.button("New conversation"):
+                st.session_state.chat_history = []
+                if st.session_state.conversation is not None:
+                    st.session_state.conversation.clear()
 
         if ask_btn:
             if not question or question.strip() == "":
                 st.error("Please type a question.")
             else:
-                with st.spinner("Querying vector DB and LLM — this may take a few seconds..."):
-                    try:
-                        answer = query_financials(question)
-                    except Exception as e:
-                        st.exception(e)
-                        answer = "Error during query. Check server logs and env variables."
+                # Stream tokens into a placeholder as they arrive; the finished answer is
+                # then rendered from chat history like every other turn.
+                live = st.empty()
+                try:
+                    with live.container():
+                        st.markdown(f"**You:** {question}")
+                        st.markdown("**Assistant:**")
+                        answer = st.write_stream(stream_query_financials(question, session=st.session_state.conversation))
+                except LLMUnavailableError as e:
+                    # Rate limits and provider outages survived the gateway's retries: not a bug, just busy.
+                    st.warning(str(e))
+                    answer = "The model is busy right now; please ask again in a moment."
+                except Exception as e:
+                    st.exception(e)
+                    answer = "Error during query. Check server logs and env variables."
+                live.empty()
 
                 # store and render
                 timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
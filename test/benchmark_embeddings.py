@@ -0,0 +1,96 @@
+"""
+Embedding backend throughput and parity benchmark.
+- Embeds real report chunks (data/reports) with each backend: PyTorch ("huggingface"), onnxruntime fp32 ("onnx")
+  and onnxruntime dynamic int8 ("onnx-int8"). The embedding cache is bypassed so every text is computed.
+- Reports texts/sec per backend and, against the reference backend (the first one listed), the mean and
+  minimum cosine similarity of the vectors for the same texts.
+- Writes machine-readable JSON to benchmark_results/.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+
+from src.utils.embeddings import EMBEDDING_MODEL, load_embedding_model
+from src.utils.file_loader import load_pdf_from_folder
+from src.utils.text_helpers import split_documents
+
+BACKENDS = {
+    "huggingface": {"backend": "huggingface", "quantize": False},
+    "onnx": {"backend": "onnx", "quantize": False},
+    "onnx-int8": {"backend": "onnx", "quantize": True},
+}
+
+
+def load_texts(folder, n_texts):
+    chunks = [doc.page_content for doc in split_documents(load_pdf_from_folder(folder))]
+    if not chunks:
+        raise SystemExit(f"No text found in {folder}")
+    # Repeat the corpus if needed; the cache is off, so repeats still cost a full forward pass.
+    return [chunks[i % len(chunks)] for i in range(n_texts)]
+
+
+def cosine_parity(reference, candidate):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = (reference * candidate).sum(axis=1)
+    return {"mean": float(cosines.mean()), "min": float(cosines.min())}
+
+
+def bench_backend(name, texts, model_name, repeats):
+    model = load_embedding_model(model_name, cache_size=0, **BACKENDS[name])
+    model.embed_documents(texts[:8])  # warm-up: session/graph initialisation
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        vectors = model.embed_documents(texts)
+        best = min(best, time.perf_counter() - start)
+    return np.asarray(vectors, dtype=np.float32), {"seconds": best, "texts_per_sec": len(texts) / best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="huggingface,onnx,onnx-int8", help="comma-separated; the first is the parity reference")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--reports", default=os.path.join(ROOT_DIR, "data", "reports"))
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output-dir", default=os.path.join(ROOT_DIR, "benchmark_results"))
+    args = parser.parse_args()
+
+    texts = load_texts(args.reports, args.texts)
+    print(f"Embedding {len(texts)} chunks with {args.model} (EMBEDDING_THREADS={os.getenv('EMBEDDING_THREADS', 'default')})")
+
+    results, reference = {}, None
+    for name in args.backends.split(","):
+        try:
+            vectors, stats = bench_backend(name, texts, args.model, args.repeats)
+        except Exception as e:
+            print(f"⚠️ {name}: skipped ({e!r})")
+            continue
+        if reference is None:
+            reference = (name, vectors)
+        else:
+            stats[f"cosine_vs_{reference[0]}"] = cosine_parity(reference[1], vectors)
+        results[name] = stats
+        parity = stats.get(f"cosine_vs_{reference[0]}")
+        print(f"{name:12s} {stats['texts_per_sec']:8.1f} texts/sec" +
+              (f"   cosine vs {reference[0]}: mean {parity['mean']:.5f}, min {parity['min']:.5f}" if parity else "   (reference)"))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    out_path = os.path.join(args.output_dir, f"embeddings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": datetime.now().isoformat(timespec="seconds"), "config": vars(args), "backends": results}, f, indent=2)
+    print(f"\n📂 Results written to: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Offline performance benchmarks for the ingest and query pipelines.
+- Generates synthetic annual-report PDFs, so no real reports are needed.
+- Uses hashing embeddings and a fake chat model with simulated latency, so no GROQ_API_KEY or model download is needed.
+- Scenarios: ingest throughput, query latency percentiles, batch queries, cache hit behaviour and peak memory.
+- Writes machine-readable JSON to benchmark_results/ and can compare against a previous run.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.join(ROOT_DIR, "src"))
+
+METRICS = ["revenue", "net profit", "total assets", "return on equity (ROE)", "return on assets (ROA)", "efficiency ratio"]
+
+def generate_synthetic_reports(folder, n_reports=10, pages=40, seed=7):
+    import fitz
+
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for r in range(n_reports):
+        company = f"Synthetic Bank {r + 1}"
+        year = 2020 + r % 5
+        pdf = fitz.open()
+        for p in range(pages):
+            lines = [f"{company} Annual Report {year}", ""]
+            for _ in range(12):
+                metric = rng.choice(METRICS)
+                value, prior = rng.randint(1_000, 900_000), rng.randint(1_000, 900_000)
+                lines.append(
+                    f"The {metric} for {year} was PKR {value:,} million compared with PKR {prior:,} million in {year - 1}, "
+                    f"reflecting {rng.choice(['strong', 'stable', 'weaker', 'improved'])} performance in {rng.choice(['corporate', 'retail', 'treasury'])} banking."
+                )
+            lines += ["", "This report contains forward-looking statements that involve risks and uncertainties.", f"Page {p + 1}"]
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(40, 40, 560, 800), "\n".join(lines), fontsize=8)
+        pdf.set_metadata({"title": company})
+        pdf.save(os.path.join(folder, f"synthetic_report_{r + 1:03d}.pdf"))
+        pdf.close()
+    return n_reports * pages
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+    return {"n": len(ordered), "mean": statistics.fmean(ordered), "p50": pct(50), "p95": pct(95), "p99": pct(99), "max": ordered[-1]}
+
+def peak_memory_mb():
+    # ru_maxrss is KiB on Linux; children covers the PDF parsing worker processes.
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": self_kb / 1024, "children": children_kb / 1024}
+
+def last_trace(name):
+    with open(os.environ["RAG_TRACE_FILE"], "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    return next(r for r in reversed(records) if r["trace"] == name)
+
+def bench_ingest(folder, total_pages):
+    from ingest import ingest_reports
+
+    start = time.perf_counter()
+    stats = ingest_reports(folder)
+    elapsed = time.perf_counter() - start
+
+    stages = last_trace("embed_and_store")["spans"]
+
+    start = time.perf_counter()
+    ingest_reports(folder)
+    noop_elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": elapsed,
+        "pages": total_pages,
+        "chunks": stats["stored"],
+        "pages_per_sec": total_pages / elapsed,
+        "chunks_per_sec": stats["stored"] / elapsed,
+        "failed_chunks": len(stats["failed"]),
+        "boilerplate_lines": stats["dedup"]["boilerplate_lines"],
+        "duplicate_chunks": stats["dedup"]["chunks_saved"],
+        "incremental_noop_seconds": noop_elapsed,
+        "stages_ms": stages,
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+def make_questions(n, seed=11):
+    rng = random.Random(seed)
+    return [f"What was the {rng.choice(METRICS)} of Synthetic Bank {rng.randint(1, 10)} in {rng.randint(2019, 2024)}? (q{i})" for i in range(n)]
+
+def bench_query(n_questions):
+    import query
+
+    questions = make_questions(n_questions)
+    retrieval_ms, end_to_end_ms = [], []
+    for q in questions:
+        start = time.perf_counter()
+        query.retrieve(q)
+        retrieval_ms.append((time.perf_counter() - start) * 1000)
+    query.query_cache.clear()
+    for q in questions:
+        start = time.perf_counter()
+        query.query_financials(q)
+        end_to_end_ms.append((time.perf_counter() - start) * 1000)
+
+    batch_questions = [q + " [batch]" for q in questions]
+    start = time.perf_counter()
+    query.query_financials_batch(batch_questions)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "retrieval_ms": percentiles(retrieval_ms),
+        "end_to_end_ms": percentiles(end_to_end_ms),
+        "batch": {"questions": len(batch_questions), "seconds": batch_seconds, "sequential_seconds": sum(end_to_end_ms) / 1000},
+        "stages_ms": {name: {"p50": s["p50"], "p95": s["p95"]} for name, s in query.stage_stats().items() if name.startswith("query.")},
+        "peak_memory_mb": peak_memory_mb(),
+    }
+
+def bench_cache(n_questions, repeats=5):
+    import query
+
+    query.query_cache.clear()
+    for level in query.query_cache.stats():
+        cache = getattr(query.query_cache, level)
+        cache.hits = cache.misses = 0
+    questions = make_questions(n_questions, seed=23)
+    cold_ms, warm_ms = [], []
+    for q in questions:
+        start = time.perf_counter()
+        query.query_financials(q)
+        cold_ms.append((time.perf_counter() - start) * 1000)
+    for _ in range(repeats):
+        for q in questions:
+            start = time.perf_counter()
+            query.query_financials(q)
+            warm_ms.append((time.perf_counter() - start) * 1000)
+    return {
+        "cold_ms": percentiles(cold_ms),
+        "warm_ms": percentiles(warm_ms),
+        "hit_rates": {level: s["hit_rate"] for level, s in query.cache_stats().items()},
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def flatten(d, prefix=""):
+    for key, value in d.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+def compare(current, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = dict(flatten(json.load(f)["scenarios"]))
+    print(f"\n📈 Compared with {previous_path}")
+    for name, value in flatten(current["scenarios"]):
+        if name in previous and previous[name]:
+            change = (value - previous[name]) / previous[name] * 100
+            print(f"  {name:60s} {previous[name]:12.2f} -> {value:12.2f} ({change:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="simulated seconds per LLM call")
+    parser.add_argument("--vector-store", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--output-dir", default=os.path.join(ROOT_DIR, "benchmark_results"))
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    # Must be set before the pipeline modules are imported.
+    os.environ.update({
+        "VECTOR_DB_DIR": os.path.join(work_dir, "vector_db"),
+        "EMBEDDING_BACKEND": "hashing",
+        "LLM_BACKEND": "fake",
+        "VECTOR_STORE": args.vector_store,
+        "FAKE_LLM_LATENCY": str(args.llm_latency),
+        "RAG_TRACE": "1",
+        "RAG_TRACE_FILE": os.path.join(work_dir, "traces.jsonl"),
+        "RESPONSE_LOG_DIR": os.path.join(work_dir, "output"),
+        # A fresh page cache per run, so ingest always measures parsing rather than cache reads.
+        "PAGE_CACHE_DIR": os.path.join(work_dir, "pages"),
+        # The synthetic questions are single-metric lookups the facts index would answer without
+        # retrieval or the LLM; the query and cache scenarios measure the RAG path.
+        "FACTS_FAST_PATH": "0",
+    })
+
+    try:
+        reports_dir = os.path.join(work_dir, "reports")
+        total_pages = generate_synthetic_reports(reports_dir, args.reports, args.pages)
+        print(f"Generated {args.reports} synthetic reports ({total_pages} pages).")
+
+        scenarios = {}
+        scenarios["ingest"] = bench_ingest(reports_dir, total_pages)
+        print(f"Ingest: {scenarios['ingest']['pages_per_sec']:.1f} pages/sec, {scenarios['ingest']['chunks_per_sec']:.1f} chunks/sec")
+        scenarios["query"] = bench_query(args.questions)
+        print(f"Query: p50 {scenarios['query']['end_to_end_ms']['p50']:.1f} ms, p95 {scenarios['query']['end_to_end_ms']['p95']:.1f} ms; "
+              f"batch of {args.questions} in {scenarios['query']['batch']['seconds']:.2f}s")
+        scenarios["cache"] = bench_cache(min(args.questions, 20))
+        print(f"Cache: warm p50 {scenarios['cache']['warm_ms']['p50']:.3f} ms, answer hit rate {scenarios['cache']['hit_rates']['answers']:.0%}")
+
+        results = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "config": vars(args),
+            "scenarios": scenarios,
+            "peak_memory_mb": peak_memory_mb(),
+        }
+        os.makedirs(args.output_dir, exist_ok=True)
+        out_path = os.path.join(args.output_dir, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📂 Results written to: {out_path}")
+        if args.compare:
+            compare(results, args.compare)
+    finally:
+        from src.utils.response_log import get_response_log
+        get_response_log(os.environ["RESPONSE_LOG_DIR"]).close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,108 +1,162 @@
 """
 Evaluate both retrieval and generation quality.
-- Retrieval: Checks if expected keywords are present in retrieved chunks.
-- Generation: Runs query_financials() and checks if LLM response contains expected keywords.
+- Retrieval: Retrieves once per query, at the deepest k or N_RESULTS if deeper (the generation pass answers
+  from the same search), and scores every k <= max_k from that ranked list:
+  Hit@k (all expected keywords present in the top k chunks), recall@k (share of keywords present) and
+  MRR (1 / the first k at which all keywords are covered).
+- Generation: Runs query_financials_batch() concurrently and checks if the LLM response contains expected keywords.
+  Skipped with --retrieval-only, which never touches the LLM.
+- Test cases load from a JSONL (or JSON list) file of {"query": ..., "expected_keywords": [...]}.
 - Logs both results into a CSV file.
 """
 
 import os
-import warnings
+import sys
 import csv
+import json
+import time
+import argparse
+import warnings
 from datetime import datetime
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 from dotenv import load_dotenv
-from langchain_huggingface import HuggingFaceEmbeddings
-import chromadb
 
 # Import your query pipeline
-import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
-from query import query_financials
+import query
 
 # Load environment
 load_dotenv()
 VECTOR_DB_DIR = os.getenv("VECTOR_DB_DIR")
 
-# === Setup embeddings & Chroma client ===
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-client = chromadb.PersistentClient(path=VECTOR_DB_DIR)
-collection = client.get_or_create_collection("financials")
-
-
-# === Define evaluation queries with expected keywords ===
-test_queries = [
-    {
-        "query": "What was the company's revenue in 2024?",
-        "expected_keywords": ["revenue", "2024"]
-    },
-    {
-        "query": "List key financial ratios like ROE, ROA, and profit margin.",
-        "expected_keywords": ["ROE", "ROA", "profit margin"]
-    },
-    {
-        "query": "What was the efficiency ratio in the last quarter?",
-        "expected_keywords": ["efficiency ratio", "quarter"]
-    },
-    {
-        "query": "Compare revenue and net profit year-over-year.",
-        "expected_keywords": ["revenue", "net profit"]
-    },
-]
+DEFAULT_TEST_SET = os.path.join(os.path.dirname(__file__), "eval_queries.jsonl")
+RETRIEVAL_BATCH_SIZE = 128
+
+
+def load_test_set(path=DEFAULT_TEST_SET):
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            cases = json.load(f)
+        else:
+            cases = [json.loads(line) for line in f if line.strip()]
+    for i, case in enumerate(cases):
+        if not case.get("query") or not case.get("expected_keywords"):
+            raise ValueError(f"{path}: case {i} needs a 'query' and non-empty 'expected_keywords'")
+    return cases
+
+
+def retrieval_metrics(chunks, expected_keywords, max_k):
+    """Hit@k and recall@k for every k in 1..max_k, plus the reciprocal rank, from one ranked list."""
+    keywords = [kw.lower() for kw in expected_keywords]
+    covered, hits, recalls, reciprocal_rank = set(), [], [], 0.0
+    for k in range(1, max_k + 1):
+        if k <= len(chunks):
+            text = chunks[k - 1].lower()
+            covered.update(kw for kw in keywords if kw in text)
+        hit = len(covered) == len(keywords)
+        if hit and not reciprocal_rank:
+            reciprocal_rank = 1.0 / k
+        hits.append(hit)
+        recalls.append(len(covered) / len(keywords))
+    return hits, recalls, reciprocal_rank
+
+
+def retrieve_all(queries, max_k):
+    """Top max_k chunks per query, from one search deep enough for the generation pass too."""
+    depth = max(max_k, query.N_RESULTS)
+    retrieved = []
+    for start in range(0, len(queries), RETRIEVAL_BATCH_SIZE):
+        retrieved.extend(query.retrieve_batch(queries[start:start + RETRIEVAL_BATCH_SIZE], n_results=depth))
+    # The generation pass answers from the top N_RESULTS of the same ranking instead of searching again.
+    if depth <= max(query.N_RESULTS, query.HYBRID_CANDIDATES):
+        query.seed_retrievals(queries, retrieved)
+    return [{key: values[:max_k] for key, values in r.items()} for r in retrieved]
 
 
 # === Evaluation Function ===
-def evaluate_retrieval_and_generation(k: int = 3, log_to_csv: bool = True):
-    total_queries = len(test_queries)
-    retrieval_hits, generation_hits = 0, 0
+def evaluate_retrieval_and_generation(k: int = 3, log_to_csv: bool = True, test_cases=None,
+                                      retrieval_only: bool = False, max_concurrency: int = query.LLM_CONCURRENCY):
+    test_cases = test_cases if test_cases is not None else load_test_set()
+    queries = [tc["query"] for tc in test_cases]
+    total_queries = len(test_cases)
+
+    start = time.perf_counter()
+    retrieved = retrieve_all(queries, k)
+    retrieval_seconds = time.perf_counter() - start
+
+    llm_responses = [None] * total_queries
+    generation_seconds = 0.0
+    if not retrieval_only:
+        # Generation runs concurrently; answers come back in query order.
+        start = time.perf_counter()
+        llm_responses = query.query_financials_batch(queries, max_concurrency=max_concurrency)
+        generation_seconds = time.perf_counter() - start
+
+    hits_at = [0] * k
+    recall_at = [0.0] * k
+    mrr, generation_hits = 0.0, 0
     results_log = []
 
-    for tq in test_queries:
-        query = tq["query"]
-        expected_keywords = tq["expected_keywords"]
+    for tc, result, llm_response in zip(test_cases, retrieved, llm_responses):
+        expected_keywords = tc["expected_keywords"]
+        retrieved_chunks = result["documents"]
 
         # ---- Retrieval Evaluation ----
-        query_embedding = embedding_model.embed_query(query)
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=k,
-            include=["documents"]
-        )
-        retrieved_chunks = results.get("documents", [[]])[0]
-        retrieved_text = " ".join(retrieved_chunks).lower()
-
-        retrieval_found = all(kw.lower() in retrieved_text for kw in expected_keywords)
-        retrieval_status = "PASS" if retrieval_found else "FAIL"
-        if retrieval_found:
-            retrieval_hits += 1
-
-        # ---- Generation Evaluation ----
-        llm_response = query_financials(query).lower()
-        generation_found = all(kw.lower() in llm_response for kw in expected_keywords)
-        generation_status = "PASS" if generation_found else "FAIL"
-        if generation_found:
-            generation_hits += 1
-
-        # ---- Logging ----
-        results_log.append({
-            "query": query,
+        hits, recalls, reciprocal_rank = retrieval_metrics(retrieved_chunks, expected_keywords, k)
+        for i in range(k):
+            hits_at[i] += hits[i]
+            recall_at[i] += recalls[i]
+        mrr += reciprocal_rank
+        retrieval_status = "PASS" if hits[-1] else "FAIL"
+
+        row = {
+            "query": tc["query"],
             "expected_keywords": ", ".join(expected_keywords),
             "retrieved_preview": retrieved_chunks[0][:120] if retrieved_chunks else "None",
             "retrieval_status": retrieval_status,
-            "llm_response_preview": llm_response[:120] + ("..." if len(llm_response) > 120 else ""),
-            "generation_status": generation_status
-        })
+            f"recall@{k}": round(recalls[-1], 3),
+            "reciprocal_rank": round(reciprocal_rank, 3),
+        }
 
-        print(f"\n🔎 Query: {query}")
-        print(f" Retrieval -> {retrieval_status}")
-        print(f" Generation -> {generation_status}")
+        # ---- Generation Evaluation ----
+        if llm_response is not None:
+            llm_response = llm_response.lower()
+            generation_found = all(kw.lower() in llm_response for kw in expected_keywords)
+            generation_status = "PASS" if generation_found else "FAIL"
+            if generation_found:
+                generation_hits += 1
+            row["llm_response_preview"] = llm_response[:120] + ("..." if len(llm_response) > 120 else "")
+            row["generation_status"] = generation_status
+
+        results_log.append(row)
+
+        if total_queries <= 20:
+            print(f"\n🔎 Query: {tc['query']}")
+            print(f" Retrieval -> {retrieval_status}")
+            if llm_response is not None:
+                print(f" Generation -> {row['generation_status']}")
 
     # ---- Final Summary ----
+    summary = {
+        "queries": total_queries,
+        "hit_rate": {i + 1: hits_at[i] / total_queries for i in range(k)},
+        "recall": {i + 1: recall_at[i] / total_queries for i in range(k)},
+        "mrr": mrr / total_queries,
+        "generation_hit_rate": None if retrieval_only else generation_hits / total_queries,
+        "retrieval_seconds": retrieval_seconds,
+        "generation_seconds": generation_seconds,
+    }
     print("\n📊 Evaluation Summary")
     print("=" * 40)
-    print(f"Retrieval Hit Rate@{k}: {retrieval_hits / total_queries:.2f}")
-    print(f"Generation Hit Rate: {generation_hits / total_queries:.2f}")
+    for i in range(1, k + 1):
+        print(f"k={i:<3d} Hit Rate: {summary['hit_rate'][i]:.2f}  Recall: {summary['recall'][i]:.2f}")
+    print(f"MRR@{k}: {summary['mrr']:.3f}")
+    if not retrieval_only:
+        print(f"Generation Hit Rate: {summary['generation_hit_rate']:.2f}")
+    print(f"Retrieval: {retrieval_seconds:.2f}s" + ("" if retrieval_only else f", generation: {generation_seconds:.2f}s"))
     print("=" * 40)
 
     # ---- Save Results to CSV ----
@@ -112,15 +166,23 @@ def evaluate_retrieval_and_generation(k: int = 3, log_to_csv: bool = True):
         csv_path = os.path.join("evaluation_logs", f"rag_eval_{timestamp}.csv")
 
         with open(csv_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(
-                f,
-                fieldnames=["query", "expected_keywords", "retrieved_preview", "retrieval_status", "llm_response_preview", "generation_status"]
-            )
+            writer = csv.DictWriter(f, fieldnames=list(results_log[0].keys()) if results_log else ["query"])
             writer.writeheader()
             writer.writerows(results_log)
 
         print(f"\n📂 Results logged to: {csv_path}")
 
+    return summary
+
 
 if __name__ == "__main__":
-    evaluate_retrieval_and_generation(k=3, log_to_csv=True)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3, help="deepest k to score; every smaller k is reported too")
+    parser.add_argument("--test-set", default=DEFAULT_TEST_SET, help="JSONL or JSON file of test cases")
+    parser.add_argument("--retrieval-only", action="store_true", help="score retrieval without calling the LLM")
+    parser.add_argument("--concurrency", type=int, default=query.LLM_CONCURRENCY, help="concurrent LLM calls")
+    parser.add_argument("--no-csv", action="store_true")
+    args = parser.parse_args()
+
+    evaluate_retrieval_and_generation(k=args.k, log_to_csv=not args.no_csv, test_cases=load_test_set(args.test_set),
+                                      retrieval_only=args.retrieval_only, max_concurrency=args.concurrency)
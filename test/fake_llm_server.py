@@ -0,0 +1,121 @@
+"""
+Local stand-in for the Groq chat completions API (OpenAI-compatible), for testing the LLM gateway offline.
+- POST /openai/v1/chat/completions, plain or streamed (SSE); answers come from the fake chat model.
+- Injects faults: --rate-429 / --rate-5xx error shares, an --rpm quota enforced with 429 + Retry-After,
+  and a slow tail (--slow-share of requests take --slow-latency instead of --latency).
+- Point the app at it with GROQ_API_BASE=http://127.0.0.1:<port> GROQ_API_KEY=fake.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import deque
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT_DIR)
+
+from src.utils.fakes import FakeChatModel
+
+
+class FakeGroqServer:
+    def __init__(self, latency=0.05, slow_share=0.0, slow_latency=2.0, rate_429=0.0, rate_5xx=0.0, rpm=0, seed=None):
+        self.latency = latency
+        self.slow_share = slow_share
+        self.slow_latency = slow_latency
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.rpm = rpm
+        self.rng = random.Random(seed)
+        self.model = FakeChatModel()
+        self.window = deque()
+        self.counts = {"requests": 0, "ok": 0, "429": 0, "5xx": 0}
+
+    def _over_quota(self):
+        now = time.monotonic()
+        while self.window and now - self.window[0] > 60:
+            self.window.popleft()
+        if self.rpm and len(self.window) >= self.rpm:
+            return 60 - (now - self.window[0])
+        self.window.append(now)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        if scope["path"] == "/stats":
+            await self._send(send, 200, self.counts)
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        request = json.loads(body or b"{}")
+        self.counts["requests"] += 1
+
+        wait = self._over_quota()
+        if wait is not None or self.rng.random() < self.rate_429:
+            self.counts["429"] += 1
+            retry_after = f"{max(wait or 0.2, 0.05):.2f}".encode()
+            await self._send(send, 429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                             [(b"retry-after", retry_after)])
+            return
+        if self.rng.random() < self.rate_5xx:
+            self.counts["5xx"] += 1
+            await self._send(send, 503, {"error": {"message": "Service unavailable", "type": "internal_server_error"}})
+            return
+
+        await asyncio.sleep(self.slow_latency if self.rng.random() < self.slow_share else self.latency)
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+        answer = self.model._answer(prompt)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(answer.split()),
+                 "total_tokens": len(prompt) // 4 + len(answer.split())}
+        self.counts["ok"] += 1
+        base = {"id": f"chatcmpl-{self.counts['requests']}", "created": int(time.time()), "model": request.get("model", "fake")}
+        if request.get("stream"):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+            words = answer.split(" ")
+            for i, word in enumerate(words):
+                chunk = {**base, "object": "chat.completion.chunk", "choices": [
+                    {"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}, "finish_reason": None}]}
+                await send({"type": "http.response.body", "body": f"data: {json.dumps(chunk)}\n\n".encode(), "more_body": True})
+            last = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                    "x_groq": {"usage": usage}}
+            await send({"type": "http.response.body", "body": f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode()})
+            return
+        await self._send(send, 200, {**base, "object": "chat.completion", "usage": usage, "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}]})
+
+    @staticmethod
+    async def _send(send, status, payload, headers=()):
+        body = json.dumps(payload).encode()
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--slow-share", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = FakeGroqServer(args.latency, args.slow_share, args.slow_latency, args.rate_429, args.rate_5xx, args.rpm, args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Load test for the LLM gateway (src/utils/llm_gateway.py) against the local fake Groq server.
+- Each scenario starts test/fake_llm_server.py with its own faults and drives ChatGroq through an LLMGateway:
+  faults    -- 20% 429s and 10% 503s; every request must still succeed through retries.
+  quota     -- the gateway's token bucket spaces requests to the server's RPM quota, so the server never returns 429.
+  tail      -- 5% of responses are slow; p99 with and without hedged requests.
+  deadline  -- the model is slower than the deadline; calls fail fast with LLMDeadlineExceeded.
+  stream    -- a streamed answer through the gateway.
+- Reports latency percentiles, queue vs model time and the gateway's counters.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+sys.path.append(os.path.dirname(__file__))
+from benchmark_suite import ROOT_DIR, percentiles
+
+from src.utils.llm_gateway import LLMGateway, LLMDeadlineExceeded
+from src.utils.tracing import tracer
+
+PROMPT = "Context:\nRevenue for 2024 was PKR 23,101 million.\n\nQuestion:\nWhat was the revenue in 2024?\n\nAnswer:\n"
+
+
+def start_fake_server(port, *args):
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "test", "fake_llm_server.py"), "--port", str(port),
+                                "--seed", "7", *map(str, args)], cwd=ROOT_DIR)
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=0.5)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit("fake LLM server did not start")
+
+
+def make_gateway(port, **options):
+    from langchain_groq import ChatGroq
+
+    model = ChatGroq(model_name="fake-groq", groq_api_base=f"http://127.0.0.1:{port}", api_key="fake", max_retries=0)
+    return LLMGateway(model, **options)
+
+
+async def drive(gateway, n_requests, concurrency):
+    latencies, errors = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await gateway.ainvoke(PROMPT)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    await asyncio.gather(*(one() for _ in range(n_requests)))
+    return latencies, errors
+
+
+async def run_scenario(name, port, server_args, gateway_options, n_requests, concurrency):
+    server = start_fake_server(port, *server_args)
+    try:
+        tracer.reset()
+        gateway = make_gateway(port, **gateway_options)
+        start = time.perf_counter()
+        latencies, errors = await drive(gateway, n_requests, concurrency)
+        elapsed = time.perf_counter() - start
+        server_counts = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+    finally:
+        server.terminate()
+        server.wait()
+    stages = tracer.stats()
+    result = {
+        "seconds": elapsed,
+        "ok": len(latencies),
+        "errors": errors,
+        "latency_ms": percentiles(latencies) if latencies else None,
+        "queue_p50_ms": stages.get("llm.queue", {}).get("p50"),
+        "model_p50_ms": stages.get("llm.model", {}).get("p50"),
+        "gateway": gateway.stats(),
+        "server": server_counts,
+    }
+    latency = result["latency_ms"]
+    print(f"\n=== {name} === {result['ok']}/{n_requests} ok in {elapsed:.1f}s"
+          + (f", p50 {latency['p50']:.0f} ms, p95 {latency['p95']:.0f} ms, p99 {latency['p99']:.0f} ms" if latency else ""))
+    print(f"queue p50 {result['queue_p50_ms'] or 0:.1f} ms, model p50 {result['model_p50_ms'] or 0:.1f} ms")
+    print(f"gateway: {result['gateway']}")
+    print(f"server:  {server_counts}")
+    return result
+
+
+async def run_all(n, c, port):
+    faults = await run_scenario("faults", port, ["--rate-429", 0.2, "--rate-5xx", 0.1], {"deadline_s": 30, "max_retries": 6}, n, c)
+    assert faults["ok"] == n, "every request should succeed through retries"
+
+    quota = await run_scenario("quota", port, ["--rpm", 120], {"rpm": 120, "deadline_s": 60}, n, c)
+    assert quota["server"]["429"] == 0, "the token bucket should keep the gateway under the server's quota"
+
+    # More requests here so the p99 is not just the single slowest call.
+    tail_args = ["--slow-share", 0.05, "--slow-latency", 1.5]
+    plain = await run_scenario("tail (no hedging)", port, tail_args, {}, 5 * n, c)
+    hedged = await run_scenario("tail (hedge after 200 ms)", port, tail_args, {"hedge_after_s": 0.2}, 5 * n, c)
+    print(f"\np99 {plain['latency_ms']['p99']:.0f} ms -> {hedged['latency_ms']['p99']:.0f} ms with hedging")
+
+    deadline = await run_scenario("deadline", port, ["--latency", 2.0], {"deadline_s": 0.5}, 4, 4)
+    assert deadline["errors"] == [LLMDeadlineExceeded.__name__] * 4 and deadline["seconds"] < 1.5
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8091)
+    args = parser.parse_args()
+    n, c, port = args.requests, args.concurrency, args.port
+
+    asyncio.run(run_all(n, c, port))
+
+    server = start_fake_server(port)
+    try:
+        answer = "".join(chunk.content for chunk in make_gateway(port).stream(PROMPT))
+        print(f"\n=== stream === {answer!r}")
+        assert "23,101" in answer
+    finally:
+        server.terminate()
+        server.wait()
+    print("\nLLM gateway load test PASSED.")
+
+
+if __name__ == "__main__":
+    main()
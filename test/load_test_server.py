@@ -0,0 +1,133 @@
+"""
+Local load test for the HTTP query service (src/server.py).
+- Starts the server in a subprocess with hashing embeddings and the fake chat model, so no API key is needed.
+- Ingests synthetic reports through POST /ingest and waits for the job.
+- Fires --requests questions at --concurrency, a share of them duplicates, and reports latency
+  percentiles, status codes (429 = backpressure) and the server's batching/coalescing counters.
+- Pass --url to load-test an already running server instead.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import shutil
+import subprocess
+
+import httpx
+
+sys.path.append(os.path.dirname(__file__))
+from benchmark_suite import ROOT_DIR, generate_synthetic_reports, make_questions, percentiles
+
+
+def start_server(work_dir, port, llm_latency, max_queue):
+    env = dict(os.environ)
+    env.update({
+        "VECTOR_DB_DIR": os.path.join(work_dir, "vector_db"),
+        "EMBEDDING_BACKEND": "hashing",
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(llm_latency),
+        "RESPONSE_LOG_DIR": os.path.join(work_dir, "output"),
+        "PAGE_CACHE_DIR": os.path.join(work_dir, "pages"),
+        "SERVER_REPORTS_DIR": os.path.join(work_dir, "reports"),
+        "SERVER_PORT": str(port),
+        "SERVER_MAX_QUEUE": str(max_queue),
+    })
+    return subprocess.Popen([sys.executable, os.path.join(ROOT_DIR, "src", "server.py")], env=env, cwd=ROOT_DIR)
+
+
+async def wait_until_up(client, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+async def ingest(client):
+    # The spawned server reads reports from its SERVER_REPORTS_DIR, the generated folder.
+    job = (await client.post("/ingest", json={})).json()["job"]
+    while True:
+        snap = (await client.get(f"/jobs/{job}")).json()
+        if snap["status"] in ("done", "failed"):
+            return snap
+        await asyncio.sleep(0.5)
+
+
+async def fire(client, questions, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(question):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/query", json={"question": question})
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    return time.perf_counter() - start, latencies, statuses
+
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=120) as client:
+        await wait_until_up(client)
+        if args.reports_dir:
+            snap = await ingest(client)
+            print(f"Ingested: {snap['status']} {snap['result'] or snap['error']}")
+
+        rng = random.Random(5)
+        unique = make_questions(args.requests)
+        # A share of requests repeat an earlier question, as analysts asking the same thing would.
+        questions = [rng.choice(unique[:max(1, i)]) if rng.random() < args.duplicates else q for i, q in enumerate(unique)]
+        seconds, latencies, statuses = await fire(client, questions, args.concurrency)
+        stats = (await client.get("/stats")).json()
+
+    latency = percentiles(latencies)
+    print(f"\n{args.requests} requests at concurrency {args.concurrency} in {seconds:.2f}s ({args.requests / seconds:.1f} req/s)")
+    print(f"Latency ms: p50 {latency['p50']:.1f}, p95 {latency['p95']:.1f}, p99 {latency['p99']:.1f}, max {latency['max']:.1f}")
+    print(f"Status codes: {statuses}")
+    print(f"Server: {stats['server']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="existing server to test; by default one is started with fake backends")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="share of requests repeating an earlier question")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="simulated seconds per LLM call")
+    parser.add_argument("--max-queue", type=int, default=16, help="SERVER_MAX_QUEUE for the spawned server")
+    parser.add_argument("--reports", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=10)
+    args = parser.parse_args()
+
+    args.reports_dir = None
+    if args.url:
+        asyncio.run(run(args))
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="rag_load_")
+    server = start_server(work_dir, args.port, args.llm_latency, args.max_queue)
+    try:
+        args.url = f"http://127.0.0.1:{args.port}"
+        args.reports_dir = os.path.join(work_dir, "reports")
+        generate_synthetic_reports(args.reports_dir, args.reports, args.pages)
+        asyncio.run(run(args))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
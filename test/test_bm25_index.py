@@ -0,0 +1,88 @@
+"""
+Unit tests for the BM25 keyword index and reciprocal rank fusion (src/utils/bm25_index.py).
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.bm25_index import BM25Index, tokenize, reciprocal_rank_fusion
+
+DOCS = {
+    "revenue": "Revenue for 2024 was PKR 23,101 million, up 12.5% on 2023.",
+    "profit": "Net profit after tax rose to PKR 11,237 million in 2024.",
+    "deposits": "Customer deposits grew on the back of current accounts.",
+    "ratio": "The cost to income ratio improved; revenue growth outpaced costs.",
+}
+
+def filled_index(path=None):
+    index = BM25Index(path)
+    index.add(list(DOCS), list(DOCS.values()))
+    index.commit()
+    return index
+
+def test_tokenize_keeps_figures_whole():
+    assert tokenize("Revenue: PKR 23,101 million (12.5%) in FY2024") == \
+        ["revenue", "pkr", "23,101", "million", "12.5", "in", "fy2024"]
+
+def test_search_ranks_matching_documents():
+    index = filled_index()
+    assert len(index) == 4
+    results = index.search("net profit 2024", k=3)
+    assert results[0][0] == "profit"
+    assert all(score > 0 for _, score in results)
+    assert [id_ for id_, _ in index.search("23,101")] == ["revenue"]
+    assert index.search("dividend") == []
+
+def test_search_is_limited_to_k_best_first():
+    index = filled_index()
+    results = index.search("revenue", k=1)
+    assert len(results) == 1
+    both = index.search("revenue", k=10)
+    assert {id_ for id_, _ in both} == {"revenue", "ratio"}
+    assert both[0][1] >= both[1][1]
+
+def test_changes_apply_on_commit():
+    index = filled_index()
+    index.delete(["profit"])
+    index.add(["dividend"], ["An interim dividend of PKR 3 per share was declared."])
+    # Searches run against the last committed snapshot until the next commit.
+    assert index.search("dividend") == []
+    assert index.search("profit")[0][0] == "profit"
+    index.commit()
+    assert index.search("dividend")[0][0] == "dividend"
+    assert index.search("profit") == []
+    assert sorted(index.ids()) == ["deposits", "dividend", "ratio", "revenue"]
+
+def test_re_adding_a_document_replaces_its_text():
+    index = filled_index()
+    index.add(["deposits"], ["Deposits fell as term deposits matured."])
+    index.commit()
+    assert len(index) == 4
+    assert index.search("current accounts") == []
+    assert index.search("matured")[0][0] == "deposits"
+
+def test_save_and_reload(tmp_path):
+    path = str(tmp_path / "bm25_index.npz")
+    index = filled_index(path)
+    index.save()
+    reopened = BM25Index(path)
+    assert reopened.search("net profit 2024") == index.search("net profit 2024")
+
+    index.add(["dividend"], ["An interim dividend was declared."])
+    index.save()
+    os.utime(path, ns=(0, 0))
+    reopened.reload_if_changed()
+    assert reopened.search("dividend")[0][0] == "dividend"
+
+def test_rrf_rewards_agreement_between_rankings():
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "a"]]) == ["b", "a", "d", "c"]
+    # An id ranked first by one list only loses to one both lists rank highly.
+    assert reciprocal_rank_fusion([["x", "b"], ["b", "y"]])[0] == "b"
+
+def test_rrf_limit_and_empty_rankings():
+    assert reciprocal_rank_fusion([["a", "b", "c"]], limit=2) == ["a", "b"]
+    assert reciprocal_rank_fusion([[], ["a"]]) == ["a"]
+    assert reciprocal_rank_fusion([]) == []
@@ -0,0 +1,74 @@
+"""
+Unit tests for the retrieved-context assembler (src/utils/context.py).
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.context import assemble_context, normalize_text, shingles, jaccard
+
+PAGE = ("Revenue for 2024 was PKR 23,101 million compared with PKR 20,512 million in 2023. "
+        "Net profit after tax rose to PKR 11,237 million on higher corporate lending. "
+        "Customer deposits grew by 9% as current accounts increased.")
+
+def meta(start=None, page=3, source="report.pdf", **extra):
+    return {"source": source, "page": page, **({"start_index": start} if start is not None else {}), **extra}
+
+def test_text_helpers():
+    assert normalize_text("  Net   Profit\n2024 ") == "net profit 2024"
+    assert shingles("one two three") == {"one two three"}
+    assert len(shingles("a b c d e f g")) == 3
+    assert jaccard({"a", "b"}, {"b", "c"}) == 1 / 3
+    assert jaccard(set(), {"a"}) == 0.0
+
+def test_overlapping_chunks_of_one_page_are_merged_by_offset():
+    first, second = PAGE[:120], PAGE[80:]
+    blocks, stats = assemble_context([first, second], [meta(0), meta(80)])
+    assert blocks == [PAGE]
+    assert stats["chunks_in"] == 2 and stats["blocks_out"] == 1
+    assert stats["tokens_saved"] > 0
+
+def test_overlap_is_found_in_the_text_without_offsets():
+    first, second = PAGE[:120], PAGE[80:]
+    blocks, _ = assemble_context([second, first], [meta(), meta()])
+    assert blocks == [PAGE]
+
+def test_a_chunk_bridging_two_blocks_joins_them_in_any_order():
+    a, b, c = PAGE[:80], PAGE[50:170], PAGE[140:]
+    blocks, stats = assemble_context([a, c, b], [meta(0), meta(140), meta(50)])
+    assert blocks == [PAGE] and stats["blocks_out"] == 1
+    blocks, _ = assemble_context([a, c, b], [meta(), meta(), meta()])
+    assert blocks == [PAGE]
+
+def test_chunks_of_other_pages_or_table_parts_stay_apart():
+    first, second = PAGE[:120], PAGE[80:]
+    blocks, _ = assemble_context([first, second], [meta(0), meta(80, page=4)])
+    assert blocks == [first, second]
+    rows = ["Revenue | 2024: 23,101 | 2023: 20,512", "Net profit | 2024: 11,237 | 2023: 9,804"]
+    tables = [meta(0, content_type="table", table_index=0, rows="0-0"), meta(0, content_type="table", table_index=0, rows="1-1")]
+    blocks, _ = assemble_context(rows, tables)
+    assert blocks == rows
+
+def test_duplicates_are_dropped_and_the_best_rank_kept():
+    near = PAGE + " All figures audited."
+    blocks, stats = assemble_context([PAGE, PAGE.upper(), near, "Dividend of PKR 3 per share."],
+                                     [meta(source="a.pdf"), meta(source="b.pdf"), meta(source="c.pdf"), meta(source="d.pdf")])
+    assert blocks == [PAGE, "Dividend of PKR 3 per share."]
+    assert stats["blocks_out"] == 2
+
+def test_blocks_are_packed_best_first_within_the_budget():
+    chunks = [f"Chunk {i}: " + " ".join(f"word{i}_{j}" for j in range(40)) for i in range(5)]
+    blocks, stats = assemble_context(chunks, [meta(source=f"{i}.pdf") for i in range(5)], token_budget=250)
+    assert blocks == chunks[:len(blocks)] and 0 < len(blocks) < 5
+    assert stats["tokens_out"] <= 250
+    # A single block larger than the budget is truncated rather than dropped.
+    blocks, stats = assemble_context([chunks[0]], token_budget=10)
+    assert len(blocks) == 1 and chunks[0].startswith(blocks[0]) and stats["tokens_out"] <= 10
+
+def test_empty_chunks_are_ignored():
+    blocks, stats = assemble_context(["", "   ", PAGE], [None, None, meta()])
+    assert blocks == [PAGE]
+    assert assemble_context([]) == ([], {"chunks_in": 0, "blocks_out": 0, "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0})
@@ -0,0 +1,82 @@
+"""
+Unit tests for follow-up handling in chat sessions (src/utils/conversation.py) and its use in src/query.py.
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.conversation import ConversationSession
+from src.utils.query_cache import bump_collection_version
+
+REVENUE = [1.0, 0.0, 0.0]
+REVENUE_AGAIN = [0.99, 0.05, 0.0]
+RELATED = [0.8, 0.6, 0.0]
+UNRELATED = [0.0, 0.0, 1.0]
+
+def retrieved(*ids):
+    return {"ids": list(ids), "documents": [f"text of {id_}" for id_ in ids], "metadatas": [{"page": 1} for _ in ids]}
+
+def session_with_context(version=(0, 0)):
+    session = ConversationSession(max_chunks=3)
+    session.use_context("replace", "What was the revenue in 2024?", REVENUE, retrieved("a", "b"), None, version)
+    session.add_turn("What was the revenue in 2024?", "What was the revenue in 2024?", "PKR 23,101 million.", ["a", "b"], REVENUE)
+    return session
+
+def test_short_follow_ups_are_rewritten_from_the_previous_turn():
+    session = session_with_context()
+    assert session.standalone("and 2023?") == "What was the revenue in 2023?"
+    assert session.standalone("what about its growth?") == "What was the revenue in 2024? what about its growth?"
+    assert session.standalone("What were total deposits of the bank at the end of 2024?") == \
+        "What were total deposits of the bank at the end of 2024?"
+
+def test_plan_follows_similarity_figures_filters_and_version():
+    session = session_with_context(version=(0, 0))
+    assert session.plan("What was the revenue in 2024?", REVENUE_AGAIN, None, (0, 0)) == "reuse"
+    # A new year is a new figure: the cached chunks may not hold it.
+    assert session.plan("What was the revenue in 2023?", REVENUE_AGAIN, None, (0, 0)) == "extend"
+    assert session.plan("How did revenue compare with costs?", RELATED, None, (0, 0)) == "extend"
+    assert session.plan("Who is the chairman?", UNRELATED, None, (0, 0)) == "replace"
+    assert session.plan("What was the revenue in 2024?", REVENUE_AGAIN, {"company": "Other"}, (0, 0)) == "replace"
+    assert session.plan("What was the revenue in 2024?", REVENUE_AGAIN, None, (1, 0)) == "replace"
+
+def test_extend_puts_new_chunks_first_and_stays_bounded():
+    session = session_with_context()
+    merged = session.use_context("extend", "How did revenue compare with costs?", RELATED, retrieved("c", "a", "d"))
+    assert merged["ids"] == ["c", "a", "d"]
+    merged = session.use_context("extend", "And costs in 2023?", RELATED, retrieved("e"))
+    assert merged["ids"] == ["e", "c", "a"]
+    assert session.plans == {"reuse": 0, "extend": 2, "replace": 1}
+
+def test_turns_keep_chunk_ids_and_embeddings_within_the_history_budget():
+    session = ConversationSession(max_turns=2, history_tokens=80)
+    for i in range(3):
+        session.add_turn(f"q{i}", f"question {i}", "answer " * 30, [f"chunk{i}"], [float(i), 1.0, 0.0])
+    assert [turn["chunk_ids"] for turn in session.turns] == [["chunk1"], ["chunk2"]]
+    assert session.turns[-1]["embedding"] == [2.0, 1.0, 0.0]
+    history = session.history()
+    assert "question 2" in history and "question 1" not in history and "question 0" not in history
+    session.clear()
+    assert not session.turns and session.context is None and session.context_version is None
+
+def test_query_passes_chunk_ids_and_drops_context_after_an_ingest(monkeypatch):
+    from src import query
+
+    monkeypatch.delenv("VECTOR_DB_DIR", raising=False)
+    searches = []
+    monkeypatch.setattr(query, "embed_query", lambda text: REVENUE)
+    monkeypatch.setattr(query, "retrieve", lambda text, filters=None: searches.append(text) or retrieved("a", "b"))
+    monkeypatch.setattr(query, "fact_answer", lambda text, filters=None: None)
+    monkeypatch.setattr(query, "_answer", lambda text, found, history=None: f"answer from {found['ids']}")
+
+    session = ConversationSession()
+    query.query_financials("What was the revenue in 2024?", session=session)
+    query.query_financials("What was the revenue in 2024 again?", session=session)
+    assert len(searches) == 1 and session.plans["reuse"] == 1
+    assert session.turns[-1]["chunk_ids"] == ["a", "b"] and session.turns[-1]["embedding"] == REVENUE
+
+    bump_collection_version()
+    query.query_financials("What was the revenue in 2024 again?", session=session)
+    assert len(searches) == 2 and session.plans["replace"] == 2
@@ -0,0 +1,83 @@
+"""
+Unit tests for ingest-time boilerplate stripping and chunk deduplication (src/utils/dedup.py).
+"""
+
+import os
+import sys
+
+from langchain_core.documents import Document
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.dedup import Deduplicator
+
+DISCLAIMER = "This report contains forward-looking statements that involve risks and uncertainties."
+
+def page(source, number, body, content_type=None):
+    text = "\n".join([f"{source} Annual Report 2024", body, DISCLAIMER, f"Page {number}"])
+    metadata = {"source": source, "page": number}
+    if content_type:
+        metadata["content_type"] = content_type
+    return Document(page_content=text, metadata=metadata)
+
+def report(source, n_pages):
+    return [page(source, i + 1, f"Revenue in segment {i} grew by {i + 3}% on higher corporate lending volumes.") for i in range(n_pages)]
+
+def chunk(source, text):
+    return Document(page_content=text, metadata={"source": source})
+
+def test_repeated_headers_footers_and_disclaimers_are_stripped():
+    dedup = Deduplicator(sample_pages=50)
+    stripped = list(dedup.strip_boilerplate(report("a.pdf", 6)))
+    assert len(stripped) == 6
+    for i, doc in enumerate(stripped):
+        assert doc.page_content == f"Revenue in segment {i} grew by {i + 3}% on higher corporate lending volumes."
+    assert dedup.summary()["boilerplate_lines"] == 18
+    assert dedup.summary()["pages"] == 6
+
+def test_short_reports_and_table_rows_are_left_alone():
+    dedup = Deduplicator()
+    short = report("a.pdf", 2)
+    table = Document(page_content="a.pdf Annual Report 2024\nRevenue | 2024: 23,101", metadata={"source": "b.pdf", "content_type": "table"})
+    out = list(dedup.strip_boilerplate(short + report("b.pdf", 4) + [table]))
+    assert [doc.page_content for doc in out[:2]] == [doc.page_content for doc in short]
+    assert out[-1] is table
+
+def test_pages_after_the_sample_stream_through():
+    dedup = Deduplicator(sample_pages=3)
+    consumed = []
+
+    def pages():
+        for doc in report("a.pdf", 10):
+            consumed.append(doc)
+            yield doc
+
+    stripped = dedup.strip_boilerplate(pages())
+    first = next(stripped)
+    # Only the sample was read before the first page came out.
+    assert len(consumed) == 3
+    assert DISCLAIMER not in first.page_content
+    rest = list(stripped)
+    assert len(consumed) == 10 and len(rest) == 9
+    assert all(DISCLAIMER not in doc.page_content and "Page" not in doc.page_content for doc in rest)
+
+def test_exact_and_near_duplicates_are_dropped_within_a_report():
+    dedup = Deduplicator()
+    text = " ".join(f"word{i}" for i in range(200))
+    near = text.replace("word100 ", "wordX ")
+    chunks = [chunk("a.pdf", text), chunk("a.pdf", "  " + text.upper()), chunk("a.pdf", near),
+              chunk("a.pdf", "Net profit rose to PKR 11,237 million."), chunk("b.pdf", text)]
+    kept = list(dedup.unique_chunks(chunks))
+    # The same text in another report is kept, so deleting one report never loses the other's copy.
+    assert [doc.metadata["source"] for doc in kept] == ["a.pdf", "a.pdf", "b.pdf"]
+    summary = dedup.summary()
+    assert summary["exact_duplicates"] == 1 and summary["near_duplicates"] == 1
+    assert summary["chunks_in"] == 5 and summary["chunks_out"] == 3
+
+def test_disabled_deduplicator_passes_everything_through():
+    dedup = Deduplicator(enabled=False)
+    pages = report("a.pdf", 5)
+    assert list(dedup.strip_boilerplate(pages)) == pages
+    chunks = [chunk("a.pdf", "same"), chunk("a.pdf", "same")]
+    assert list(dedup.unique_chunks(chunks)) == chunks
@@ -0,0 +1,129 @@
+"""
+Unit tests for the on-disk embedding cache (src/utils/embedding_cache.py).
+"""
+
+import os
+import sys
+import multiprocessing
+
+import numpy as np
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+MODEL = "test-model"
+
+def _vectors(start, n, dim=4):
+    return np.arange(start, start + n * dim, dtype=np.float32).reshape(n, dim)
+
+class CountingModel:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return [0.0, 1.0, float(len(text))]
+
+def test_put_and_get_survive_a_reopen(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL)
+    keys = [cache.key(f"chunk {i}") for i in range(3)]
+    cache.put_many(keys, _vectors(0, 3))
+    assert np.array_equal(cache.get_many(keys[:1])[0], _vectors(0, 1)[0])
+    cache.flush()
+
+    reopened = EmbeddingCache(str(tmp_path), MODEL)
+    found = reopened.get_many(keys + [reopened.key("unseen")])
+    assert np.array_equal(np.stack(found[:3]), _vectors(0, 3))
+    assert found[3] is None
+    assert reopened.stats()["hits"] == 3 and reopened.stats()["misses"] == 1
+
+def test_writers_sharing_a_directory_never_reuse_rows(tmp_path):
+    first = EmbeddingCache(str(tmp_path), MODEL)
+    second = EmbeddingCache(str(tmp_path), MODEL)
+    first_keys = [first.key(f"first {i}") for i in range(5)]
+    second_keys = [second.key(f"second {i}") for i in range(5)]
+    first.put_many(first_keys, _vectors(0, 5))
+    second.put_many(second_keys, _vectors(100, 5))
+    first.flush()
+    second.flush()
+
+    merged = EmbeddingCache(str(tmp_path), MODEL)
+    assert np.array_equal(np.stack(merged.get_many(first_keys)), _vectors(0, 5))
+    assert np.array_equal(np.stack(merged.get_many(second_keys)), _vectors(100, 5))
+    # The first writer sees the second one's vectors on its next lookup.
+    assert np.array_equal(np.stack(first.get_many(second_keys)), _vectors(100, 5))
+
+def _write_from_process(cache_dir, worker):
+    cache = EmbeddingCache(cache_dir, MODEL)
+    for batch in range(4):
+        start = worker * 1000 + batch * 10
+        cache.put_many([cache.key(f"{worker}-{start + i}") for i in range(10)], _vectors(start * 4, 10))
+        cache.flush()
+
+def test_concurrent_processes_keep_every_vector(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_write_from_process, args=(str(tmp_path), worker)) for worker in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    cache = EmbeddingCache(str(tmp_path), MODEL)
+    assert cache.stats()["entries"] == 160
+    for worker in range(4):
+        start = worker * 1000
+        found = cache.get_many([cache.key(f"{worker}-{start + i}") for i in range(40)])
+        assert np.array_equal(np.stack(found), _vectors(start * 4, 40))
+
+def test_least_recently_used_rows_are_overwritten(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), MODEL, max_entries=4)
+    old = [cache.key(f"old {i}") for i in range(4)]
+    cache.put_many(old, _vectors(0, 4))
+    cache.flush()
+    cache.get_many(old[:2])
+    cache.put_many([cache.key("new 0"), cache.key("new 1")], _vectors(50, 2))
+    cache.flush()
+
+    found = cache.get_many(old)
+    assert found[0] is not None and found[1] is not None
+    assert found[2] is None and found[3] is None
+    assert cache.stats()["entries"] == 4
+
+def test_cached_embeddings_embed_each_text_once(tmp_path):
+    model = CountingModel()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(str(tmp_path), MODEL))
+    first = embeddings.embed_documents(["revenue", "profit", "revenue"])
+    again = embeddings.embed_documents(["profit", "revenue"])
+    assert model.embedded == ["revenue", "profit"]
+    assert first[0] == first[2] == again[1]
+    # Queries are keyed apart from documents with the same text.
+    embeddings.embed_query("revenue")
+    assert model.embedded == ["revenue", "profit", "revenue"]
+
+def test_rows_reused_behind_a_stale_index_are_misses(tmp_path):
+    reader = EmbeddingCache(str(tmp_path), MODEL, max_entries=4)
+    old = [reader.key(f"old {i}") for i in range(4)]
+    reader.put_many(old, _vectors(0, 4))
+    reader.flush()
+
+    writer = EmbeddingCache(str(tmp_path), MODEL, max_entries=4)
+    writer.get_many(old[1:])
+    writer.put_many([writer.key("new")], _vectors(50, 1))
+    writer.flush()
+    # The reader misses the index rewrite (a coarse mtime, or a lookup racing the flush).
+    reader._index_mtime = os.stat(reader._index_path).st_mtime_ns
+
+    found = reader.get_many(old)
+    assert found[0] is None
+    assert np.array_equal(np.stack(found[1:]), _vectors(4, 3))
+    # Stored again, the vector gets a row of its own.
+    reader.put_many(old[:1], _vectors(0, 1))
+    reader.flush()
+    assert np.array_equal(EmbeddingCache(str(tmp_path), MODEL, max_entries=4).get_many(old[:1])[0], _vectors(0, 1)[0])
@@ -0,0 +1,83 @@
+"""
+Unit tests for the financial-facts extractor and the LLM-free answer path (src/utils/facts.py).
+"""
+
+import os
+import sys
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.facts import FactsIndex, extract_facts, answer_from_facts
+from src.utils.file_loader import iter_pdf_pages
+
+REPORT = os.path.join(ROOT_DIR, "data", "reports", "Standard Chartered Bank.pdf")
+META = {"source": "report.pdf", "page": 0, "company": "Example Bank", "fiscal_year": 2024}
+
+def shipped_report_index():
+    index = FactsIndex()
+    facts = []
+    for page in iter_pdf_pages([REPORT], max_workers=1, cache_dir=None):
+        page.metadata["company"] = "Standard Chartered Bank"
+        facts.extend(extract_facts(page.page_content, page.metadata))
+    index.replace_report(os.path.basename(REPORT), facts)
+    return index
+
+def test_bare_metric_lookup_is_answered():
+    answer, fact = answer_from_facts(shipped_report_index(), "What was the net profit in 2024?")
+    assert fact["metric"] == "net_profit" and fact["year"] == 2024
+    assert "PKR 11,237 million" in answer
+
+def test_qualified_metric_falls_through_to_rag():
+    index = shipped_report_index()
+    for question in ["What was the net profit margin in 2024?", "What is the revenue per employee?",
+                     "What is the revenue growth in 2025?", "What is the ROE target?", "What is the net profit guidance for 2025?"]:
+        assert answer_from_facts(index, question) is None, question
+
+def test_metric_names_containing_qualifier_words_still_match():
+    index = FactsIndex()
+    index.replace_report("report.pdf", extract_facts("The efficiency ratio for 2024 was 48.5%.", META))
+    answer, _ = answer_from_facts(index, "What was the efficiency ratio in 2024?")
+    assert "48.5%" in answer
+
+def test_split_figure_is_not_stored():
+    text = "Bank delivered a resilient financial performance with a Profit before tax of PKR 1 7.0bn compared to PKR 24.7bn last year."
+    assert [f for f in extract_facts(text, META) if f["metric"] == "profit_before_tax"] == []
+    assert not any(f["value"] == 1.0 for page_facts in shipped_report_index().reports().values() for f in page_facts)
+
+def test_prose_amounts_need_a_unit_or_a_full_figure():
+    assert extract_facts("Revenue for 2024 was PKR 5.", META) == []
+    [fact] = extract_facts("Revenue for 2024 was Rs. 12,345,678.", META)
+    assert fact["value"] == 12345678 and fact["currency"] == "PKR"
+    [fact] = extract_facts("The net profit for 2021 was PKR 558,658 million.", META)
+    assert (fact["year"], fact["value"], fact["unit"]) == (2021, 558658, "million")
+
+def test_serialized_table_rows():
+    row = "Profit after tax | Period ended 31 March 2025 (PKR millions): 7,985 | Period ended 31 March 2024 (PKR millions): 11,237"
+    facts = extract_facts(row, {**META, "content_type": "table"})
+    assert [(f["metric"], f["year"], f["value"], f["currency"], f["unit"]) for f in facts] == [
+        ("net_profit", 2025, 7985, "PKR", "million"), ("net_profit", 2024, 11237, "PKR", "million")]
+
+def test_qualified_table_rows_are_not_stored_as_the_metric():
+    rows = "\n".join([
+        "Net profit | 2024 (PKR millions): 11,237 | 2023 (PKR millions): 9,804",
+        "Net profit margin | 2024 (%): 12.5 | 2023 (%): 11.9",
+        "Total assets growth | 2024 (%): 8.1",
+    ])
+    facts = extract_facts(rows, {**META, "content_type": "table"})
+    assert [(f["metric"], f["value"]) for f in facts] == [("net_profit", 11237), ("net_profit", 9804)]
+    flattened = "31 December 2024\n31 December 2023\n(PKR millions)\nTotal assets\n1,000\n900\nTotal assets growth\n11.1\n8.4"
+    assert [(f["metric"], f["value"]) for f in extract_facts(flattened, META)] == [("total_assets", 1000), ("total_assets", 900)]
+
+def test_part_year_periods_fall_through_to_rag():
+    index = shipped_report_index()
+    for question in ["What was the net profit in Q1 2024?", "What was the net profit for the half year 2024?",
+                     "What was the net profit for the nine months of 2024?", "What was the 9M 2024 net profit?"]:
+        assert answer_from_facts(index, question) is None, question
+
+def test_companies_that_are_not_indexed_fall_through_to_rag():
+    index = shipped_report_index()
+    assert answer_from_facts(index, "What was the revenue of HBL in 2024?") is None
+    assert answer_from_facts(index, "What was MCB Bank's net profit in 2024?") is None
+    assert answer_from_facts(index, "What was the net profit of Standard Chartered in 2024?") is not None
+    assert answer_from_facts(index, "What was the net profit of the Bank in 2024?") is not None
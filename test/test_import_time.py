@@ -0,0 +1,44 @@
+"""
+Cold-import benchmark for the query pipeline.
+- Imports query.py in fresh interpreters and checks the median import time stays under budget.
+- Checks that no heavy dependency (models, vector DB, LLM client) is loaded at import time.
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "250"))
+RUNS = int(os.getenv("IMPORT_BENCH_RUNS", "5"))
+HEAVY_MODULES = ["torch", "sentence_transformers", "langchain_huggingface", "chromadb", "langchain_groq"]
+
+PROBE = f"""
+import sys, time, json
+sys.path.insert(0, {SRC_DIR!r})
+start = time.perf_counter()
+import query
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed_ms, "loaded": [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+def measure_cold_import(runs=RUNS):
+    samples, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["ms"])
+        loaded.update(result["loaded"])
+    return statistics.median(samples), sorted(loaded)
+
+def test_cold_import_budget():
+    median_ms, loaded = measure_cold_import()
+    print(f"Cold import of query.py: median {median_ms:.1f} ms over {RUNS} runs (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    assert not loaded, f"Heavy modules loaded at import time: {loaded}"
+    assert median_ms < IMPORT_BUDGET_MS, f"Cold import took {median_ms:.1f} ms"
+
+if __name__ == "__main__":
+    test_cold_import_budget()
+    print("Import benchmark PASSED.")
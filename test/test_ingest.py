@@ -0,0 +1,80 @@
+"""
+Unit tests for parse failures in PDF loading (src/utils/file_loader.py) and incremental ingestion (src/ingest.py).
+"""
+
+import os
+import sys
+import shutil
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src import ingest
+from src.utils import file_loader
+from src.utils.bm25_index import BM25Index
+from src.utils.facts import FactsIndex
+from src.utils.fakes import HashingEmbeddings
+from src.utils.manifest import load_manifest, save_manifest
+from src.utils.report_metadata import METADATA_VERSION
+from src.utils.vector_store import NumpyVectorStore
+
+REPORT = os.path.join(ROOT_DIR, "data", "reports", "Standard Chartered Bank.pdf")
+FILENAME = os.path.basename(REPORT)
+
+PARSE_PAGES = file_loader._parse_pages
+
+# Module-level, so worker processes can unpickle them.
+def crash_from_page_2(pdf_path, start, stop, *args, **kwargs):
+    if start >= 2:
+        raise RuntimeError("worker crashed")
+    return PARSE_PAGES(pdf_path, start, stop, *args, **kwargs)
+
+def crash(*args, **kwargs):
+    raise RuntimeError("worker crashed")
+
+def in_memory_indexes(tmp_path, monkeypatch, store, facts):
+    monkeypatch.setattr(ingest, "VECTOR_DB_DIR", str(tmp_path / "db"))
+    monkeypatch.setattr(ingest, "get_collection", lambda use_persistent=True: store)
+    monkeypatch.setattr(ingest, "get_bm25_index", lambda use_persistent=True: BM25Index())
+    monkeypatch.setattr(ingest, "get_facts_index", lambda use_persistent=True: facts)
+    monkeypatch.setattr(ingest, "get_embedding_model", HashingEmbeddings)
+    monkeypatch.delenv("VECTOR_DB_DIR", raising=False)
+
+def test_failed_page_ranges_and_unopenable_pdfs_are_reported(tmp_path, monkeypatch):
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    monkeypatch.setattr(file_loader, "_parse_pages", crash_from_page_2)
+    # Serially and in worker processes.
+    for workers in (1, 2):
+        failed = set()
+        pages = list(file_loader.iter_pdf_pages([REPORT, str(broken)], max_workers=workers, pages_per_task=1,
+                                                cache_dir=None, failed=failed))
+        assert failed == {FILENAME, "broken.pdf"}
+        assert sorted({page.metadata["page"] for page in pages}) == [0, 1]
+
+def test_unparsed_reports_keep_their_chunks_and_are_retried(tmp_path, monkeypatch):
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    shutil.copy(REPORT, reports)
+    store, facts = NumpyVectorStore(), FactsIndex()
+    in_memory_indexes(tmp_path, monkeypatch, store, facts)
+
+    # A previous version of the report, ingested before.
+    store.upsert(ids=["old"], embeddings=[[1.0] + [0.0] * 383], documents=["old chunk"], metadatas=[{"source": FILENAME}])
+    facts.replace_report(FILENAME, [])
+    save_manifest({"metadata_version": METADATA_VERSION, "files": {FILENAME: {"sha256": "old", "chunk_ids": ["old"]}}},
+                  str(tmp_path / "db"))
+
+    monkeypatch.setattr(file_loader, "_parse_pages", crash)
+    stats = ingest.ingest_reports(str(reports))
+    entry = load_manifest(str(tmp_path / "db"))["files"][FILENAME]
+    assert stats["unparsed"] == [FILENAME]
+    assert entry["sha256"] is None and entry["chunk_ids"] == ["old"]
+    assert store.get(ids=["old"])["ids"] == ["old"]
+
+    monkeypatch.setattr(file_loader, "_parse_pages", PARSE_PAGES)
+    stats = ingest.ingest_reports(str(reports))
+    entry = load_manifest(str(tmp_path / "db"))["files"][FILENAME]
+    assert stats["unparsed"] == [] and stats["changed"] == [FILENAME]
+    assert entry["sha256"] is not None and "old" not in entry["chunk_ids"]
+    assert store.get(ids=["old"])["ids"] == []
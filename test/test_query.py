@@ -4,7 +4,7 @@ import warnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
-from query import query_financials
+from query import query_financials_batch
 
 test_cases = {
     "basic_revenue": "What was the company's revenue in 2024?",
@@ -21,9 +21,10 @@ test_cases = {
 
 def run_tests():
     all_passed = True
-    for test_name, query in test_cases.items():
+    # All questions are answered concurrently; results come back in test-case order.
+    results = query_financials_batch(list(test_cases.values()))
+    for test_name, result in zip(test_cases, results):
         print(f"\n=== Running Test: {test_name} ===")
-        result = query_financials(query)
 
         print("Response Preview:\n", result[:300], "..." if len(result) > 300 else "")
 
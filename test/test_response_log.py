@@ -0,0 +1,61 @@
+"""
+Unit tests for the buffered JSONL response log (src/utils/response_log.py).
+"""
+
+import os
+import sys
+import threading
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.response_log import ResponseLog, iter_responses, get_response_log
+
+def test_records_round_trip_in_order(tmp_path):
+    log = ResponseLog(str(tmp_path))
+    for i in range(5):
+        log.append({"question": f"q{i}", "answer": f"a{i}", "chunk_ids": [f"c{i}"]})
+    log.flush()
+    records = list(iter_responses(str(tmp_path)))
+    assert [r["question"] for r in records] == [f"q{i}" for i in range(5)]
+    assert all("ts" in r for r in records)
+    assert log.written == 5
+    log.close()
+
+def test_segments_rotate_and_are_compressed(tmp_path):
+    log = ResponseLog(str(tmp_path), max_segment_bytes=200)
+    for i in range(20):
+        log.append({"question": f"question {i}", "answer": "x" * 50})
+    log.close()
+    names = os.listdir(tmp_path)
+    assert len(names) > 1 and all(name.endswith(".jsonl.gz") for name in names)
+    assert [r["question"] for r in iter_responses(str(tmp_path))] == [f"question {i}" for i in range(20)]
+
+def test_uncompressed_segments_and_torn_lines_are_read(tmp_path):
+    log = ResponseLog(str(tmp_path), compress=False)
+    log.append({"question": "kept"})
+    log.close()
+    (path,) = tmp_path.iterdir()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"question": "torn')
+    assert [r["question"] for r in iter_responses(str(tmp_path))] == ["kept"]
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    log = ResponseLog(str(tmp_path))
+
+    def write(worker):
+        for i in range(50):
+            log.append({"question": f"{worker}-{i}"})
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.close()
+    questions = [r["question"] for r in iter_responses(str(tmp_path))]
+    assert sorted(questions) == sorted(f"{w}-{i}" for w in range(4) for i in range(50))
+
+def test_one_log_per_directory(tmp_path):
+    assert get_response_log(str(tmp_path)) is get_response_log(str(tmp_path))
+    get_response_log(str(tmp_path)).close()
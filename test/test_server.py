@@ -0,0 +1,68 @@
+"""
+Unit tests for request coalescing and retrieval batching in the query service (src/server.py).
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src import query
+from src import server
+
+def fake_pipeline(monkeypatch, calls, fact=None):
+    def fact_answer(question, filters=None):
+        # A slow facts lookup widens the window in which identical requests arrive.
+        time.sleep(0.05)
+        return fact
+
+    async def aanswer(question, retrieved, semaphore=None):
+        calls.append(question)
+        await asyncio.sleep(0.01)
+        return f"answer to {question}"
+
+    monkeypatch.setattr(query, "fact_answer", fact_answer)
+    monkeypatch.setattr(query, "retrieve_batch", lambda questions, n_results, filters=None: [{"ids": [q]} for q in questions])
+    monkeypatch.setattr(query, "aanswer", aanswer)
+
+def test_identical_concurrent_requests_share_one_llm_call(monkeypatch):
+    calls = []
+    fake_pipeline(monkeypatch, calls)
+    service = server.QueryService()
+
+    async def burst():
+        return await asyncio.gather(*(service.answer("What was the revenue in 2024?") for _ in range(8)))
+
+    results = asyncio.run(burst())
+    assert len(calls) == 1
+    assert {r["answer"] for r in results} == {"answer to What was the revenue in 2024?"}
+    assert sum(r["coalesced"] for r in results) == 7 and service.coalesced == 7
+    assert service.active == 0 and not service._inflight
+
+def test_fact_answers_are_coalesced_too(monkeypatch):
+    calls = []
+    fake_pipeline(monkeypatch, calls, fact="The revenue was PKR 23,101 million.")
+    service = server.QueryService()
+
+    async def burst():
+        return await asyncio.gather(*(service.answer("What was the revenue in 2024?") for _ in range(4)))
+
+    results = asyncio.run(burst())
+    assert calls == [] and service.facts_answers == 1
+    assert [r["chunk_ids"] for r in results] == [[]] * 4
+
+def test_different_questions_are_retrieved_in_one_batch(monkeypatch):
+    calls = []
+    fake_pipeline(monkeypatch, calls)
+    service = server.QueryService()
+    service.batcher.window = 0.2
+
+    async def burst():
+        return await asyncio.gather(*(service.answer(f"question {i}") for i in range(5)))
+
+    results = asyncio.run(burst())
+    assert [r["chunk_ids"] for r in results] == [[f"question {i}"] for i in range(5)]
+    assert len(calls) == 5 and service.batcher.batches == 1
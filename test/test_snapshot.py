@@ -0,0 +1,111 @@
+"""
+Unit tests for columnar index snapshots (src/utils/snapshot.py).
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils import snapshot
+from src.utils.bm25_index import BM25Index
+from src.utils.facts import FactsIndex, extract_facts
+from src.utils.manifest import load_manifest, save_manifest
+from src.utils.report_metadata import METADATA_VERSION
+from src.utils.vector_store import NumpyVectorStore
+
+IDS = ["a1", "a2", "b1"]
+DOCUMENTS = ["Revenue for 2024 was PKR 23,101 million.", "Net profit rose to PKR 11,237 million in 2024.", "Dépôts en hausse."]
+METADATAS = [
+    {"source": "a.pdf", "page": 1, "fiscal_year": 2024, "audited": True, "score": 0.5, "tag": "x"},
+    {"source": "a.pdf", "page": 2, "fiscal_year": 2024, "audited": False, "score": 1.0, "tag": 7},
+    {"source": "b.pdf", "page": 1},
+]
+EMBEDDINGS = np.array([[1, 0, 0], [0.6, 0.8, 0], [0, 0, 1]], dtype=np.float32)
+MANIFEST = {"metadata_version": METADATA_VERSION,
+            "files": {"a.pdf": {"sha256": "aaa", "chunk_ids": ["a1", "a2"]}, "b.pdf": {"sha256": "bbb", "chunk_ids": ["b1"]}}}
+
+@pytest.fixture(autouse=True)
+def no_shared_db(monkeypatch):
+    # Version bumps and the shared indexes must not touch a real VECTOR_DB_DIR.
+    monkeypatch.delenv("VECTOR_DB_DIR", raising=False)
+
+def facts_index():
+    index = FactsIndex()
+    meta = {"source": "a.pdf", "page": 1, "company": "Bank A", "fiscal_year": 2024}
+    index.replace_report("a.pdf", extract_facts(DOCUMENTS[0], meta))
+    return index
+
+def exported(tmp_path, monkeypatch, half=False):
+    store = NumpyVectorStore()
+    store.upsert(ids=IDS, embeddings=EMBEDDINGS, documents=DOCUMENTS, metadatas=METADATAS)
+    db_dir = str(tmp_path / "db")
+    save_manifest(MANIFEST, db_dir)
+    monkeypatch.setattr(snapshot, "get_facts_index", facts_index)
+    path = str(tmp_path / "index.npz")
+    result = snapshot.export_snapshot(path, collection=store, db_dir=db_dir, half=half, batch_size=2)
+    assert result["chunks"] == 3 and result["dim"] == 3 and result["bytes"] == os.path.getsize(path)
+    return path
+
+def restore(path, tmp_path, **kwargs):
+    store, lexical, facts = NumpyVectorStore(), BM25Index(), FactsIndex()
+    db_dir = str(tmp_path / "restored")
+    result = snapshot.restore_snapshot(path, collection=store, lexical_index=lexical, facts_index=facts, db_dir=db_dir, **kwargs)
+    return result, store, lexical, facts, db_dir
+
+def test_snapshot_round_trips_every_column(tmp_path, monkeypatch):
+    data = snapshot.read_snapshot(exported(tmp_path, monkeypatch))
+    order = [data["ids"].index(id_) for id_ in IDS]
+    assert [data["documents"][i] for i in order] == DOCUMENTS
+    # Metadata keeps its types, mixed-type keys included, and absent keys stay absent.
+    assert [data["metadatas"][i] for i in order] == METADATAS
+    assert np.allclose(data["embeddings"][order], EMBEDDINGS)
+    assert data["manifest"] == MANIFEST
+    assert data["facts"]["a.pdf"][0]["metric"] == "revenue"
+    assert data["header"]["embedding"] == snapshot.embedding_fingerprint()
+
+def test_half_precision_vectors_stay_close(tmp_path, monkeypatch):
+    data = snapshot.read_snapshot(exported(tmp_path, monkeypatch, half=True))
+    order = [data["ids"].index(id_) for id_ in IDS]
+    assert data["embeddings"].dtype == np.float32
+    assert np.allclose(data["embeddings"][order], EMBEDDINGS, atol=1e-3)
+
+def test_restore_fills_store_lexical_and_facts_indexes_and_manifest(tmp_path, monkeypatch):
+    result, store, lexical, facts, db_dir = restore(exported(tmp_path, monkeypatch), tmp_path)
+    assert result["chunks"] == 3 and result["reports"] == 2
+    assert sorted(store.get(include=[])["ids"]) == IDS
+    assert store.get(ids=["a2"])["metadatas"] == [METADATAS[1]]
+    assert store.query(query_embeddings=[[0, 0, 1]], n_results=1)["ids"] == [["b1"]]
+    assert lexical.search("net profit")[0][0] == "a2"
+    assert facts.lookup("revenue", 2024)[0]["value"] == 23101
+    assert load_manifest(db_dir)["files"] == MANIFEST["files"]
+
+def test_restore_with_replace_drops_current_contents(tmp_path, monkeypatch):
+    path = exported(tmp_path, monkeypatch)
+    store, lexical, facts = NumpyVectorStore(), BM25Index(), FactsIndex()
+    store.upsert(ids=["old"], embeddings=[[1, 1, 0]], documents=["stale chunk"], metadatas=[{"source": "old.pdf"}])
+    lexical.add(["old"], ["stale chunk"])
+    lexical.commit()
+    facts.replace_report("old.pdf", facts_index().reports()["a.pdf"])
+
+    snapshot.restore_snapshot(path, collection=store, lexical_index=lexical, facts_index=facts, replace=True)
+    assert sorted(store.get(include=[])["ids"]) == IDS
+    assert lexical.search("stale") == []
+    assert list(facts.reports()) == ["a.pdf"]
+
+def test_vectors_of_another_embedding_model_need_force(tmp_path, monkeypatch):
+    path = exported(tmp_path, monkeypatch)
+    monkeypatch.setattr(snapshot, "embedding_fingerprint", lambda: "other:model")
+    with pytest.raises(ValueError):
+        restore(path, tmp_path)
+    result, store, _, _, _ = restore(path, tmp_path, force=True)
+    assert result["chunks"] == 3 and store.count() == 3
+
+def test_manifest_of_an_older_metadata_version_is_re_ingested(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys.modules[__name__], "MANIFEST", {**MANIFEST, "metadata_version": METADATA_VERSION - 1})
+    _, _, _, _, db_dir = restore(exported(tmp_path, monkeypatch), tmp_path)
+    assert all(entry["sha256"] is None for entry in load_manifest(db_dir)["files"].values())
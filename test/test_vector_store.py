@@ -0,0 +1,93 @@
+"""
+Unit tests for the NumPy and sharded vector store backends (src/utils/vector_store.py).
+"""
+
+import os
+import sys
+
+import numpy as np
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from src.utils.vector_store import NumpyVectorStore, ShardedVectorStore, build_where
+
+def _vector(*values):
+    return np.array(values, dtype=np.float32)
+
+def filled_store(store):
+    store.upsert(
+        ids=["a1", "a2", "b1"],
+        embeddings=[_vector(1, 0, 0), _vector(0, 1, 0), _vector(0, 0, 1)],
+        documents=["revenue rose", "costs fell", "deposits grew"],
+        metadatas=[{"source": "a.pdf", "company": "Bank A", "fiscal_year": 2024, "page": 1},
+                   {"source": "a.pdf", "company": "Bank A", "fiscal_year": 2024, "page": 2},
+                   {"source": "b.pdf", "company": "Bank B", "fiscal_year": 2023, "page": 1}],
+    )
+    return store
+
+def sharded_store():
+    return filled_store(ShardedVectorStore("test", lambda shard: NumpyVectorStore()))
+
+def test_numpy_query_returns_exact_top_k():
+    store = filled_store(NumpyVectorStore())
+    results = store.query(query_embeddings=[_vector(0.9, 0.1, 0)], n_results=2)
+    assert results["ids"] == [["a1", "a2"]]
+    assert results["documents"][0][0] == "revenue rose"
+    assert results["distances"][0][0] < results["distances"][0][1]
+
+def test_numpy_query_applies_where_filter():
+    store = filled_store(NumpyVectorStore())
+    where = build_where({"company": "Bank B"})
+    results = store.query(query_embeddings=[_vector(1, 0, 0)], n_results=3, where=where)
+    assert results["ids"] == [["b1"]]
+    assert store.get(where=where)["ids"] == ["b1"]
+
+def test_numpy_upsert_replaces_and_delete_removes():
+    store = filled_store(NumpyVectorStore())
+    store.upsert(ids=["a1"], embeddings=[_vector(0, 1, 0)], documents=["revenue restated"], metadatas=[{"source": "a.pdf"}])
+    assert store.count() == 3
+    assert store.get(ids=["a1"])["documents"] == ["revenue restated"]
+    store.delete(ids=["a2"])
+    assert store.count() == 2
+    assert store.get(ids=["a2"])["ids"] == []
+
+def test_numpy_delete_skips_unknown_ids():
+    store = filled_store(NumpyVectorStore())
+    store.delete(ids=["missing", "a1"])
+    store.delete(ids=["missing", "a2"], where={"source": "a.pdf"})
+    assert sorted(store.get(include=[])["ids"]) == ["b1"]
+
+def test_numpy_store_persists_and_compacts(tmp_path):
+    store = filled_store(NumpyVectorStore(str(tmp_path)))
+    store.delete(ids=["a2"])
+    store.persist()
+    store.compact()
+    reopened = NumpyVectorStore(str(tmp_path))
+    assert sorted(reopened.get(include=[])["ids"]) == ["a1", "b1"]
+    embeddings = reopened.get(ids=["b1"], include=["embeddings"])["embeddings"]
+    assert np.allclose(embeddings[0], [0, 0, 1])
+
+def test_sharded_query_merges_shards_by_distance():
+    store = sharded_store()
+    assert set(store.shards()) == {"a.pdf", "b.pdf"}
+    assert store.count() == 3
+    results = store.query(query_embeddings=[_vector(0.1, 0, 0.9)], n_results=2)
+    assert results["ids"] == [["b1", "a1"]]
+
+def test_sharded_filter_skips_other_reports():
+    store = sharded_store()
+    results = store.query(query_embeddings=[_vector(0, 0, 1)], n_results=3, where=build_where({"company": "Bank A"}))
+    assert sorted(results["ids"][0]) == ["a1", "a2"]
+
+def test_sharded_get_keeps_include_keys_when_no_shard_matches():
+    store = sharded_store()
+    result = store.get(ids=["a1"], where=build_where({"company": "Bank C"}), include=["documents", "metadatas"])
+    assert result == {"ids": [], "documents": [], "metadatas": []}
+    empty = ShardedVectorStore("empty", lambda shard: NumpyVectorStore())
+    assert empty.get(include=["documents"]) == {"ids": [], "documents": []}
+
+def test_sharded_delete_by_id_reaches_every_shard():
+    store = sharded_store()
+    store.delete(ids=["a1", "b1", "missing"])
+    assert store.get(include=[])["ids"] == ["a2"]